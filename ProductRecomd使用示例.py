@@ -3,7 +3,7 @@
 智能商品推荐系统使用示例
 """
 
-from product_recommend_api import recommend_products, ProductRecommendationAPI, get_available_options
+from product_recommend_api import recommend_products, registry, get_available_options
 
 def main():
     print("🎁 智能商品推荐系统使用示例")
@@ -18,7 +18,7 @@ def main():
     
     # 2. 查看用户购物习惯
     print("\n2️⃣ 查看用户购物习惯:")
-    api = ProductRecommendationAPI()
+    api = registry.get()  # 与便捷函数共享同一实例，数据只加载一次
     user_id = 25
     user_summary = api.get_user_summary(user_id)
     
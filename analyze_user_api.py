@@ -5,162 +5,869 @@
 """
 
 import csv
+import os
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from collections import Counter, defaultdict
 
+from purchase_store import (PurchaseStore, NUMPY_AVAILABLE, np, to_epoch,
+                            load_snapshot, write_snapshot)
+from association_counters import AssociationCounters, default_counters_path
+from catalog_facts import CatalogFacts
+from product_catalog import ProductCatalog
+from purchase_csv import format_malformed, parse_new_lines, parse_timestamp, read_purchase_records
+from purchase_partitions import PurchasePartitions, default_partition_dir
+from purchase_rollups import PurchaseRollups
+from result_cache import LRUCache
+from sqlite_store import SQLitePurchaseStore, import_csv
+
+# 分析结果中可按需计算的字段（user_id、period 始终返回，无记录时另有 message）
+RESULT_FIELDS = frozenset(('total_orders', 'total_amount', 'avg_order_amount', 'frequent_products',
+                           'frequent_categories', 'category_avg_spending', 'purchase_timeline'))
+TOTAL_FIELDS = frozenset(('total_orders', 'total_amount', 'avg_order_amount'))  # 只需订单数和金额合计
+CATEGORY_FIELDS = frozenset(('frequent_categories', 'category_avg_spending'))
+PRODUCT_FIELDS = CATEGORY_FIELDS | {'frequent_products'}  # 需要展开订单中的商品
+
+def _check_fields(fields):
+    """校验 fields 参数，返回 frozenset（None 表示全部字段）"""
+    if fields is None:
+        return None
+    fields = frozenset([fields] if isinstance(fields, str) else fields)
+    unknown = fields - RESULT_FIELDS - {'user_id', 'period'}
+    if unknown:
+        raise ValueError(f"未知的分析字段: {', '.join(sorted(unknown))}")
+    return fields
+
+def _project(result, fields):
+    """只保留请求的字段（以及 user_id、period、message）"""
+    if fields is None:
+        return result
+    return {key: value for key, value in result.items()
+            if key in fields or key in ('user_id', 'period', 'message')}
+
+def _result_header(user_id, start_date, end_date):
+    """分析结果中始终包含的字段"""
+    return {
+        'user_id': user_id,
+        'period': f"{start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}",
+    }
+
+def _add_totals(result, amounts):
+    """
+    订单数、消费总额和平均每单金额：一次求和、一次计数
+
+    金额按记录顺序逐笔累加（NumPy 数组也转为列表求和，而不是 ndarray.sum 的分组累加），
+    平均值恰好落在半分上时，各存储模式与逐行分析的舍入结果一致
+    """
+    total_amount = sum(amounts.tolist() if NUMPY_AVAILABLE and isinstance(amounts, np.ndarray) else amounts)
+    result['total_orders'] = len(amounts)
+    result['total_amount'] = round(total_amount, 2)
+    result['avg_order_amount'] = round(total_amount / len(amounts), 2)
+
 class UserPurchaseAnalyzer:
-    def __init__(self, purchase_data_path="data/user_purchase_data.csv", product_data_path="data/product_data.csv"):
+    def __init__(self, purchase_data_path="data/user_purchase_data.csv", product_data_path="data/product_data.csv",
+                 columnar=False, snapshot=False, mmap=False, cache_size=1024, cache_ttl=None,
+                 sqlite_path=None, partitioned=False):
+        """
+        Args:
+            purchase_data_path: 用户购买数据文件路径
+            product_data_path: 商品数据文件路径
+            columnar: 是否使用列式存储（需要 NumPy），大数据量时显著降低内存并加速分析
+            snapshot: 是否使用二进制快照缓存（隐含列式存储），快照有效时跳过CSV解析
+            mmap: 是否以只读内存映射方式打开快照（隐含快照），同一主机上的多个进程
+                  通过页缓存共享同一份数据
+            cache_size: 分析结果缓存的条目上限，为 0 时关闭缓存
+            cache_ttl: 分析结果缓存的有效期（秒），为 None 时只在数据重新加载时失效
+            sqlite_path: SQLite 数据库路径（需要 NumPy），指定时改用 SQLite 存储：
+                         按用户和时间段在数据库中查询，进程内不保留全部购买数据；
+                         数据库不存在或比CSV旧时自动从CSV导入
+            partitioned: 是否使用按月分区存储（需要 NumPy）：启动时只读取分区清单，
+                         查询时只加载与日期范围重叠且包含该用户的月份分区
+        """
         self.purchase_data_path = purchase_data_path
         self.product_data_path = product_data_path
         self.purchase_data = []
         self.product_map = {}
         self.product_prices = {}  
+        self.catalog = None  # 商品ID -> 类别编码的稠密查找表
+        self.catalog_facts = None  # 商品目录与订单金额统计（当前数据版本首次查询时计算）
+        self.association_counters = None  # 商品种类关联的增量计数（首次调用 get_association_counters 时建立）
+        # 逐行模式下预先解析的商品ID（CSR）：第 i 条记录的商品为 product_values[product_offsets[i]:product_offsets[i + 1]]，
+        # item_categories 与 product_values 等长，为对应商品的类别编码
+        self.product_offsets = array('q', [0])
+        self.product_values = array('q')
+        self.item_categories = array('l')
+        self.columnar = columnar or snapshot or mmap
+        self.snapshot = snapshot or mmap
+        self.mmap = mmap
+        self.sqlite_path = sqlite_path
+        self.db = None  # SQLite 存储（指定 sqlite_path 时使用）
+        self.partitioned = partitioned
+        self.partitions = None  # 按月分区（partitioned=True 时使用）
+        self.partition_stores = LRUCache(maxsize=12)  # 月份 -> 已加载的分区列式存储
+        self.store = None  # 列式存储（columnar=True 时使用，替代 purchase_data）
+        self.user_index = {}  # 用户ID -> (按时间排序的购买时间列表, 对应的记录下标列表)
+        self.rollups = None  # 按天预聚合的前缀和（列式存储时使用）
+        self.data_version = 0  # 数据版本，每次完整加载递增，作为结果缓存键的一部分
+        self.ingest_offset = 0  # 购买数据文件中已读取到的字节位置
+        self.last_record_id = 0  # 已读取的最大记录ID
+        self.malformed_rows = []  # 加载时跳过的格式错误行：(行号, 原因)
+        self.result_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
         self.load_data()
     
     def load_data(self):
-        """加载数据文件"""
+        """加载（或重新加载）数据文件，并使旧版本数据的分析缓存失效"""
+        self.purchase_data = []
+        self.product_map = {}
+        self.product_prices = {}
+        self.catalog = None
+        self.catalog_facts = None
+        self.association_counters = None
+        self.product_offsets = array('q', [0])
+        self.product_values = array('q')
+        self.item_categories = array('l')
+        self.store = None
+        self.db = None
+        self.partitions = None
+        self.partition_stores.clear()
+        self.user_index = {}
+        self.rollups = None
+        self.ingest_offset = 0
+        self.last_record_id = 0
+        self.malformed_rows = []
         try:
-            # 加载商品数据
-            with open(self.product_data_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    product_id = int(row['商品ID'])
-                    self.product_map[product_id] = row['商品种类']
-                    self.product_prices[product_id] = float(row['单价(元)'])
-            
-            # 加载购买数据
-            with open(self.purchase_data_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    row['用户ID'] = int(row['用户ID'])
-                    row['购买商品数量'] = int(row['购买商品数量'])
-                    row['购买总金额(元)'] = float(row['购买总金额(元)'])
-                    row['购买时间'] = datetime.strptime(row['购买时间'], '%Y-%m-%d %H:%M:%S')
-                    self.purchase_data.append(row)
-            
+            # 先记录文件大小：加载期间追加的行会在下次增量读取时按记录ID去重
+            self.ingest_offset = os.path.getsize(self.purchase_data_path)
+            self._load_files()
+            self._append_product_lists(self.purchase_data)
+            if self.db is not None:
+                self.last_record_id = self.db.max_record_id()
+            elif self.partitions is not None:
+                self.last_record_id = self.partitions.manifest['max_record_id']
+            elif self.store is not None and len(self.store):
+                self.last_record_id = int(self.store.record_ids.max())
+            elif self.purchase_data:
+                # 解析时已跳过记录ID不是整数的行；这里仍只取整数记录ID，个别异常值不会使整次加载失败
+                self.last_record_id = max((int(record['记录ID']) for record in self.purchase_data
+                                           if record['记录ID'].strip().isdecimal()), default=0)
         except FileNotFoundError as e:
             print(f"❌ 文件未找到: {e}")
         except Exception as e:
             print(f"❌ 数据加载失败: {e}")
+        self.data_version += 1
+        self.result_cache.clear()
+    
+    def ingest_new_rows(self):
+        """
+        增量读取购买数据文件中新追加的行
+        
+        从上次读取到的字节位置继续读取，只解析完整的新行，并跳过记录ID不大于已读最大值的行；
+        格式错误的行记入 malformed_rows 后跳过，新行全部写入后才推进读取位置；
+        就地更新内存数据、用户索引（列式存储时还包括按天汇总的覆盖范围），
+        只使受影响用户的分析缓存失效。文件变小（被截断或替换）时改为完整重新加载。
+        
+        Returns:
+            int: 新增的记录数
+        """
+        size = os.path.getsize(self.purchase_data_path)
+        if size < self.ingest_offset:
+            self.load_data()
+            if self.db is not None:
+                return len(self.db)
+            if self.partitions is not None:
+                return self.partitions.manifest['rows']
+            return len(self.store) if self.store is not None else len(self.purchase_data)
+        if size == self.ingest_offset:
+            return 0
+        
+        with open(self.purchase_data_path, 'rb') as f:
+            fieldnames = next(csv.reader([f.readline().decode('utf-8-sig')]))
+            f.seek(self.ingest_offset)
+            chunk = f.read(size - self.ingest_offset)
+        # 只处理完整的行，末尾写了一半的行留到下次
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return 0
+        offset = self.ingest_offset + end + 1
+        
+        malformed = []
+        rows = parse_new_lines(chunk[:end + 1].decode('utf-8'), fieldnames, malformed)
+        if malformed:
+            first_line_number = self._line_count(self.ingest_offset) + 1
+            malformed = [(first_line_number + line_number - 1, reason) for line_number, reason in malformed]
+            self.malformed_rows.extend(malformed)
+            print(format_malformed(malformed))
+        rows = [row for row in rows if int(row['记录ID']) > self.last_record_id]
+        if not rows:
+            self.ingest_offset = offset
+            return 0
+        
+        if self.db is not None:
+            self.db.insert_rows([PurchaseStore.parse_row(row) for row in rows])
+        elif self.partitions is not None:
+            months = self.partitions.append(rows)
+            self.partitions.mark_source(self.purchase_data_path, offset)
+            self.partition_stores.discard(lambda month: month in months)
+        elif self.store is not None:
+            self._ingest_columnar(rows)
+        else:
+            self._ingest_records(rows)
+        
+        if self.catalog_facts is not None:
+            self.catalog_facts.add_orders([float(row['购买总金额(元)']) for row in rows])
+        if self.association_counters is not None:
+            self.association_counters.add_transactions(
+                (int(row['记录ID']), self._product_categories(
+                    [int(pid.strip()) for pid in row['商品ID'].strip('"').split(',')]))
+                for row in rows)
+            self.association_counters.source_size = max(self.association_counters.source_size, offset)
+            self.association_counters.maybe_checkpoint()
+        # 新行全部写入后才推进读取位置，中途出错时下次从同一位置重新读取
+        self.ingest_offset = offset
+        self.last_record_id = max(self.last_record_id, max(int(row['记录ID']) for row in rows))
+        affected = {int(row['用户ID']) for row in rows}
+        self.result_cache.discard(lambda key: key[0] in affected)
+        return len(rows)
+    
+    def _line_count(self, offset):
+        """购买数据文件前 offset 字节中的行数（只在报告格式错误的行号时使用）"""
+        count = 0
+        with open(self.purchase_data_path, 'rb') as f:
+            while offset > 0:
+                block = f.read(min(offset, 1 << 20))
+                if not block:
+                    break
+                count += block.count(b'\n')
+                offset -= len(block)
+        return count
+    
+    def _ingest_records(self, rows):
+        """逐行模式：追加记录并插入到用户索引中"""
+        for row in rows:
+            row['用户ID'] = int(row['用户ID'])
+            row['购买商品数量'] = int(row['购买商品数量'])
+            row['购买总金额(元)'] = float(row['购买总金额(元)'])
+            row['购买时间'] = parse_timestamp(row['购买时间'])
+            position = len(self.purchase_data)
+            self.purchase_data.append(row)
+            self._append_product_lists([row])
+            times, positions = self.user_index.setdefault(row['用户ID'], ([], []))
+            i = bisect_right(times, row['购买时间'])
+            times.insert(i, row['购买时间'])
+            positions.insert(i, position)
+    
+    def _ingest_columnar(self, rows):
+        """列式模式：追加到列缓冲区，增量记录过多时合并索引并重建按天汇总"""
+        self.store.append([PurchaseStore.parse_row(row) for row in rows])
+        if self.store.delta_size() > max(1000, self.store.index_rows // 10):
+            self.store.build_user_index()
+            self.rollups = None
+            self._build_rollups()
+    
+    def _load_files(self):
+        """读取 SQLite 数据库、快照或CSV文件"""
+        if self.sqlite_path:
+            if NUMPY_AVAILABLE:
+                self._open_sqlite()
+                return
+            print("⚠️ 未安装 NumPy，SQLite 存储不可用，回退为逐行加载")
+        
+        # 优先加载与CSV一致的快照
+        if self.snapshot and NUMPY_AVAILABLE:
+            snapshot = load_snapshot(self.purchase_data_path, self.product_data_path,
+                                     mmap_mode='r' if self.mmap else None)
+            if snapshot:
+                self.store, self.product_map, self.product_prices = snapshot
+                self.catalog = ProductCatalog(self.product_map, self.product_prices)
+                self._build_rollups()
+                return
+        
+        # 加载商品数据
+        with open(self.product_data_path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                product_id = int(row['商品ID'])
+                self.product_map[product_id] = row['商品种类']
+                self.product_prices[product_id] = float(row['单价(元)'])
+        self.catalog = ProductCatalog(self.product_map, self.product_prices)
+        
+        if self.partitioned:
+            if NUMPY_AVAILABLE:
+                self._open_partitions()
+                return
+            print("⚠️ 未安装 NumPy，分区存储不可用，回退为逐行加载")
+        
+        # 加载购买数据
+        if self.columnar:
+            if NUMPY_AVAILABLE:
+                self.store = PurchaseStore.from_csv(self.purchase_data_path, self.malformed_rows)
+                self._report_malformed()
+                self.store.build_user_index()
+                if self.snapshot and self._write_snapshot() and self.mmap:
+                    # 改为映射刚写出的快照，释放本进程的私有副本
+                    snapshot = load_snapshot(self.purchase_data_path, self.product_data_path,
+                                             mmap_mode='r')
+                    if snapshot:
+                        self.store, self.product_map, self.product_prices = snapshot
+                self._build_rollups()
+                return
+            print("⚠️ 未安装 NumPy，列式存储不可用，回退为逐行加载")
+
+        self.purchase_data = read_purchase_records(self.purchase_data_path, self.malformed_rows)
+        self._report_malformed()
+        self._build_user_index()
+    
+    def _report_malformed(self):
+        """提示加载时跳过的格式错误行"""
+        if self.malformed_rows:
+            print(format_malformed(self.malformed_rows))
+    
+    def _open_sqlite(self):
+        """打开 SQLite 数据库，数据库不存在或比CSV文件旧时先从CSV导入"""
+        db_mtime = os.path.getmtime(self.sqlite_path) if os.path.exists(self.sqlite_path) else None
+        if db_mtime is None or db_mtime < max(os.path.getmtime(self.purchase_data_path),
+                                              os.path.getmtime(self.product_data_path)):
+            import_csv(self.purchase_data_path, self.product_data_path, self.sqlite_path,
+                       malformed=self.malformed_rows)
+            self._report_malformed()
+        self.db = SQLitePurchaseStore(self.sqlite_path)
+        self.product_map, self.product_prices = self.db.load_products()
+        self.catalog = ProductCatalog(self.product_map, self.product_prices)
+    
+    def _open_partitions(self):
+        """打开按月分区，分区不存在或源CSV被改写时重建，源CSV只有追加时从上次位置续读"""
+        directory = default_partition_dir(self.purchase_data_path)
+        partitions = PurchasePartitions.open(directory)
+        state = partitions.matches_source(self.purchase_data_path) if partitions else None
+        if state is None:
+            partitions = PurchasePartitions.build(self.purchase_data_path, directory, self.malformed_rows)
+            self._report_malformed()
+        self.partitions = partitions
+        self.ingest_offset = partitions.manifest['source']['size']
+        self.last_record_id = partitions.manifest['max_record_id']
+        if state == 'appended':
+            self.ingest_new_rows()
     
-    def analyze_user_habits(self, user_id, start_date="2025-11-01", end_date="2026-1-31"):
+    def _partition_store(self, partition):
+        """读取（或从缓存取出）一个月份分区的列式存储"""
+        store = self.partition_stores.get(partition['month'])
+        if store is None:
+            store = PurchaseStore.from_csv(self.partitions.path(partition))
+            store.build_user_index()
+            self.partition_stores.put(partition['month'], store)
+        return store
+    
+    def _write_snapshot(self):
+        """写出快照，失败时仅提示，不影响本次加载"""
+        try:
+            write_snapshot(self.store, self.product_map, self.product_prices,
+                           self.purchase_data_path, self.product_data_path)
+            return True
+        except Exception as e:
+            print(f"⚠️ 写入数据快照失败: {e}")
+            return False
+    
+    def _build_rollups(self):
+        """构建按天预聚合；内存映射模式下推迟到首次区间统计，保持打开开销与数据量无关"""
+        if not self.mmap:
+            self.rollups = PurchaseRollups.build(self.store, self.catalog)
+    
+    def _build_user_index(self):
+        """构建用户索引：每个用户的记录按购买时间排序，便于按时间段二分查找"""
+        positions_by_user = defaultdict(list)
+        for position, record in enumerate(self.purchase_data):
+            positions_by_user[record['用户ID']].append(position)
+        
+        self.user_index = {}
+        for user_id, positions in positions_by_user.items():
+            # 稳定排序，同一时间的记录保持原始顺序
+            positions.sort(key=lambda p: self.purchase_data[p]['购买时间'])
+            times = [self.purchase_data[p]['购买时间'] for p in positions]
+            self.user_index[user_id] = (times, positions)
+    
+    def _append_product_lists(self, records):
+        """逐行模式：解析新记录的商品ID字段，追加到 CSR 数组并查出类别编码（每条记录只解析一次）"""
+        for record in records:
+            product_ids = [int(pid.strip()) for pid in record['商品ID'].strip('"').split(',')]
+            self.product_values.extend(product_ids)
+            self.item_categories.extend(self.catalog.category_codes(product_ids))
+            self.product_offsets.append(len(self.product_values))
+    
+    def _select_user_positions(self, user_id, start_date, end_date):
+        """通过用户索引取出时间段内未退款记录的下标（按原始记录顺序）"""
+        if user_id not in self.user_index:
+            return []
+        times, positions = self.user_index[user_id]
+        lo = bisect_left(times, start_date)
+        hi = bisect_right(times, end_date)
+        return [position for position in sorted(positions[lo:hi])
+                if self.purchase_data[position]['是否退款'] == '否']
+    
+    def has_data(self):
+        """是否已成功加载购买数据"""
+        if self.db is not None:
+            return self.db.has_data()
+        if self.partitions is not None:
+            return self.partitions.manifest['rows'] > 0
+        if self.store is not None:
+            return len(self.store) > 0
+        return bool(self.purchase_data)
+    
+    def _empty_result(self, user_id, start_date, end_date, fields=None):
+        """指定时间段内没有有效购买记录时的结果"""
+        return _project({
+            'user_id': user_id,
+            'period': f"{start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}",
+            'total_orders': 0,
+            'total_amount': 0,
+            'avg_order_amount': 0,
+            'frequent_products': [],
+            'frequent_categories': [],
+            'category_avg_spending': [],
+            'purchase_timeline': [],
+            'message': '该用户在指定时间段内没有有效购买记录'
+        }, fields)
+    
+    def analyze_user_habits(self, user_id, start_date="2025-11-01", end_date="2026-1-31", fields=None):
         """
         分析指定用户的购买习惯
         
+        Args:
+            user_id: 用户ID
+            start_date / end_date: 日期范围，格式 YYYY-MM-DD
+            fields: 只计算并返回这些字段（见 RESULT_FIELDS，user_id 和 period 始终返回），
+                    为 None 时返回全部字段。例如 {'avg_order_amount'} 只需对订单金额求和、计数
+        
         Returns:
-            dict: 完整的分析结果，包含所有统计信息
+            dict: 分析结果
         """
-        if not self.purchase_data:
+        if not self.has_data():
             return None
         
+        fields = _check_fields(fields)
         start_date = datetime.strptime(start_date, '%Y-%m-%d')
         end_date = datetime.strptime(end_date, '%Y-%m-%d')
         
-        # 筛选数据
-        user_data = []
-        for record in self.purchase_data:
-            if (record['用户ID'] == user_id and 
-                start_date <= record['购买时间'] <= end_date and
-                record['是否退款'] == '否'):
-                user_data.append(record)
+        # 结果缓存：键包含数据版本，数据重新加载后旧结果自动失效；不同字段组合分别缓存。
+        # 返回顶层字典的副本，调用方增删字段不会影响缓存；嵌套列表为共享对象，不应修改
+        cache_key = (user_id, start_date, end_date, self.data_version, fields)
+        result = self.result_cache.get(cache_key)
+        if result is None:
+            result = self._analyze(user_id, start_date, end_date, fields)
+            self.result_cache.put(cache_key, result)
+        return dict(result)
+    
+    def cache_stats(self):
+        """返回分析结果缓存的命中/未命中/淘汰统计"""
+        stats = self.result_cache.stats()
+        stats['data_version'] = self.data_version
+        return stats
+    
+    def _analyze(self, user_id, start_date, end_date, fields=None):
+        """执行分析（不经过缓存）"""
+        if fields is not None and fields <= TOTAL_FIELDS:
+            # 只需要订单数和金额：只取出有效订单的金额
+            amounts = self._select_amounts(user_id, start_date, end_date)
+            if len(amounts) == 0:
+                return self._empty_result(user_id, start_date, end_date, fields)
+            result = _result_header(user_id, start_date, end_date)
+            _add_totals(result, amounts)
+            return _project(result, fields)
         
-        if len(user_data) == 0:
-            return {
-                'user_id': user_id,
-                'period': f"{start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}",
-                'total_orders': 0,
-                'total_amount': 0,
-                'avg_order_amount': 0,
-                'frequent_products': [],
-                'frequent_categories': [],
-                'category_avg_spending': [],
-                'purchase_timeline': [],
-                'message': '该用户在指定时间段内没有有效购买记录'
-            }
+        if self.db is not None:
+            # 用户、时间段和退款条件由 SQL 过滤，查询结果即全部有效记录
+            store = self.db.fetch_orders(user_id, to_epoch(start_date), to_epoch(end_date))
+            return self._summarize_columnar(user_id, np.arange(len(store)), start_date, end_date, store, fields)
+        
+        if self.partitions is not None:
+            store = self._select_partitions(user_id, start_date, end_date)
+            order = np.argsort(store.record_ids, kind='stable')
+            return self._summarize_columnar(user_id, order, start_date, end_date, store, fields)
+        
+        if self.store is not None:
+            indices = self.store.select(user_id, to_epoch(start_date), to_epoch(end_date))
+            return self._summarize_columnar(user_id, indices, start_date, end_date, fields=fields)
+        
+        # 筛选数据
+        positions = self._select_user_positions(user_id, start_date, end_date)
+        return self._summarize_records(user_id, positions, start_date, end_date, fields)
+    
+    def _select_partitions(self, user_id, start_date, end_date):
+        """只读取与日期范围重叠且包含该用户的分区，返回其中有效记录组成的列式存储（按分区顺序）"""
+        start_ts, end_ts = to_epoch(start_date), to_epoch(end_date)
+        parts = []
+        for partition in self.partitions.overlapping(start_ts, end_ts, user_id):
+            partition_store = self._partition_store(partition)
+            parts.append(partition_store.take(partition_store.select(user_id, start_ts, end_ts)))
+        return PurchaseStore.concat(parts)
+    
+    def _select_amounts(self, user_id, start_date, end_date):
+        """用户在时间段内有效订单的金额（按原始记录顺序）"""
+        if self.db is not None:
+            return np.array(self.db.fetch_amounts(user_id, to_epoch(start_date), to_epoch(end_date)),
+                            dtype=np.float64)
+        if self.partitions is not None:
+            # 按记录ID恢复原始记录顺序
+            store = self._select_partitions(user_id, start_date, end_date)
+            return store.amounts[np.argsort(store.record_ids, kind='stable')]
+        if self.store is not None:
+            return self.store.amounts[self.store.select(user_id, to_epoch(start_date), to_epoch(end_date))]
+        return [self.purchase_data[position]['购买总金额(元)']
+                for position in self._select_user_positions(user_id, start_date, end_date)]
+    
+    def _summarize_records(self, user_id, positions, start_date, end_date, fields=None):
+        """根据用户在时间段内有效记录的下标（按原始记录顺序）计算统计，fields 为 None 时计算全部字段"""
+        if len(positions) == 0:
+            return self._empty_result(user_id, start_date, end_date, fields)
+        wanted = RESULT_FIELDS if fields is None else fields
+        user_data = [self.purchase_data[position] for position in positions]
         
         # 计算基本统计
-        total_amount = sum(record['购买总金额(元)'] for record in user_data)
-        avg_order_amount = total_amount / len(user_data)
-        
-        # 分析商品购买频次
-        all_products = []
-        for record in user_data:
-            products_str = record['商品ID'].strip('"')
-            product_ids = [int(pid.strip()) for pid in products_str.split(',')]
-            all_products.extend(product_ids)
-        
-        # 频繁购买商品统计
-        product_counter = Counter(all_products)
-        frequent_products = []
-        for product_id, count in product_counter.most_common():
-            if count >= 3:  # 购买次数≥3才算频繁
-                product_name = self.product_map.get(product_id, f"未知商品({product_id})")
-                frequent_products.append({
-                    'product_id': product_id,
-                    'product_name': product_name,
-                    'purchase_count': count
-                })
+        result = _result_header(user_id, start_date, end_date)
+        _add_totals(result, [record['购买总金额(元)'] for record in user_data])
         
-        # 分析商品类别和每类商品平均开销
-        all_categories = []
-        category_amounts = defaultdict(list)  # 存储每个类别的消费金额
-        
-        for product_id in all_products:
-            category = self.product_map.get(product_id)
-            if category:
-                all_categories.append(category)
-                # 获取该商品的单价
-                product_price = self.product_prices.get(product_id, 0)
-                category_amounts[category].append(product_price)
-        
-        category_counter = Counter(all_categories)
-        frequent_categories = []
-        category_avg_spending = []
-        
-        for category, count in category_counter.most_common(5):  # 取前5个最频繁的类别
-            percentage = round(count / len(all_categories) * 100, 1) if all_categories else 0
-            frequent_categories.append({
-                'category': category,
-                'purchase_count': count,
-                'percentage': percentage
-            })
+        if wanted & PRODUCT_FIELDS:
+            # 分析商品购买频次（商品ID和类别编码在加载时已解析）
+            all_products = []
+            all_codes = []
+            offsets = self.product_offsets
+            for position in positions:
+                start, end = offsets[position], offsets[position + 1]
+                all_products.extend(self.product_values[start:end])
+                all_codes.extend(self.item_categories[start:end])
             
-            # 计算该类别的平均开销
-            if category in category_amounts:
-                avg_spending = sum(category_amounts[category]) / len(category_amounts[category])
-                total_spending = sum(category_amounts[category])
-                category_avg_spending.append({
-                    'category': category,
-                    'avg_spending': round(avg_spending, 2),
-                    'total_spending': round(total_spending, 2),
-                    'purchase_count': count
+            if 'frequent_products' in wanted:
+                # 频繁购买商品统计
+                product_counter = Counter(all_products)
+                frequent_products = []
+                for product_id, count in product_counter.most_common():
+                    if count >= 3:  # 购买次数≥3才算频繁
+                        product_name = self.product_map.get(product_id, f"未知商品({product_id})")
+                        frequent_products.append({
+                            'product_id': product_id,
+                            'product_name': product_name,
+                            'purchase_count': count
+                        })
+                result['frequent_products'] = frequent_products
+            
+            if wanted & CATEGORY_FIELDS:
+                # 分析商品类别和每类商品平均开销：按类别编码计数（数组下标即编码），结果中再换回类别名称
+                catalog = self.catalog
+                category_counts = [0] * len(catalog)
+                category_totals = [0] * len(catalog)  # 每个类别的消费金额合计（商品单价之和）
+                seen_order = []  # 按首次出现顺序排列的类别编码
+                for product_id, code in zip(all_products, all_codes):
+                    if code >= 0:
+                        if category_counts[code] == 0:
+                            seen_order.append(code)
+                        category_counts[code] += 1
+                        category_totals[code] += catalog.price(product_id)
+                total_items = sum(category_counts)
+                
+                frequent_categories = []
+                category_avg_spending = []
+                
+                # 取前5个最频繁的类别，次数相同时按首次出现顺序
+                for code in sorted(seen_order, key=lambda code: -category_counts[code])[:5]:
+                    category = catalog.categories[code]
+                    count = category_counts[code]
+                    total_spending = category_totals[code]
+                    frequent_categories.append({
+                        'category': category,
+                        'purchase_count': count,
+                        'percentage': round(count / total_items * 100, 1)
+                    })
+                    
+                    # 该类别的平均开销
+                    category_avg_spending.append({
+                        'category': category,
+                        'avg_spending': round(total_spending / count, 2),
+                        'total_spending': round(total_spending, 2),
+                        'purchase_count': count
+                    })
+                result['frequent_categories'] = frequent_categories
+                result['category_avg_spending'] = category_avg_spending
+        
+        if 'purchase_timeline' in wanted:
+            # 购买时间线
+            purchase_timeline = []
+            for record in user_data:
+                purchase_timeline.append({
+                    'date': record['购买时间'].strftime('%Y-%m-%d'),
+                    'amount': record['购买总金额(元)'],
+                    'product_count': record['购买商品数量']
                 })
+            
+            purchase_timeline.sort(key=lambda x: x['date'])
+            result['purchase_timeline'] = purchase_timeline
         
-        # 购买时间线
-        purchase_timeline = []
-        for record in user_data:
-            purchase_timeline.append({
-                'date': record['购买时间'].strftime('%Y-%m-%d'),
-                'amount': record['购买总金额(元)'],
-                'product_count': record['购买商品数量']
-            })
+        return _project(result, fields)
+    
+    def _summarize_columnar(self, user_id, indices, start_date, end_date, store=None, fields=None):
+        """
+        基于列式存储的向量化分析（indices 为按原始顺序排列的有效记录下标），结果与逐行分析一致
         
-        purchase_timeline.sort(key=lambda x: x['date'])
+        fields 为 None 时计算全部字段，否则只计算所需字段
+        """
+        store = self.store if store is None else store
+        if indices.size == 0:
+            return self._empty_result(user_id, start_date, end_date, fields)
+        wanted = RESULT_FIELDS if fields is None else fields
         
-        return {
-            'user_id': user_id,
-            'period': f"{start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}",
-            'total_orders': len(user_data),
-            'total_amount': round(total_amount, 2),
-            'avg_order_amount': round(avg_order_amount, 2),
-            'frequent_products': frequent_products,
-            'frequent_categories': frequent_categories,
-            'category_avg_spending': category_avg_spending,
-            'purchase_timeline': purchase_timeline
-        }
+        # 计算基本统计
+        amounts = store.amounts[indices]
+        result = _result_header(user_id, start_date, end_date)
+        _add_totals(result, amounts)
+        
+        if wanted & PRODUCT_FIELDS:
+            # 商品购买频次：按次数降序，次数相同时按首次出现顺序（与 Counter.most_common 一致）
+            all_products = store.gather_products(indices)
+            products, first_seen, inverse, counts = np.unique(
+                all_products, return_index=True, return_inverse=True, return_counts=True)
+            if 'frequent_products' in wanted:
+                frequent_products = []
+                for i in np.lexsort((first_seen, -counts)):
+                    if counts[i] < 3:  # 购买次数≥3才算频繁
+                        break
+                    product_id = int(products[i])
+                    frequent_products.append({
+                        'product_id': product_id,
+                        'product_name': self.product_map.get(product_id, f"未知商品({product_id})"),
+                        'purchase_count': int(counts[i])
+                    })
+                result['frequent_products'] = frequent_products
+            
+            if wanted & CATEGORY_FIELDS:
+                # 商品类别：对去重后的商品查稠密类别编码表，再按出现位置展开
+                category_names = self.catalog.categories
+                product_codes, product_prices = self.catalog.lookup_array(products)
+                
+                item_codes = product_codes[inverse]
+                known = item_codes >= 0
+                item_codes = item_codes[known]
+                item_prices = product_prices[inverse][known]
+                
+                frequent_categories = []
+                category_avg_spending = []
+                if item_codes.size:
+                    category_counts = np.bincount(item_codes, minlength=len(category_names))
+                    category_totals = np.bincount(item_codes, weights=item_prices, minlength=len(category_names))
+                    # 次数相同时按类别首次出现的位置排序：类别的首次出现 = 其下各商品首次出现位置的最小值
+                    category_first_seen = np.full(len(category_names), all_products.size, dtype=np.int64)
+                    known_products = product_codes >= 0
+                    np.minimum.at(category_first_seen, product_codes[known_products], first_seen[known_products])
+                    
+                    for code in np.lexsort((category_first_seen, -category_counts))[:5]:  # 取前5个最频繁的类别
+                        count = int(category_counts[code])
+                        if count == 0:
+                            break
+                        total_spending = float(category_totals[code])
+                        frequent_categories.append({
+                            'category': category_names[code],
+                            'purchase_count': count,
+                            'percentage': round(count / item_codes.size * 100, 1)
+                        })
+                        category_avg_spending.append({
+                            'category': category_names[code],
+                            'avg_spending': round(total_spending / count, 2),
+                            'total_spending': round(total_spending, 2),
+                            'purchase_count': count
+                        })
+                result['frequent_categories'] = frequent_categories
+                result['category_avg_spending'] = category_avg_spending
+        
+        if 'purchase_timeline' in wanted:
+            # 购买时间线（按日期稳定排序，与逐行分析一致）
+            dates = store.dates(indices)
+            order = np.argsort(dates, kind='stable')
+            result['purchase_timeline'] = [
+                {'date': date, 'amount': amount, 'product_count': product_count}
+                for date, amount, product_count in zip(
+                    dates[order].tolist(), amounts[order].tolist(), store.item_counts[indices][order].tolist())
+            ]
+        
+        return _project(result, fields)
+    
+    def analyze_users(self, user_ids=None, start_date="2025-11-01", end_date="2026-1-31", workers=1):
+        """
+        批量分析多个用户的购买习惯
+        
+        订单在加载时已按用户分组建立索引，每个用户只处理自己的记录，
+        分析全部用户的总开销相当于对数据做一次遍历。结果不写入单用户分析缓存。
+        
+        Args:
+            user_ids: 用户ID列表，为 None 时分析全部用户（按用户ID升序）
+            start_date: 开始日期，格式 YYYY-MM-DD
+            end_date: 结束日期，格式 YYYY-MM-DD
+            workers: 并行进程数，大于 1 时将用户分片后交给进程池处理（见 analyze_users_parallel）
+        
+        Yields:
+            dict: 与 analyze_user_habits 相同格式的分析结果，顺序与 user_ids 一致
+        """
+        if not self.has_data():
+            return
+        
+        if user_ids is None:
+            user_ids = self.get_all_user_ids()
+        
+        if workers and workers > 1:
+            yield from analyze_users_parallel(self, user_ids, start_date, end_date, workers)
+            return
+        
+        start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+        for user_id in user_ids:
+            yield self._analyze(user_id, start_date, end_date)
+    
+    def get_all_user_ids(self):
+        """返回全部用户ID（升序）"""
+        if self.db is not None:
+            return self.db.all_user_ids()
+        if self.partitions is not None:
+            return sorted(self.partitions.manifest['user_order'])
+        if self.store is not None:
+            if self.store.index_users is not None:
+                return self.store.index_users.tolist()
+            return np.unique(self.store.user_ids).tolist()
+        return sorted(self.user_index)
+    
+    def summarize_range(self, user_id, start_date="2025-11-01", end_date="2026-1-31"):
+        """
+        基于按天预聚合统计用户在时间段内的订单数、消费金额和各类商品开销
+        
+        开销主要与类别数有关，与用户历史长度无关，适合对同一用户扫描大量日期区间。
+        区间为 [start_date 00:00, end_date 00:00]，结果与 analyze_user_habits 完全一致：
+        金额按整数分汇总，购买件数相同的类别按区间内首次出现的顺序排列。
+        未使用列式存储（含 SQLite 存储）时退化为完整分析。
+        
+        Returns:
+            dict: user_id, period, total_orders, total_amount, avg_order_amount, category_avg_spending
+        """
+        if not self.has_data():
+            return None
+        
+        if self.store is None:
+            result = self.analyze_user_habits(user_id, start_date, end_date)
+            return {key: result[key] for key in (
+                'user_id', 'period', 'total_orders', 'total_amount', 'avg_order_amount', 'category_avg_spending')}
+        
+        start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+        start_ts, end_ts = to_epoch(start_date), to_epoch(end_date)
+        if self.rollups is None:
+            self.rollups = PurchaseRollups.build(self.store, self.catalog)
+        
+        # 整天部分 [start, end) 由前缀和回答；恰好在 end_date 零点的订单，
+        # 以及汇总之后追加的订单单独补上
+        extra = None
+        if end_ts >= start_ts:
+            covered = self.rollups.rows
+            boundary = self.store.select(user_id, end_ts, end_ts)
+            appended = self.store.select_delta(user_id, start_ts, end_ts)
+            extra = np.concatenate((boundary[boundary < covered], appended[appended >= covered]))
+        summary = self.rollups.summarize(self.store, user_id, start_ts // 86400, end_ts // 86400, extra)
+        summary['user_id'] = user_id
+        summary['period'] = f"{start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}"
+        return summary
+    
+    def get_catalog_facts(self):
+        """
+        商品目录与订单金额统计：商品类别、各类别商品单价区间、订单金额范围和分位数（p50/p90/p99）
+        
+        每个数据版本只计算一次，增量读取新订单时就地更新
+        
+        Returns:
+            CatalogFacts
+        """
+        facts = self.catalog_facts
+        if facts is None:
+            facts = self.catalog_facts = CatalogFacts(self.catalog or ProductCatalog({}, {}), self._order_amounts())
+        return facts
+    
+    def _order_amounts(self):
+        """全部订单金额（含退款订单），按记录顺序"""
+        if self.db is not None:
+            return self.db.amounts()
+        if self.partitions is not None:
+            return self.partitions.amounts()
+        if self.store is not None:
+            return self.store.amounts
+        return [record['购买总金额(元)'] for record in self.purchase_data]
+    
+    def get_association_counters(self, path=None, checkpoint_interval=300):
+        """
+        商品种类关联的增量计数（见 AssociationCounters）
+        
+        首次调用时从检查点恢复，并只补计检查点中没有的记录（按记录ID去重）；检查点不存在、损坏，
+        或记录的购买数据文件标识与当前文件不符（文件被替换或改写）时对全部记录重新计数。
+        之后增量读取的新订单会就地计入，并按 checkpoint_interval 定期写检查点
+        
+        Args:
+            path: 检查点文件路径，默认为购买数据CSV同级的 category_association_counts.json
+            checkpoint_interval: 两次写检查点的最短间隔（秒）
+        
+        Returns:
+            AssociationCounters
+        """
+        counters = self.association_counters
+        if counters is None:
+            path = path or default_counters_path(self.purchase_data_path)
+            counters = AssociationCounters.load(path, checkpoint_interval, self.purchase_data_path)
+            if counters is None:
+                counters = AssociationCounters(path, checkpoint_interval, self.purchase_data_path)
+            added = counters.add_transactions(
+                (record_id, self._product_categories(product_ids))
+                for record_id, product_ids in self._product_lists(counters.record_ids))
+            counters.source_size = max(counters.source_size, self.ingest_offset)
+            if added:
+                try:
+                    counters.save()
+                except OSError as e:
+                    print(f"⚠️ 写入关联计数检查点失败: {e}")
+            self.association_counters = counters
+        return counters
+    
+    def _product_categories(self, product_ids):
+        """一组商品的种类名称（跳过未知商品）"""
+        categories = self.catalog.categories
+        return [categories[code] for code in self.catalog.category_codes(product_ids) if code >= 0]
+    
+    def _product_lists(self, skip=frozenset()):
+        """记录ID不在 skip 中的每条记录的 (记录ID, 商品ID列表)，按记录顺序"""
+        if self.db is not None:
+            return [item for item in self.db.product_lists() if item[0] not in skip]
+        if self.partitions is not None:
+            return [item for item in self.partitions.product_lists() if item[0] not in skip]
+        if self.store is not None:
+            offsets = self.store.product_offsets
+            record_ids = self.store.record_ids
+            if skip:
+                positions = np.flatnonzero(~np.isin(record_ids, np.fromiter(skip, dtype=np.int64, count=len(skip))))
+            else:
+                positions = np.arange(len(record_ids))
+            return [(int(record_ids[i]), self.store.product_values[offsets[i]:offsets[i + 1]].tolist())
+                    for i in positions.tolist()]
+        return [(int(record['记录ID']),
+                 self.product_values[self.product_offsets[position]:self.product_offsets[position + 1]].tolist())
+                for position, record in enumerate(self.purchase_data)
+                if int(record['记录ID']) not in skip]
+    
+    def get_price_range(self):
+        """获取历史订单金额范围（最小/最大/平均）"""
+        return self.get_catalog_facts().price_range()
     
     def get_user_list(self, limit=10):
         """获取用户列表"""
+        if self.db is not None:
+            return self.db.user_list(limit)
+        if self.partitions is not None:
+            return sorted(self.partitions.manifest['user_order'][:limit])
+        if self.store is not None:
+            # 按首次出现顺序取前 limit 个不同用户
+            user_ids, first_seen = np.unique(self.store.user_ids, return_index=True)
+            return sorted(user_ids[np.argsort(first_seen)[:limit]].tolist())
+        
         user_ids = set()
         for record in self.purchase_data:
             user_ids.add(record['用户ID'])
@@ -168,6 +875,74 @@ class UserPurchaseAnalyzer:
                 break
         return sorted(list(user_ids))
 
+# ============== 多进程批量分析 ==============
+
+# 子进程中分片任务使用的分析器，由进程池的 initializer 在每个子进程中设置；父进程不使用这个变量，
+# 因此多个线程可以同时各自调用 analyze_users_parallel
+_shard_analyzer = None
+
+def _use_shard_analyzer(analyzer):
+    """fork 启动方式下的子进程初始化：直接使用从父进程继承的分析器（写时复制，不做序列化）"""
+    global _shard_analyzer
+    _shard_analyzer = analyzer
+
+def _init_shard_worker(purchase_data_path, product_data_path, sqlite_path=None, partitioned=False):
+    """非 fork 启动方式下的子进程初始化：映射共享快照（或打开同一数据库/分区）而不是接收序列化的数据"""
+    global _shard_analyzer
+    _shard_analyzer = UserPurchaseAnalyzer(purchase_data_path, product_data_path,
+                                           mmap=NUMPY_AVAILABLE and not (sqlite_path or partitioned),
+                                           cache_size=0, sqlite_path=sqlite_path, partitioned=partitioned)
+
+def _analyze_shard(task):
+    """子进程中分析一个用户分片"""
+    user_ids, start_date, end_date = task
+    return list(_shard_analyzer.analyze_users(user_ids, start_date, end_date))
+
+def analyze_users_parallel(analyzer, user_ids, start_date="2025-11-01", end_date="2026-1-31",
+                           workers=None, shard_size=None):
+    """
+    使用进程池分片分析多个用户
+    
+    用户列表被切成连续的分片交给子进程，结果按分片顺序合并，与 user_ids 顺序一致。
+    支持 fork 的平台上子进程通过写时复制共享父进程已加载的数据，不做序列化；
+    否则子进程以内存映射方式打开同一份数据快照。
+    
+    Args:
+        analyzer: 已加载数据的 UserPurchaseAnalyzer
+        user_ids: 用户ID列表
+        start_date / end_date: 日期范围，格式 YYYY-MM-DD
+        workers: 进程数，默认 CPU 核数
+        shard_size: 每个分片的用户数，默认使每个进程约分到 4 个分片
+    
+    Yields:
+        dict: 分析结果
+    """
+    import multiprocessing
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    
+    user_ids = list(user_ids)
+    workers = workers or os.cpu_count() or 1
+    if not shard_size:
+        shard_size = max(1, -(-len(user_ids) // (workers * 4)))
+    tasks = [(user_ids[i:i + shard_size], start_date, end_date)
+             for i in range(0, len(user_ids), shard_size)]
+    
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # fork 时 initargs 随进程对象一起被子进程继承，分析器不会被序列化
+        pool_args = {'mp_context': multiprocessing.get_context('fork'),
+                     'initializer': _use_shard_analyzer, 'initargs': (analyzer,)}
+    else:
+        if analyzer.mmap or analyzer.snapshot:
+            analyzer._write_snapshot()
+        pool_args = {'initializer': _init_shard_worker,
+                     'initargs': (analyzer.purchase_data_path, analyzer.product_data_path,
+                                  analyzer.sqlite_path, analyzer.partitioned)}
+    
+    with ProcessPoolExecutor(max_workers=workers, **pool_args) as executor:
+        for results in executor.map(_analyze_shard, tasks):
+            yield from results
+
 # ============== 前端调用API函数 ==============
 
 # 全局分析器实例（避免重复加载数据）
@@ -180,7 +955,16 @@ def get_analyzer():
         _analyzer = UserPurchaseAnalyzer()
     return _analyzer
 
-def analyze_user(user_id, start_date="2025-11-01", end_date="2026-01-31"):
+def get_cache_stats():
+    """
+    获取全局分析器的结果缓存统计
+    
+    Returns:
+        dict: size, maxsize, ttl, hits, misses, evictions, expirations, hit_rate, data_version
+    """
+    return get_analyzer().cache_stats()
+
+def analyze_user(user_id, start_date="2025-11-01", end_date="2026-01-31", fields=None):
     """
     分析用户购买习惯 - 前端调用接口
     
@@ -188,6 +972,7 @@ def analyze_user(user_id, start_date="2025-11-01", end_date="2026-01-31"):
         user_id (int): 用户ID
         start_date (str): 开始日期，格式 YYYY-MM-DD
         end_date (str): 结束日期，格式 YYYY-MM-DD
+        fields (set): 只计算这些字段，为 None 时返回全部字段
     
     Returns:
         dict: 分析结果，包含以下字段：
@@ -203,14 +988,14 @@ def analyze_user(user_id, start_date="2025-11-01", end_date="2026-01-31"):
             - message: 错误信息（如果有）
     """
     analyzer = get_analyzer()
-    if not analyzer.purchase_data:
+    if not analyzer.has_data():
         return {
             'error': True,
             'message': '数据加载失败'
         }
     
     try:
-        result = analyzer.analyze_user_habits(user_id, start_date, end_date)
+        result = analyzer.analyze_user_habits(user_id, start_date, end_date, fields)
         if result:
             result['error'] = False
         return result
@@ -220,6 +1005,35 @@ def analyze_user(user_id, start_date="2025-11-01", end_date="2026-01-31"):
             'message': f'分析过程中出现错误: {str(e)}'
         }
 
+def analyze_users(user_ids=None, start_date="2025-11-01", end_date="2026-01-31", workers=1):
+    """
+    批量分析用户购买习惯 - 离线任务接口
+    
+    一次遍历数据即可得到全部用户的分析结果，替代循环调用 analyze_user
+    
+    Args:
+        user_ids (list): 用户ID列表，为 None 时分析全部用户
+        start_date (str): 开始日期，格式 YYYY-MM-DD
+        end_date (str): 结束日期，格式 YYYY-MM-DD
+        workers (int): 并行进程数，大于 1 时使用进程池分片处理
+    
+    Yields:
+        dict: 与 analyze_user 相同格式的分析结果，顺序与 user_ids 一致
+    """
+    analyzer = get_analyzer()
+    if not analyzer.has_data():
+        for user_id in user_ids or []:
+            yield {
+                'user_id': user_id,
+                'error': True,
+                'message': '数据加载失败'
+            }
+        return
+    
+    for result in analyzer.analyze_users(user_ids, start_date, end_date, workers=workers):
+        result['error'] = False
+        yield result
+
 def get_user_summary(user_id, start_date="2025-11-01", end_date="2026-01-31"):
     """
     获取用户购买摘要信息 - 简化版接口
@@ -230,7 +1044,8 @@ def get_user_summary(user_id, start_date="2025-11-01", end_date="2026-01-31"):
             - frequent_products: 频繁购买商品列表
             - frequent_categories: 偏好商品类别列表
     """
-    result = analyze_user(user_id, start_date, end_date)
+    result = analyze_user(user_id, start_date, end_date,
+                          fields={'avg_order_amount', 'frequent_products', 'frequent_categories'})
     if result.get('error'):
         return result
     
@@ -248,7 +1063,7 @@ def get_category_spending(user_id, start_date="2025-11-01", end_date="2026-01-31
     Returns:
         list: 各类商品平均开销列表
     """
-    result = analyze_user(user_id, start_date, end_date)
+    result = analyze_user(user_id, start_date, end_date, fields={'category_avg_spending'})
     if result.get('error'):
         return []
     
@@ -262,7 +1077,7 @@ def get_available_users(limit=20):
         list: 用户ID列表
     """
     analyzer = get_analyzer()
-    if not analyzer.purchase_data:
+    if not analyzer.has_data():
         return []
     
     return analyzer.get_user_list(limit)
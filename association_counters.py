@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+商品种类关联的增量计数
+保存每个商品种类的交易数、每对种类共同出现的交易数和交易总数，新订单到达时按其包含的 k 个种类
+以 O(k²) 更新；支持度、置信度和提升度在需要时由计数推导（与 data/category_association_analysis.py
+的计算方式一致），无需重新运行批量关联分析。计数定期写入检查点文件，重启后从检查点继续累加；
+检查点记录对应的购买数据文件标识，文件被替换后不再沿用
+"""
+
+import json
+import os
+import tempfile
+import time
+from itertools import combinations
+
+from purchase_store import prefix_key, prefix_state
+
+# 检查点格式版本，格式变化时递增，旧检查点会被忽略并重新计数
+COUNTERS_VERSION = 2
+COUNTERS_FILE_NAME = "category_association_counts.json"
+
+# 与批量关联分析脚本相同的默认阈值
+DEFAULT_MIN_SUPPORT = 0.001
+DEFAULT_MIN_CONFIDENCE = 0.03
+
+
+def default_counters_path(purchase_data_path):
+    """默认检查点路径：购买数据CSV同级的 category_association_counts.json"""
+    return os.path.join(os.path.dirname(os.path.abspath(purchase_data_path)), COUNTERS_FILE_NAME)
+
+
+class AssociationCounters:
+    """
+    商品种类关联计数
+
+        - category_counts: 商品种类 -> 包含该种类的交易数
+        - pair_counts: (种类A, 种类B)（按名称 A < B）-> 同时包含两者的交易数
+        - total_transactions: 至少包含一个有效种类的交易数
+        - record_ids: 已计入的记录ID集合，同一记录不会重复计入（记录ID不要求递增）
+        - source_path / source_size: 计数对应的购买数据文件及已计入部分的字节数，
+          写检查点时保存其标识（见 prefix_key）
+        - version: 每计入一笔交易递增，用于判断推导结果是否需要重新计算
+    """
+
+    def __init__(self, path=None, checkpoint_interval=300, source_path=None):
+        """
+        Args:
+            path: 检查点文件路径，为 None 时不写检查点
+            checkpoint_interval: 两次写检查点的最短间隔（秒）
+            source_path: 购买数据文件路径，为 None 时检查点不记录数据文件标识
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.source_path = source_path
+        self.source_size = 0
+        self.category_counts = {}
+        self.pair_counts = {}
+        self.total_transactions = 0
+        self.record_ids = set()
+        self.version = 0
+        self._saved_version = 0
+        self._saved_at = time.monotonic()
+
+    def add_transaction(self, record_id, categories):
+        """
+        计入一笔交易
+
+        Args:
+            record_id: 记录ID，已计入时忽略
+            categories: 交易中商品的种类（可重复，空值会被忽略）
+
+        Returns:
+            bool: 是否计入
+        """
+        if record_id in self.record_ids:
+            return False
+        self.record_ids.add(record_id)
+        categories = sorted(set(category for category in categories if category))
+        if not categories:
+            return False
+        self.total_transactions += 1
+        for category in categories:
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        for pair in combinations(categories, 2):
+            self.pair_counts[pair] = self.pair_counts.get(pair, 0) + 1
+        self.version += 1
+        return True
+
+    def add_transactions(self, transactions):
+        """计入多笔交易：(记录ID, 种类列表) 序列，返回实际计入的交易数"""
+        return sum(1 for record_id, categories in transactions if self.add_transaction(record_id, categories))
+
+    def associations(self, min_support=DEFAULT_MIN_SUPPORT, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        """
+        由当前计数推导满足阈值的商品种类对
+
+        Returns:
+            list: 与 CategoryAssociationAnalyzer.find_frequent_category_pairs 相同格式的字典，按支持度降序
+        """
+        total = self.total_transactions
+        if not total:
+            return []
+        pairs = []
+        for (category_a, category_b), count in self.pair_counts.items():
+            support_ab = count / total
+            if support_ab < min_support:
+                continue
+            support_a = self.category_counts[category_a] / total
+            support_b = self.category_counts[category_b] / total
+            confidence_a_to_b = support_ab / support_a
+            confidence_b_to_a = support_ab / support_b
+            if confidence_a_to_b < min_confidence and confidence_b_to_a < min_confidence:
+                continue
+            pairs.append({
+                'category_a': category_a,
+                'category_b': category_b,
+                'support': support_ab,
+                'confidence_a_to_b': confidence_a_to_b,
+                'confidence_b_to_a': confidence_b_to_a,
+                'lift': support_ab / (support_a * support_b),
+                'transactions_count': count,
+            })
+        pairs.sort(key=lambda x: (-x['support'], x['category_a'], x['category_b']))
+        return pairs
+
+    def as_csv_rows(self, min_support=DEFAULT_MIN_SUPPORT, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        """推导结果，格式与 category_associations.csv 读出的行相同"""
+        return [{
+            '商品种类A': pair['category_a'],
+            '商品种类B': pair['category_b'],
+            '支持度': f"{pair['support']:.4f}",
+            'A→B置信度': f"{pair['confidence_a_to_b']:.4f}",
+            'B→A置信度': f"{pair['confidence_b_to_a']:.4f}",
+            '提升度': f"{pair['lift']:.4f}",
+        } for pair in self.associations(min_support, min_confidence)]
+
+    def save(self, path=None):
+        """写检查点（先写临时文件再原子替换）"""
+        path = path or self.path
+        data = {
+            'version': COUNTERS_VERSION,
+            'source': prefix_key(self.source_path, self.source_size) if self.source_path else None,
+            'total_transactions': self.total_transactions,
+            'record_ids': _to_ranges(self.record_ids),
+            'category_counts': self.category_counts,
+            'pair_counts': [[category_a, category_b, count]
+                            for (category_a, category_b), count in self.pair_counts.items()],
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=".counts-", suffix='.json',
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        self._saved_version = self.version
+        self._saved_at = time.monotonic()
+
+    def maybe_checkpoint(self):
+        """计数有变化且距上次写入超过 checkpoint_interval 秒时写检查点，返回是否写入"""
+        if self.path is None or self.version == self._saved_version:
+            return False
+        if time.monotonic() - self._saved_at < self.checkpoint_interval:
+            return False
+        try:
+            self.save()
+        except OSError as e:
+            print(f"⚠️ 写入关联计数检查点失败: {e}")
+            return False
+        return True
+
+    @classmethod
+    def load(cls, path, checkpoint_interval=300, source_path=None):
+        """
+        从检查点恢复
+
+        指定 source_path 时还要求检查点记录的数据文件标识仍与该文件一致（文件只在末尾追加过），
+        否则（文件被替换或改写）检查点不再沿用
+
+        Returns:
+            AssociationCounters；文件不存在、版本不符、损坏或数据文件不一致时返回 None
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != COUNTERS_VERSION:
+                return None
+            source = data['source']
+            if source_path is not None and (source is None or prefix_state(source_path, source) is None):
+                return None
+            counters = cls(path, checkpoint_interval, source_path)
+            counters.source_size = int(source['size']) if source else 0
+            counters.total_transactions = int(data['total_transactions'])
+            counters.record_ids = _from_ranges(data['record_ids'])
+            counters.category_counts = {category: int(count) for category, count in data['category_counts'].items()}
+            counters.pair_counts = {(category_a, category_b): int(count)
+                                    for category_a, category_b, count in data['pair_counts']}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ 关联计数检查点不可用，将重新计数: {e}")
+            return None
+        return counters
+
+
+def _to_ranges(record_ids):
+    """记录ID集合压缩为 [起, 止] 闭区间列表（记录ID大多连续）"""
+    ranges = []
+    for record_id in sorted(record_ids):
+        if ranges and record_id == ranges[-1][1] + 1:
+            ranges[-1][1] = record_id
+        else:
+            ranges.append([record_id, record_id])
+    return ranges
+
+
+def _from_ranges(ranges):
+    """_to_ranges 的逆操作"""
+    record_ids = set()
+    for start, end in ranges:
+        record_ids.update(range(int(start), int(end) + 1))
+    return record_ids
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+商品目录与订单金额统计
+每个数据版本计算一次：商品类别列表、各类别商品单价区间、订单金额的最小/最大/平均值和分位数，
+之后的查询直接返回缓存结果；增量读取新订单时新金额先进入一个较小的已排序缓冲区，
+缓冲区超过一定大小后才与全部金额合并
+"""
+
+from bisect import bisect_right, insort
+from heapq import merge
+
+from purchase_store import NUMPY_AVAILABLE, np
+
+# 订单金额分位数（百分位）
+PERCENTILES = (50, 90, 99)
+
+# 新订单金额缓冲区的合并阈值：超过 max(PENDING_MIN_SIZE, 已合并金额数 // PENDING_FRACTION) 时合并，
+# 合并一次的开销为 O(全部订单数)，摊到每笔新订单约 O(PENDING_FRACTION)
+PENDING_MIN_SIZE = 1024
+PENDING_FRACTION = 32
+
+
+def _percentile(value_at, count, q):
+    """
+    升序序列的 q 百分位数（线性插值，与 numpy.percentile 默认方式一致）
+
+    Args:
+        value_at: 按位置取值的函数
+        count: 序列长度
+    """
+    position = (count - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, count - 1)
+    low_value, high_value = float(value_at(lower)), float(value_at(upper))
+    fraction = position - lower
+    # 与 NumPy 相同的插值写法：靠近上端时从上端减，保证结果的舍入一致
+    if fraction >= 0.5:
+        return high_value - (high_value - low_value) * (1 - fraction)
+    return low_value + (high_value - low_value) * fraction
+
+
+class CatalogFacts:
+    """
+    商品目录与订单金额的预计算统计
+
+    订单金额保存为升序序列 amounts（有 NumPy 时为数组）；新订单的金额先二分插入较小的升序缓冲区 pending，
+    缓冲区超过阈值（见 PENDING_MIN_SIZE / PENDING_FRACTION）时才合并进 amounts，
+    避免每次增量读取都复制全部金额。分位数按位置读取两个序列的合并结果，不需要重新排序
+    """
+
+    def __init__(self, catalog, amounts):
+        """
+        Args:
+            catalog: 商品查找表（ProductCatalog）
+            amounts: 全部订单金额，按记录顺序
+        """
+        self.categories = list(catalog.categories)
+        self.category_price_bands = self._price_bands(catalog)
+        # 金额总和按记录顺序逐笔累加（与逐行读取后 sum 的结果完全相同），之后新订单的金额继续依次累加
+        if NUMPY_AVAILABLE:
+            amounts = np.asarray(amounts, dtype=np.float64)
+            self.amount_sum = sum(amounts.tolist())
+            self.amounts = np.sort(amounts)
+        else:
+            amounts = [float(amount) for amount in amounts]
+            self.amount_sum = sum(amounts)
+            self.amounts = sorted(amounts)
+        self.pending = []
+        self._pending_positions = []  # pending 中每个金额在合并序列中的位置，缓冲区变化后首次查询时计算
+
+    @staticmethod
+    def _price_bands(catalog):
+        """各类别商品单价的最低/最高/平均值和商品数，按类别名称排序"""
+        bands = {}
+        if catalog.dense:
+            products = ((catalog.base + offset, code) for offset, code in enumerate(catalog.code_table))
+        else:
+            products = catalog.code_table.items()
+        for product_id, code in products:
+            if code < 0:
+                continue
+            price = catalog.price(product_id)
+            band = bands.get(code)
+            if band is None:
+                bands[code] = [price, price, price, 1]
+            else:
+                band[0] = min(band[0], price)
+                band[1] = max(band[1], price)
+                band[2] += price
+                band[3] += 1
+        return {
+            catalog.categories[code]: {
+                "min": low,
+                "max": high,
+                "avg": round(total / count, 2),
+                "product_count": count,
+            }
+            for code, (low, high, total, count) in sorted(bands.items())
+        }
+
+    def add_orders(self, amounts):
+        """合并新订单的金额：先放入缓冲区，缓冲区超过阈值时整体合并"""
+        for amount in amounts:
+            insort(self.pending, float(amount))
+            self.amount_sum += float(amount)
+        self._pending_positions = None
+        if len(self.pending) > max(PENDING_MIN_SIZE, len(self.amounts) // PENDING_FRACTION):
+            self._merge_pending()
+
+    def _merge_pending(self):
+        """把缓冲区合并进 amounts"""
+        if NUMPY_AVAILABLE:
+            pending = np.asarray(self.pending, dtype=np.float64)
+            self.amounts = np.insert(self.amounts, np.searchsorted(self.amounts, pending, side='right'), pending)
+        else:
+            self.amounts = list(merge(self.amounts, self.pending))
+        self.pending = []
+        self._pending_positions = []
+
+    def order_count(self):
+        """订单数（含缓冲区）"""
+        return len(self.amounts) + len(self.pending)
+
+    def _value_at(self, position):
+        """合并序列中第 position 个金额（从 0 开始）"""
+        if self._pending_positions is None:
+            if NUMPY_AVAILABLE:
+                self._pending_positions = (np.searchsorted(self.amounts, self.pending, side='right')
+                                           + np.arange(len(self.pending))).tolist()
+            else:
+                self._pending_positions = [bisect_right(self.amounts, amount) + index
+                                           for index, amount in enumerate(self.pending)]
+        index = bisect_right(self._pending_positions, position) - 1
+        if index >= 0 and self._pending_positions[index] == position:
+            return self.pending[index]
+        return self.amounts[position - index - 1]
+
+    def price_range(self):
+        """订单金额的最小值、最大值和平均值"""
+        count = self.order_count()
+        if count == 0:
+            return {"min": 0, "max": 0, "avg": 0}
+        return {
+            "min": float(self._value_at(0)),
+            "max": float(self._value_at(count - 1)),
+            "avg": self.amount_sum / count,
+        }
+
+    def percentiles(self):
+        """订单金额分位数，如 {"p50": ..., "p90": ..., "p99": ...}"""
+        count = self.order_count()
+        if count == 0:
+            return {f"p{q}": 0 for q in PERCENTILES}
+        return {f"p{q}": round(_percentile(self._value_at, count, q), 2) for q in PERCENTILES}
+
+    def as_dict(self):
+        """全部统计"""
+        return {
+            "categories": list(self.categories),
+            "category_price_bands": self.category_price_bands,
+            "price_range": self.price_range(),
+            "price_percentiles": self.percentiles(),
+            "order_count": self.order_count(),
+        }
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+测试共用的样例数据
+"""
+
+import os
+import shutil
+
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def sample(tmp_path):
+    """
+    复制商品数据到临时目录，返回 (购买数据路径, 商品数据路径, 样例购买数据的全部行)
+
+    购买数据文件不预先写出，由测试按需写入全部或部分行
+    """
+    shutil.copy(os.path.join(DATA_DIR, 'product_data.csv'), tmp_path)
+    with open(os.path.join(DATA_DIR, 'user_purchase_data.csv'), 'rb') as f:
+        lines = f.read().splitlines()
+    return str(tmp_path / 'user_purchase_data.csv'), str(tmp_path / 'product_data.csv'), lines
@@ -4,33 +4,93 @@
 基于商品种类（分析用户购买记录中经常一起购买的商品类别对
 """
 
-import pandas as pd
-import numpy as np
 from itertools import combinations
 from collections import defaultdict, Counter
 import csv
+import json
 import os
+import time
+from datetime import datetime
 from typing import Dict, List, Tuple, Set
 
+# pandas / numpy 在首次创建分析器时才导入，只导入本模块不承担其导入开销
+pd = None
+np = None
+# scipy.sparse 为可选依赖：未安装时共现矩阵改用分块的稠密矩阵乘法计算
+sparse = None
+SCIPY_AVAILABLE = False
+
+# 位图求交时每批处理的 uint64 字数上限（控制临时数组大小，约 32MB）
+BITSET_CHUNK_WORDS = 1 << 22
+
+
+def _import_dependencies():
+    """导入 pandas 和 numpy（只在第一次调用时实际导入）"""
+    global pd, np, sparse, SCIPY_AVAILABLE
+    if pd is None:
+        import numpy
+        import pandas
+        pd, np = pandas, numpy
+        try:
+            import scipy.sparse
+            sparse, SCIPY_AVAILABLE = scipy.sparse, True
+        except ImportError:
+            pass
+
+
+def _popcount(words):
+    """统计 uint64 数组最后一维中置位的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    # NumPy 2.0 之前没有 bitwise_count，按字节查表
+    byte_counts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+    return byte_counts[np.ascontiguousarray(words).view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
 
 class CategoryAssociationAnalyzer:
     """商品种类关联分析器"""
     
-    def __init__(self, purchase_data_path: str, product_data_path: str):
+    def __init__(self, purchase_data_path: str, product_data_path: str,
+                 start_date: str = None, end_date: str = None, partition_dir: str = None):
         """
         初始化种类关联分析器
         
         Args:
             purchase_data_path: 用户购买数据文件路径
             product_data_path: 商品数据文件路径
+            start_date: 只分析该日期（含，格式 YYYY-MM-DD）之后的交易，为 None 时不限制
+            end_date: 只分析该日期零点（含）之前的交易，为 None 时不限制
+            partition_dir: 按月分区目录（见 purchase_partitions.py），指定时只读取与日期范围重叠的分区
         """
+        _import_dependencies()
         self.purchase_data_path = purchase_data_path
         self.product_data_path = product_data_path
+        self.start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        self.end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
+        self.partition_dir = partition_dir
         self.purchase_data = []
         self.product_category_map = {}  # 商品ID -> 商品种类
+        self.category_names = []  # 类别编码 -> 商品种类（按名称排序）
+        self.product_base = 0  # 稠密查找表中下标 0 对应的商品ID
+        self.category_code_table = np.empty(0, dtype=np.int32)  # 商品ID - product_base -> 类别编码，未知为 -1
+        # 加载时一次解析的商品ID（CSR）：第 i 笔交易的商品为 product_values[product_offsets[i]:product_offsets[i + 1]]，
+        # item_categories 与 product_values 等长，为对应商品的类别编码
+        self.transaction_ids = np.empty(0, dtype=np.int64)
+        self.product_offsets = np.zeros(1, dtype=np.int64)
+        self.product_values = np.empty(0, dtype=np.int64)
+        self.item_categories = np.empty(0, dtype=np.int32)
         self.category_transactions = defaultdict(set)  # 商品种类 -> 包含该种类的交易ID集合
         self.transaction_categories = defaultdict(set)  # 交易ID -> 商品种类集合
         self.total_transactions = 0
+        self.category_counts = np.zeros(0, dtype=np.int64)  # 类别编码 -> 包含该类别的交易数
+        self.category_pair_total = 0  # 全部有效交易中 (交易, 类别) 组合的个数
+        # 类别交易位图：按类别首次出现的顺序，每个类别一行，第 i 位表示第 i 条购买记录是否包含该类别
+        self.category_order = np.empty(0, dtype=np.int64)  # 位图行 -> 类别编码
+        self.category_rows = {}  # 商品种类 -> 位图行
+        self.category_bits = np.zeros((0, 0), dtype=np.uint64)
+        # 交易×类别关联矩阵 X 的非零元：(购买记录下标, 位图行)，按购买记录排序
+        self.incidence_transactions = np.empty(0, dtype=np.int64)
+        self.incidence_rows = np.empty(0, dtype=np.int64)
         
         self._load_product_data()
         self._load_purchase_data()
@@ -47,52 +107,240 @@ class CategoryAssociationAnalyzer:
             categories = set(self.product_category_map.values())
             print(f"📊 共有 {len(categories)} 种商品类别")
             
+            # 商品ID基本连续，以 商品ID - product_base 为下标建立类别编码表
+            self.category_names = sorted(categories)
+            if len(df):
+                product_ids = df['商品ID'].to_numpy(dtype=np.int64)
+                self.product_base = int(product_ids.min())
+                self.category_code_table = np.full(int(product_ids.max()) - self.product_base + 1, -1, dtype=np.int32)
+                self.category_code_table[product_ids - self.product_base] = np.searchsorted(
+                    self.category_names, df['商品种类'].to_numpy())
+            
         except Exception as e:
             print(f"❌ 加载商品数据失败: {e}")
             raise
     
+    def _purchase_files(self) -> List[str]:
+        """需要读取的购买数据文件：有分区清单时只返回与日期范围重叠的月份分区"""
+        if not self.partition_dir:
+            return [self.purchase_data_path]
+        try:
+            with open(os.path.join(self.partition_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取分区清单失败，改为读取完整数据文件: {e}")
+            return [self.purchase_data_path]
+        
+        # 清单中的时间戳为按 UTC 解释的 epoch 秒
+        start_ts = (self.start_date - datetime(1970, 1, 1)).total_seconds() if self.start_date else None
+        end_ts = (self.end_date - datetime(1970, 1, 1)).total_seconds() if self.end_date else None
+        files = []
+        for partition in manifest['partitions']:
+            if partition['rows'] == 0:
+                continue
+            if start_ts is not None and partition['max_ts'] < start_ts:
+                continue
+            if end_ts is not None and partition['min_ts'] > end_ts:
+                continue
+            files.append(os.path.join(self.partition_dir, partition['file']))
+        print(f"📂 读取 {len(files)}/{len(manifest['partitions'])} 个月份分区")
+        return files
+    
     def _load_purchase_data(self):
-        """加载购买数据"""
+        """加载购买数据（只保留日期范围内的交易）"""
         try:
-            df = pd.read_csv(self.purchase_data_path, encoding='utf-8')
-            self.purchase_data = df.to_dict('records')
+            files = self._purchase_files()
+            frames = [pd.read_csv(path, encoding='utf-8') for path in files]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['记录ID', '商品ID', '购买时间'])
+            if self.start_date or self.end_date:
+                purchase_times = pd.to_datetime(df['购买时间'])
+                mask = pd.Series(True, index=df.index)
+                if self.start_date:
+                    mask &= purchase_times >= self.start_date
+                if self.end_date:
+                    mask &= purchase_times <= self.end_date
+                df = df[mask]
+            if len(files) > 1:
+                # 分区按月份存放，按记录ID恢复原始交易顺序
+                df = df.sort_values('记录ID', kind='stable')
+            self.purchase_data = df
+            self._parse_product_lists(df)
             print(f"成功加载 {len(self.purchase_data)} 条购买记录")
         except Exception as e:
             print(f"❌ 加载购买数据失败: {e}")
             raise
     
+    def _parse_product_lists(self, df):
+        """将商品ID字段（单个ID或逗号分隔的多个ID）一次性解析为 CSR 数组，并查出每个商品的类别编码"""
+        product_strings = df['商品ID'].astype(str)
+        lengths = product_strings.str.count(',').to_numpy(dtype=np.int64) + 1
+        self.transaction_ids = df['记录ID'].to_numpy(dtype=np.int64)
+        self.product_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.product_offsets[1:])
+        if len(lengths):
+            self.product_values = np.array(','.join(product_strings).split(','), dtype=np.int64)
+        else:
+            self.product_values = np.empty(0, dtype=np.int64)
+        
+        offsets = self.product_values - self.product_base
+        known = (offsets >= 0) & (offsets < len(self.category_code_table))
+        self.item_categories = np.full(len(self.product_values), -1, dtype=np.int32)
+        self.item_categories[known] = self.category_code_table[offsets[known]]
+    
     def _process_transactions(self):
         """处理交易数据，构建商品种类-交易映射"""
         print("📊 处理交易数据，转换为商品种类...")
         
-        for record in self.purchase_data:
-            transaction_id = record['记录ID']
-            product_ids_str = str(record['商品ID'])
-            
-            # 解析商品ID（可能是单个ID或逗号分隔的多个ID）
-            if ',' in product_ids_str:
-                product_ids = [int(pid.strip()) for pid in product_ids_str.split(',')]
-            else:
-                product_ids = [int(product_ids_str)]
-            
-            # 转换为商品种类
-            categories_in_transaction = set()
-            for product_id in product_ids:
-                if product_id in self.product_category_map:
-                    category = self.product_category_map[product_id]
-                    categories_in_transaction.add(category)
-                else:
-                    print(f"⚠️ 警告: 商品ID {product_id} 在商品数据中未找到")
-            
-            # 建立映射关系
-            if categories_in_transaction:  # 只处理有有效种类的交易
-                self.transaction_categories[transaction_id] = categories_in_transaction
-                for category in categories_in_transaction:
-                    self.category_transactions[category].add(transaction_id)
+        for product_id in self.product_values[self.item_categories < 0].tolist():
+            print(f"⚠️ 警告: 商品ID {product_id} 在商品数据中未找到")
+        
+        # 每个商品所属的交易下标；去掉未知商品后按 (交易, 类别) 去重
+        lengths = np.diff(self.product_offsets)
+        item_transactions = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        known = self.item_categories >= 0
+        num_categories = max(len(self.category_names), 1)
+        pairs = np.unique(item_transactions[known] * num_categories + self.item_categories[known])
+        pair_transactions = pairs // num_categories
+        pair_codes = pairs % num_categories
+        self.category_counts = np.bincount(pair_codes, minlength=len(self.category_names))
+        self.category_pair_total = len(pairs)
+        self._build_category_bitsets(pair_transactions, pair_codes)
+        
+        # 建立映射关系（只包含有有效种类的交易）
+        transaction_ids = self.transaction_ids[pair_transactions].tolist()
+        categories = [self.category_names[code] for code in pair_codes.tolist()]
+        for transaction_id, category in zip(transaction_ids, categories):
+            self.transaction_categories[transaction_id].add(category)
+            self.category_transactions[category].add(transaction_id)
         
         self.total_transactions = len(self.transaction_categories)
         print(f"✅ 处理完成: {self.total_transactions} 个有效交易, {len(self.category_transactions)} 种商品类别")
     
+    def _build_category_bitsets(self, pair_transactions, pair_codes):
+        """
+        由去重后的 (交易下标, 类别编码) 组合构建类别交易位图
+        
+        每个类别一行，每行 ceil(购买记录数 / 64) 个 uint64 字；同一字内的各位互不重复，
+        按 (行, 字) 分组后用按位或归约即可一次写入
+        """
+        _, first_seen = np.unique(pair_codes, return_index=True)
+        self.category_order = np.unique(pair_codes)[np.argsort(first_seen, kind='stable')]
+        self.category_rows = {self.category_names[code]: row for row, code in enumerate(self.category_order.tolist())}
+        
+        words_per_row = (len(self.transaction_ids) + 63) // 64
+        self.category_bits = np.zeros((len(self.category_order), words_per_row), dtype=np.uint64)
+        row_of_code = np.full(max(len(self.category_names), 1), -1, dtype=np.int64)
+        row_of_code[self.category_order] = np.arange(len(self.category_order))
+        self.incidence_transactions = pair_transactions
+        self.incidence_rows = row_of_code[pair_codes]
+        if not len(pair_codes):
+            return
+        keys = self.incidence_rows * words_per_row + (pair_transactions >> 6)
+        bits = np.left_shift(np.uint64(1), (pair_transactions & 63).astype(np.uint64))
+        order = np.argsort(keys, kind='stable')
+        keys, bits = keys[order], bits[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.category_bits.reshape(-1)[keys[starts]] = np.bitwise_or.reduceat(bits, starts)
+    
+    def _pair_counts(self, row: int):
+        """位图第 row 行的类别与其后每一行类别的共同交易数（按位与后统计置位数，分批计算）"""
+        following = self.category_bits[row + 1:]
+        batch = max(1, BITSET_CHUNK_WORDS // max(following.shape[1], 1))
+        counts = np.empty(len(following), dtype=np.int64)
+        for start in range(0, len(following), batch):
+            counts[start:start + batch] = _popcount(following[start:start + batch] & self.category_bits[row])
+        return counts
+    
+    def cooccurrence_counts(self):
+        """
+        类别共现矩阵 XᵀX 上三角（不含对角线）的非零元，X 为交易×类别的 0/1 关联矩阵
+        
+        行列为位图行（category_order），对角线即各类别的交易数（category_counts），不重复返回。
+        安装 scipy 时一次稀疏矩阵乘法求出；否则把每笔交易内的类别两两展开为 (a, b) 组合并分批计数，
+        计算量与 Σ 每笔交易类别数² 成正比，同样不构建稠密矩阵
+        
+        Returns:
+            (rows_a, rows_b, counts): rows_a < rows_b，按 (rows_a, rows_b) 升序
+        """
+        num_rows = len(self.category_order)
+        if SCIPY_AVAILABLE:
+            incidence = sparse.csr_matrix(
+                (np.ones(len(self.incidence_rows), dtype=np.int64),
+                 (self.incidence_transactions, self.incidence_rows)),
+                shape=(len(self.transaction_ids), num_rows))
+            upper = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+            order = np.lexsort((upper.col, upper.row))
+            return (upper.row[order].astype(np.int64), upper.col[order].astype(np.int64),
+                    upper.data[order].astype(np.int64))
+        
+        # 每个非零元与同一交易内排在它后面的非零元各组成一对
+        transaction_starts = np.flatnonzero(np.r_[True, self.incidence_transactions[1:] != self.incidence_transactions[:-1]]) \
+            if len(self.incidence_transactions) else np.empty(0, dtype=np.int64)
+        lengths = np.diff(np.r_[transaction_starts, len(self.incidence_transactions)])
+        positions = np.arange(len(self.incidence_transactions)) - np.repeat(transaction_starts, lengths)
+        followers = np.repeat(lengths, lengths) - positions - 1
+        
+        # 按交易边界分批，每批约 BITSET_CHUNK_WORDS 个组合
+        pair_ends = np.cumsum(lengths * (lengths - 1) // 2)
+        bounds = np.r_[0, transaction_starts[1:][np.flatnonzero(np.diff(pair_ends // BITSET_CHUNK_WORDS))],
+                       len(self.incidence_transactions)] if len(lengths) else [0]
+        keys, counts = [], []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            repeat = followers[start:end]
+            left = np.repeat(np.arange(start, end), repeat)
+            right = left + 1 + np.arange(len(left)) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+            rows_left, rows_right = self.incidence_rows[left], self.incidence_rows[right]
+            batch_keys, batch_counts = np.unique(np.minimum(rows_left, rows_right) * num_rows +
+                                                 np.maximum(rows_left, rows_right), return_counts=True)
+            keys.append(batch_keys)
+            counts.append(batch_counts)
+        if not keys:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pair_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        pair_counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+        return pair_keys // num_rows, pair_keys % num_rows, pair_counts
+    
+    def _pair_candidates(self, engine: str, include_zero: bool):
+        """
+        各商品种类对（位图行 a < b）的共现次数，按枚举顺序（先 a 后 b）排列
+        
+        Args:
+            engine: 'matrix'（共现矩阵一次求出）或 'bitset'（位图逐行求交）
+            include_zero: 是否包含从未共同出现的种类对
+            
+        Returns:
+            (rows_a, rows_b, counts) 三个等长数组
+        """
+        num_rows = len(self.category_order)
+        if engine == 'bitset':
+            total_pairs = num_rows * (num_rows - 1) // 2
+            rows_a, rows_b, counts = [], [], []
+            processed = 0
+            for row in range(num_rows - 1):
+                row_counts = self._pair_counts(row)
+                following = np.arange(row + 1, num_rows) if include_zero else np.flatnonzero(row_counts) + row + 1
+                rows_a.append(np.full(len(following), row, dtype=np.int64))
+                rows_b.append(following)
+                counts.append(row_counts[following - row - 1])
+                if (processed + len(row_counts)) // 1000 > processed // 1000:
+                    print(f"  进度: {processed + len(row_counts)}/{total_pairs} "
+                          f"({(processed + len(row_counts))/total_pairs*100:.1f}%)")
+                processed += len(row_counts)
+            if not rows_a:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            return np.concatenate(rows_a), np.concatenate(rows_b), np.concatenate(counts)
+        if engine != 'matrix':
+            raise ValueError(f"未知的关联计算方式: {engine}")
+        
+        rows_a, rows_b, counts = self.cooccurrence_counts()
+        if include_zero:
+            # 补齐从未共同出现的种类对（共现次数为 0）
+            all_a, all_b = np.triu_indices(num_rows, k=1)
+            all_counts = np.zeros(len(all_a), dtype=np.int64)
+            all_counts[np.searchsorted(all_a * num_rows + all_b, rows_a * num_rows + rows_b)] = counts
+            rows_a, rows_b, counts = all_a.astype(np.int64), all_b.astype(np.int64), all_counts
+        return rows_a, rows_b, counts
+    
     def calculate_support(self, category_set: Set[str]) -> float:
         """
         计算商品种类集合的支持度
@@ -106,16 +354,16 @@ class CategoryAssociationAnalyzer:
         if not category_set:
             return 0.0
         
-        # 找到包含所有种类的交易
-        transactions_with_all = None
-        for category in category_set:
-            category_transactions = self.category_transactions[category]
-            if transactions_with_all is None:
-                transactions_with_all = category_transactions.copy()
-            else:
-                transactions_with_all &= category_transactions
+        # 对各种类的交易位图按位与，置位数即包含所有种类的交易数
+        rows = [self.category_rows.get(category) for category in category_set]
+        if None in rows:
+            return 0.0
+        transactions_with_all = self.category_bits[rows[0]].copy()
+        for row in rows[1:]:
+            transactions_with_all &= self.category_bits[row]
+        count = int(_popcount(transactions_with_all))
         
-        return len(transactions_with_all) / self.total_transactions if transactions_with_all else 0.0
+        return count / self.total_transactions if count else 0.0
     
     def calculate_confidence(self, antecedent: Set[str], consequent: Set[str]) -> float:
         """
@@ -155,77 +403,78 @@ class CategoryAssociationAnalyzer:
         
         return support_ab / (support_a * support_b)
     
-    def find_frequent_category_pairs(self, min_support: float = 0.001, min_confidence: float = 0.03) -> List[Dict]:
+    def _pair_info(self, category_a: str, category_b: str, support_ab: float,
+                   confidence_a_to_b: float, confidence_b_to_a: float, lift: float) -> Dict:
+        """一个商品种类对的关联指标"""
+        support_ab = float(support_ab)
+        return {
+            'category_a': category_a,
+            'category_b': category_b,
+            'support': support_ab,
+            'confidence_a_to_b': float(confidence_a_to_b),
+            'confidence_b_to_a': float(confidence_b_to_a),
+            'lift': float(lift),
+            'transactions_count': int(support_ab * self.total_transactions)
+        }
+    
+    def find_frequent_category_pairs(self, min_support: float = 0.001, min_confidence: float = 0.03,
+                                     engine: str = 'matrix') -> List[Dict]:
         """
         找出频繁商品种类对
         
         Args:
             min_support: 最小支持度阈值
             min_confidence: 最小置信度阈值
+            engine: 共现次数的计算方式，'matrix'（共现矩阵 XᵀX，默认）或 'bitset'（位图逐行求交）
             
         Returns:
             频繁商品种类对列表
         """
         print(f"🔍 分析商品种类关联 (最小支持度: {min_support}, 最小置信度: {min_confidence})...")
         
-        frequent_pairs = []
-        all_pairs_info = []  # 存储所有商品对的信息用于调试
-        categories = list(self.category_transactions.keys())
+        categories = [self.category_names[code] for code in self.category_order.tolist()]
         
-        # 生成所有商品种类对组合
-        total_pairs = len(list(combinations(categories, 2)))
+        # 所有商品种类对组合
+        total_pairs = len(categories) * (len(categories) - 1) // 2
         print(f"📈 需要分析 {total_pairs} 个商品种类对...")
         
-        processed = 0
-        support_count = 0  # 满足支持度的计数
-        confidence_count = 0  # 满足置信度的计数
-        
-        for category_a, category_b in combinations(categories, 2):
-            processed += 1
-            if processed % 1000 == 0:
-                print(f"  进度: {processed}/{total_pairs} ({processed/total_pairs*100:.1f}%)")
-            
-            set_a = {category_a}
-            set_b = {category_b}
-            set_ab = {category_a, category_b}
-            
-            # 计算各种指标
-            support_ab = self.calculate_support(set_ab)
-            confidence_a_to_b = self.calculate_confidence(set_a, set_b)
-            confidence_b_to_a = self.calculate_confidence(set_b, set_a)
-            lift = self.calculate_lift(set_a, set_b)
-            
-            # 记录所有商品对信息（前100个用于调试）
-            if len(all_pairs_info) < 100:
-                all_pairs_info.append({
-                    'category_a': category_a,
-                    'category_b': category_b,
-                    'support': support_ab,
-                    'confidence_a_to_b': confidence_a_to_b,
-                    'confidence_b_to_a': confidence_b_to_a,
-                    'lift': lift,
-                    'transactions_count': int(support_ab * self.total_transactions)
-                })
-            
-            # 检查支持度
-            if support_ab >= min_support:
-                support_count += 1
-                
-                # 检查置信度
-                if confidence_a_to_b >= min_confidence or confidence_b_to_a >= min_confidence:
-                    confidence_count += 1
-                    frequent_pairs.append({
-                        'category_a': category_a,
-                        'category_b': category_b,
-                        'support': support_ab,
-                        'confidence_a_to_b': confidence_a_to_b,
-                        'confidence_b_to_a': confidence_b_to_a,
-                        'lift': lift,
-                        'transactions_count': int(support_ab * self.total_transactions)
-                    })
-        
-        # 按支持度排序
-        frequent_pairs.sort(key=lambda x: x['support'], reverse=True)
+        # 从未共同出现的种类对支持度为 0，只有最小支持度不大于 0 时才需要
+        rows_a, rows_b, counts = self._pair_candidates(engine, include_zero=min_support <= 0)
+        
+        # 对所有种类对同时计算各项指标（与逐对计算的浮点运算顺序相同，结果一致）
+        supports = self.category_counts[self.category_order] / max(self.total_transactions, 1)
+        support_ab = counts / max(self.total_transactions, 1)
+        confidence_a_to_b = support_ab / supports[rows_a]
+        confidence_b_to_a = support_ab / supports[rows_b]
+        lift = support_ab / (supports[rows_a] * supports[rows_b])
+        
+        # 检查支持度和置信度
+        supported = support_ab >= min_support
+        confident = supported & ((confidence_a_to_b >= min_confidence) | (confidence_b_to_a >= min_confidence))
+        support_count = int(supported.sum())  # 满足支持度的计数
+        confidence_count = int(confident.sum())  # 满足置信度的计数
+        
+        # 按支持度排序（稳定排序，支持度相同时保持枚举顺序）
+        selected = np.flatnonzero(confident)
+        selected = selected[np.argsort(-support_ab[selected], kind='stable')]
+        frequent_pairs = [
+            self._pair_info(categories[rows_a[index]], categories[rows_b[index]], support_ab[index],
+                            confidence_a_to_b[index], confidence_b_to_a[index], lift[index])
+            for index in selected.tolist()
+        ]
+        
+        # 前100个商品对的信息用于调试（包括从未共同出现的种类对）
+        all_pairs_info = []
+        candidate_keys = rows_a * max(len(categories), 1) + rows_b
+        for row_a, row_b in combinations(range(len(categories)), 2):
+            if len(all_pairs_info) >= 100:
+                break
+            position = np.searchsorted(candidate_keys, row_a * len(categories) + row_b)
+            found = position < len(candidate_keys) and candidate_keys[position] == row_a * len(categories) + row_b
+            pair_support = (counts[position] if found else 0) / self.total_transactions
+            all_pairs_info.append(self._pair_info(
+                categories[row_a], categories[row_b], pair_support, pair_support / supports[row_a],
+                pair_support / supports[row_b], pair_support / (supports[row_a] * supports[row_b])))
         all_pairs_info.sort(key=lambda x: x['support'], reverse=True)
         
         # 输出调试信息
@@ -260,6 +509,125 @@ class CategoryAssociationAnalyzer:
         print(f"✅ 找到 {len(frequent_pairs)} 个满足条件的商品种类对")
         return frequent_pairs
     
+    def find_frequent_itemsets(self, min_support: float = 0.001, max_length: int = None,
+                               time_budget: float = None) -> List[Dict]:
+        """
+        挖掘任意大小的频繁商品种类组合（Eclat：在类别交易位图上深度优先求交）
+        
+        两两组合的计数直接取自共现矩阵，不对位图逐对求交；三个及以上种类的组合只在频繁前缀上
+        继续扩展，位图按位与后统计置位数，不生成 Apriori 式的候选集
+        
+        Args:
+            min_support: 最小支持度阈值
+            max_length: 组合最多包含的种类数，为 None 时不限制
+            time_budget: 挖掘时间上限（秒），超时后停止扩展并返回已找到的组合
+            
+        Returns:
+            频繁组合列表（按支持度降序），每项包含 categories（按名称排序的种类元组）、support 和 transactions_count
+        """
+        print(f"🔍 挖掘频繁商品种类组合 (最小支持度: {min_support}, 最大长度: {max_length or '不限'})...")
+        started = time.perf_counter()
+        total = max(self.total_transactions, 1)
+        categories = [self.category_names[code] for code in self.category_order.tolist()]
+        counts = self.category_counts[self.category_order]
+        itemsets = []  # (位图行元组, 交易数)
+        
+        frequent_rows = np.flatnonzero(counts / total >= min_support)
+        itemsets.extend(((row,), int(counts[row])) for row in frequent_rows.tolist())
+        
+        # 频繁的两两组合直接取自共现矩阵；partners 为每个种类的频繁搭配种类（行号更大者）
+        partners = defaultdict(set)
+        if max_length is None or max_length >= 2:
+            rows_a, rows_b, pair_counts = self.cooccurrence_counts()
+            frequent = pair_counts / total >= min_support
+            for row_a, row_b, count in zip(rows_a[frequent].tolist(), rows_b[frequent].tolist(),
+                                           pair_counts[frequent].tolist()):
+                itemsets.append(((row_a, row_b), count))
+                partners[row_a].add(row_b)
+        
+        def expand(prefix, prefix_bits, candidates):
+            """
+            prefix 及其后每个候选种类组成的组合均已频繁：依次在其位图上加入更后面的候选种类，
+            记录新的频繁组合并继续扩展。超时返回 False
+            """
+            for index, row in enumerate(candidates):
+                if time_budget is not None and time.perf_counter() - started > time_budget:
+                    return False
+                # 组合的任意两个种类都必须是频繁搭配
+                following = [next_row for next_row in candidates[index + 1:] if next_row in partners[row]]
+                if not following:
+                    continue
+                bits = prefix_bits & self.category_bits[row]
+                following = np.asarray(following, dtype=np.int64)
+                following_counts = np.empty(len(following), dtype=np.int64)
+                batch = max(1, BITSET_CHUNK_WORDS // max(len(bits), 1))
+                for start in range(0, len(following), batch):
+                    following_counts[start:start + batch] = _popcount(
+                        self.category_bits[following[start:start + batch]] & bits)
+                keep = following_counts / total >= min_support
+                itemset = prefix + (row,)
+                itemsets.extend((itemset + (next_row,), count) for next_row, count in
+                                zip(following[keep].tolist(), following_counts[keep].tolist()))
+                if (max_length is None or len(itemset) + 2 <= max_length) and keep.sum() > 1:
+                    if not expand(itemset, bits, following[keep].tolist()):
+                        return False
+            return True
+        
+        if max_length is None or max_length >= 3:
+            for row in frequent_rows.tolist():
+                if len(partners[row]) < 2:
+                    continue
+                if not expand((row,), self.category_bits[row], sorted(partners[row])):
+                    print(f"⚠️ 已达到时间上限 ({time_budget} 秒)，结果可能不完整")
+                    break
+        
+        result = [{
+            'categories': tuple(sorted(categories[row] for row in rows)),
+            'support': count / self.total_transactions,
+            'transactions_count': count,
+        } for rows, count in itemsets]
+        result.sort(key=lambda x: (-x['support'], len(x['categories']), x['categories']))
+        
+        print(f"✅ 找到 {len(result)} 个频繁商品种类组合，用时 {time.perf_counter() - started:.2f} 秒")
+        return result
+    
+    def generate_association_rules(self, itemsets: List[Dict], min_confidence: float = 0.03) -> List[Dict]:
+        """
+        由频繁组合生成关联规则 前件 → 后件
+        
+        Args:
+            itemsets: find_frequent_itemsets 的结果（所有子集的支持度都应在其中）
+            min_confidence: 最小置信度阈值
+            
+        Returns:
+            规则列表（按支持度、置信度降序），每项包含 antecedent、consequent（种类元组）、
+            support、confidence 和 lift
+        """
+        supports = {frozenset(itemset['categories']): itemset['support'] for itemset in itemsets}
+        rules = []
+        for itemset in itemsets:
+            items = itemset['categories']
+            for size in range(1, len(items)):
+                for antecedent in combinations(items, size):
+                    consequent = tuple(item for item in items if item not in antecedent)
+                    support_antecedent = supports.get(frozenset(antecedent))
+                    support_consequent = supports.get(frozenset(consequent))
+                    if not support_antecedent or not support_consequent:
+                        continue
+                    confidence = itemset['support'] / support_antecedent
+                    if confidence < min_confidence:
+                        continue
+                    rules.append({
+                        'antecedent': antecedent,
+                        'consequent': consequent,
+                        'support': itemset['support'],
+                        'confidence': confidence,
+                        'lift': itemset['support'] / (support_antecedent * support_consequent),
+                    })
+        rules.sort(key=lambda x: (x['support'], x['confidence']), reverse=True)
+        print(f"✅ 生成 {len(rules)} 条关联规则 (最小置信度: {min_confidence})")
+        return rules
+    
     def save_associations_to_csv(self, associations: List[Dict], output_path: str):
         """
         将关联结果保存为CSV文件
@@ -293,15 +661,17 @@ class CategoryAssociationAnalyzer:
     
     def get_category_statistics(self) -> Dict:
         """获取商品种类统计信息"""
-        category_counts = {}
-        for category, transactions in self.category_transactions.items():
-            category_counts[category] = len(transactions)
+        # 交易数在处理交易时已按类别编码计数，这里只为前10个类别取回名称
+        top_codes = np.argsort(-self.category_counts, kind='stable')[:10]
+        most_frequent = [(self.category_names[code], int(self.category_counts[code]))
+                         for code in top_codes.tolist() if self.category_counts[code] > 0]
         
         return {
             'total_categories': len(self.category_transactions),
             'total_transactions': self.total_transactions,
-            'avg_categories_per_transaction': np.mean([len(categories) for categories in self.transaction_categories.values()]),
-            'most_frequent_categories': sorted(category_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+            'avg_categories_per_transaction': (self.category_pair_total / self.total_transactions
+                                               if self.total_transactions else np.nan),
+            'most_frequent_categories': most_frequent
         }
     
     def print_analysis_summary(self, associations: List[Dict]):
@@ -337,7 +707,11 @@ def analyze_category_associations(purchase_data_path: str,
                                 product_data_path: str,
                                 output_path: str = None,
                                 min_support: float = 0.001,
-                                min_confidence: float = 0.03) -> List[Dict]:
+                                min_confidence: float = 0.03,
+                                start_date: str = None,
+                                end_date: str = None,
+                                partition_dir: str = None,
+                                engine: str = 'matrix') -> List[Dict]:
     """
     分析商品种类关联的便捷函数
     
@@ -347,15 +721,20 @@ def analyze_category_associations(purchase_data_path: str,
         output_path: 输出CSV文件路径（可选）
         min_support: 最小支持度
         min_confidence: 最小置信度
+        start_date: 开始日期（YYYY-MM-DD，可选）
+        end_date: 结束日期（YYYY-MM-DD，可选）
+        partition_dir: 按月分区目录（可选），指定时只读取与日期范围重叠的分区
+        engine: 共现次数的计算方式，'matrix'（默认）或 'bitset'
         
     Returns:
         关联分析结果列表
     """
     # 创建分析器
-    analyzer = CategoryAssociationAnalyzer(purchase_data_path, product_data_path)
+    analyzer = CategoryAssociationAnalyzer(purchase_data_path, product_data_path,
+                                           start_date, end_date, partition_dir)
     
     # 执行关联分析
-    associations = analyzer.find_frequent_category_pairs(min_support, min_confidence)
+    associations = analyzer.find_frequent_category_pairs(min_support, min_confidence, engine)
     
     # 打印摘要
     analyzer.print_analysis_summary(associations)
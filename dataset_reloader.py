@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+数据集热替换
+后台线程监视数据文件，文件变化后在请求路径之外构建新的实例，
+构建完成后以读-复制-更新（RCU）方式原子替换当前实例
+"""
+
+import os
+import threading
+import time
+
+
+class DatasetReloader:
+    """
+    持有当前数据集实例并在数据文件变化时后台重建
+
+    请求处理时只读取一次 current 并在整个请求中使用该引用：
+    替换只是一次引用赋值，进行中的请求继续使用旧实例直到结束，
+    新请求立即使用新实例，任何请求都不会等待数据加载
+    """
+
+    def __init__(self, factory, paths, interval=5.0, instance=None, validate=None, on_swap=None):
+        """
+        Args:
+            factory: 无参可调用对象，返回完整加载好的新实例
+            paths: 需要监视的数据文件路径列表
+            interval: 检查文件变化的间隔（秒）
+            instance: 初始实例，为 None 时立即调用 factory 构建
+            validate: 可选，接收新实例并返回是否可用，不可用时不替换
+            on_swap: 可选，替换成功后以新实例调用（例如同步到共享实例注册表）
+        """
+        self.factory = factory
+        self.validate = validate
+        self.on_swap = on_swap
+        self.paths = list(paths)
+        self.interval = interval
+        self.current = instance if instance is not None else factory()
+        self.generation = 1  # 已生效的实例代数
+        self.last_error = None
+        self._signature = self._stat_signature()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat_signature(self):
+        """各数据文件的 (大小, 修改时间)，文件不存在时为 None"""
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def start(self):
+        """启动后台监视线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dataset-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台监视线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        pending = None
+        while not self._stop.wait(self.interval):
+            signature = self._stat_signature()
+            if signature == self._signature:
+                pending = None
+                continue
+            # 连续两次检查结果一致才重建，避免读取到正在写入的文件
+            if signature != pending:
+                pending = signature
+                continue
+            self.reload(signature)
+            pending = None
+
+    def reload(self, signature=None):
+        """
+        构建新实例并原子替换当前实例；构建失败时保留旧实例
+
+        Returns:
+            bool: 是否替换成功
+        """
+        signature = signature or self._stat_signature()
+        started = time.time()
+        try:
+            instance = self.factory()
+            if self.validate is not None and not self.validate(instance):
+                raise ValueError("新数据校验未通过")
+        except Exception as e:
+            # 记录本次签名，文件再次变化前不重复构建
+            self._signature = signature
+            self.last_error = str(e)
+            print(f"⚠️ 数据热更新失败，继续使用当前数据: {e}")
+            return False
+        self.current = instance
+        if self.on_swap is not None:
+            self.on_swap(instance)
+        self._signature = signature
+        self.generation += 1
+        self.last_error = None
+        print(f"✅ 数据已热更新（第 {self.generation} 代，构建耗时 {time.time() - started:.2f}s）")
+        return True
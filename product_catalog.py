@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+商品信息查找表
+商品ID基本连续（如 1001–2000），以 商品ID - base 为下标保存每个商品的类别编码和单价，
+类别名称只保存在按名称排序的词表中；分析时按编码计数，只在生成结果时换回名称
+"""
+
+from purchase_store import np
+
+# 商品ID跨度超过商品数的该倍数（且超过下限）时视为稀疏，改用字典查找
+DENSE_SPAN_FACTOR = 4
+DENSE_SPAN_MIN = 1024
+
+
+class ProductCatalog:
+    """
+    商品ID -> 类别编码 / 单价的稠密查找表
+
+    未知商品（或类别为空的商品）的类别编码为 -1，未知商品的单价为 0
+    """
+
+    def __init__(self, product_map, product_prices):
+        """
+        Args:
+            product_map: 商品ID -> 商品种类
+            product_prices: 商品ID -> 单价
+        """
+        self.categories = sorted(set(category for category in product_map.values() if category))
+        self.category_index = {category: code for code, category in enumerate(self.categories)}
+        ids = sorted(product_map)
+        self.base = ids[0] if ids else 0
+        span = ids[-1] - self.base + 1 if ids else 0
+        self.dense = span <= max(DENSE_SPAN_FACTOR * len(ids), DENSE_SPAN_MIN)
+        if self.dense:
+            self.code_table = [-1] * span
+            self.price_table = [0] * span
+            for product_id in ids:
+                self.code_table[product_id - self.base] = self.category_index.get(product_map[product_id], -1)
+                self.price_table[product_id - self.base] = product_prices.get(product_id, 0)
+        else:
+            self.code_table = {product_id: self.category_index.get(product_map[product_id], -1)
+                               for product_id in ids}
+            self.price_table = {product_id: product_prices.get(product_id, 0) for product_id in ids}
+        self._arrays = None  # NumPy 版查找表，首次向量化查询时构建
+
+    def __len__(self):
+        """类别数"""
+        return len(self.categories)
+
+    def category_code(self, product_id):
+        """单个商品的类别编码"""
+        if not self.dense:
+            return self.code_table.get(product_id, -1)
+        offset = product_id - self.base
+        if 0 <= offset < len(self.code_table):
+            return self.code_table[offset]
+        return -1
+
+    def price(self, product_id):
+        """单个商品的单价"""
+        if not self.dense:
+            return self.price_table.get(product_id, 0)
+        offset = product_id - self.base
+        if 0 <= offset < len(self.price_table):
+            return self.price_table[offset]
+        return 0
+
+    def category_codes(self, product_ids):
+        """一组商品的类别编码列表"""
+        return [self.category_code(product_id) for product_id in product_ids]
+
+    def lookup_array(self, product_ids):
+        """
+        向量化查询（需要 NumPy）
+
+        Args:
+            product_ids: 商品ID数组
+
+        Returns:
+            (np.ndarray, np.ndarray): 与 product_ids 等长的 int32 类别编码和 float64 单价
+        """
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if self._arrays is None:
+            if self.dense:
+                self._arrays = (np.array(self.code_table, dtype=np.int32),
+                                np.array(self.price_table, dtype=np.float64))
+            else:
+                lookup_ids = sorted(self.code_table)
+                self._arrays = (np.array(lookup_ids, dtype=np.int64),
+                                np.array([self.code_table[pid] for pid in lookup_ids], dtype=np.int32),
+                                np.array([self.price_table[pid] for pid in lookup_ids], dtype=np.float64))
+        codes = np.full(product_ids.shape, -1, dtype=np.int32)
+        prices = np.zeros(product_ids.shape, dtype=np.float64)
+        if self.dense:
+            code_array, price_array = self._arrays
+            offsets = product_ids - self.base
+            valid = (offsets >= 0) & (offsets < len(code_array))
+            codes[valid] = code_array[offsets[valid]]
+            prices[valid] = price_array[offsets[valid]]
+        else:
+            lookup_ids, lookup_codes, lookup_prices = self._arrays
+            if len(lookup_ids):
+                pos = np.minimum(np.searchsorted(lookup_ids, product_ids), len(lookup_ids) - 1)
+                found = lookup_ids[pos] == product_ids
+                codes[found] = lookup_codes[pos[found]]
+                prices[found] = lookup_prices[pos[found]]
+        return codes, prices
+
+    def category_codes_array(self, product_ids):
+        """向量化查询类别编码（需要 NumPy）"""
+        return self.lookup_array(product_ids)[0]
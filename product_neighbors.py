@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+商品级关联（"买了X的人也买了Y"）
+在 商品ID 粒度上统计两两共同购买的次数，每个商品只保留按提升度（或置信度）排名的前 N 个相关商品。
+共现次数按商品分批统计，每批只展开该批商品所在交易内的商品对，不构建 商品数×商品数 的稠密矩阵，
+结果占用 O(商品数 × N) 的内存，保存为紧凑的 .npz 文件供 ProductRecommendationAPI 加载
+
+生成命令:
+    python3 product_neighbors.py <购买数据CSV> [输出文件] [每个商品保留的相关商品数]
+"""
+
+import os
+import tempfile
+
+from purchase_store import NUMPY_AVAILABLE, PurchaseStore, np
+
+# 文件格式版本，格式变化时递增，旧文件不再加载
+NEIGHBORS_VERSION = 1
+NEIGHBORS_FILE_NAME = "product_neighbors.npz"
+METRICS = ('lift', 'confidence')
+
+# 每批最多展开的商品对数（控制临时数组大小）
+PAIR_BATCH_SIZE = 1 << 23
+
+
+class ProductNeighbors:
+    """
+    每个商品的前 N 个相关商品（CSR 布局）
+
+    第 i 个商品 product_ids[i] 的相关商品为 neighbor_ids[offsets[i]:offsets[i + 1]]，按排名先后排列，
+    counts / confidence / lift 与 neighbor_ids 等长：
+        - counts: 两个商品共同出现的交易数
+        - confidence: 买了该商品的交易中也买了相关商品的比例
+        - lift: 提升度，confidence / 相关商品的支持度
+    """
+
+    def __init__(self, product_ids, offsets, neighbor_ids, counts, confidence, lift,
+                 metric='lift', transactions=0):
+        self.product_ids = product_ids
+        self.offsets = offsets
+        self.neighbor_ids = neighbor_ids
+        self.counts = counts
+        self.confidence = confidence
+        self.lift = lift
+        self.metric = metric
+        self.transactions = transactions
+
+    def __len__(self):
+        """有相关商品记录的商品数"""
+        return len(self.product_ids)
+
+    def neighbors(self, product_id, limit=None):
+        """
+        查询商品的相关商品
+
+        Args:
+            product_id: 商品ID
+            limit: 最多返回的个数，为 None 时返回全部
+
+        Returns:
+            list: [{'product_id', 'count', 'confidence', 'lift'}, ...]，按排名先后排列；未知商品返回空列表
+        """
+        position = int(np.searchsorted(self.product_ids, product_id))
+        if position >= len(self.product_ids) or self.product_ids[position] != product_id:
+            return []
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return [
+            {'product_id': product, 'count': count, 'confidence': confidence, 'lift': lift}
+            for product, count, confidence, lift in zip(
+                self.neighbor_ids[start:end].tolist(), self.counts[start:end].tolist(),
+                self.confidence[start:end].tolist(), self.lift[start:end].tolist())
+        ]
+
+    def save(self, path):
+        """保存为未压缩的 .npz 文件（先写临时文件再原子替换）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".neighbors-", suffix='.npz', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, version=np.int64(NEIGHBORS_VERSION), metric=np.str_(self.metric),
+                         transactions=np.int64(self.transactions),
+                         product_ids=self.product_ids, offsets=self.offsets, neighbor_ids=self.neighbor_ids,
+                         counts=self.counts, confidence=self.confidence, lift=self.lift)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """加载 save() 写出的文件，版本不符或数组长度不一致时抛出 ValueError"""
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != NEIGHBORS_VERSION:
+                raise ValueError(f"商品关联文件版本不符: {path}")
+            neighbors = cls(data['product_ids'], data['offsets'], data['neighbor_ids'], data['counts'],
+                            data['confidence'], data['lift'], str(data['metric']), int(data['transactions']))
+        size = len(neighbors.neighbor_ids)
+        if (len(neighbors.offsets) != len(neighbors.product_ids) + 1
+                or int(neighbors.offsets[-1]) != size
+                or any(len(column) != size for column in (neighbors.counts, neighbors.confidence, neighbors.lift))):
+            raise ValueError(f"商品关联文件数组长度不一致: {path}")
+        return neighbors
+
+
+def _transaction_items(product_offsets, product_values):
+    """
+    每笔交易内去重后的商品
+
+    Returns:
+        (items, starts, lengths): items 为按 (交易, 商品ID) 排序的商品ID；
+        starts / lengths 为每笔非空交易在 items 中的起点和商品数
+    """
+    lengths = np.diff(np.asarray(product_offsets, dtype=np.int64))
+    transactions = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    values = np.asarray(product_values, dtype=np.int64)
+    order = np.lexsort((values, transactions))
+    transactions, values = transactions[order], values[order]
+    unique = np.r_[True, (transactions[1:] != transactions[:-1]) | (values[1:] != values[:-1])] \
+        if len(values) else np.empty(0, dtype=bool)
+    transactions, values = transactions[unique], values[unique]
+    starts = np.flatnonzero(np.r_[True, transactions[1:] != transactions[:-1]]) \
+        if len(transactions) else np.empty(0, dtype=np.int64)
+    return values, starts, np.diff(np.r_[starts, len(values)])
+
+
+def mine_product_neighbors(product_offsets, product_values, top_n=20, metric='lift', min_count=2):
+    """
+    统计商品两两共同购买的次数，为每个商品保留前 top_n 个相关商品
+
+    共现次数按商品分批统计：每批只取一段商品（按编号），展开这些商品与同一交易内其他商品组成的有序对，
+    计数后立即截取每个商品的前 top_n 个，每批的临时数组约 PAIR_BATCH_SIZE 个元素
+
+    Args:
+        product_offsets / product_values: 商品ID 的 CSR 布局（如 PurchaseStore 的同名列）
+        top_n: 每个商品保留的相关商品数
+        metric: 排名依据，'lift'（提升度）或 'confidence'（置信度）；相同时按共现次数、商品ID排列
+        min_count: 最少共同出现的交易数，过滤偶然的共现
+
+    Returns:
+        ProductNeighbors
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知的排名依据: {metric}（可选: {', '.join(METRICS)}）")
+
+    items, starts, lengths = _transaction_items(product_offsets, product_values)
+    transactions = len(starts)
+    product_ids, item_codes = np.unique(items, return_inverse=True)
+    item_codes = item_codes.astype(np.int64)
+    product_counts = np.bincount(item_codes, minlength=len(product_ids))
+
+    # 每个商品作为前件展开的商品对数，按累计值把商品分成若干批
+    item_lengths = np.repeat(lengths, lengths)
+    item_starts = np.repeat(starts, lengths)
+    pair_totals = np.cumsum(np.bincount(item_codes, weights=item_lengths - 1, minlength=len(product_ids)))
+    batches = int(pair_totals[-1] // PAIR_BATCH_SIZE) + 1 if len(pair_totals) else 1
+    bounds = np.unique(np.r_[0, np.searchsorted(pair_totals, np.arange(1, batches) * PAIR_BATCH_SIZE),
+                             len(product_ids)])
+
+    result_codes, result_neighbors, result_counts = [], [], []
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        selected = np.flatnonzero((item_codes >= low) & (item_codes < high) & (item_lengths > 1))
+        if not len(selected):
+            continue
+        # 商品与其所在交易内的每个商品（含自身，随后去掉）组成有序对
+        repeat = item_lengths[selected]
+        left = np.repeat(selected, repeat)
+        right = (np.repeat(item_starts[selected], repeat) + np.arange(len(left))
+                 - np.repeat(np.cumsum(repeat) - repeat, repeat))
+        distinct = left != right
+        keys = (item_codes[left[distinct]] - low) * len(product_ids) + item_codes[right[distinct]]
+        keys, counts = np.unique(keys, return_counts=True)
+        frequent = counts >= min_count
+        keys, counts = keys[frequent], counts[frequent]
+        codes, neighbors = keys // len(product_ids) + low, keys % len(product_ids)
+
+        # 每个商品按指标降序（再按共现次数降序、商品编号升序）取前 top_n 个
+        scores = counts / product_counts[codes]
+        if metric == 'lift':
+            scores = scores * transactions / product_counts[neighbors]
+        order = np.lexsort((neighbors, -counts, -scores, codes))
+        codes, neighbors, counts = codes[order], neighbors[order], counts[order]
+        group_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) \
+            if len(codes) else np.empty(0, dtype=np.int64)
+        ranks = np.arange(len(codes)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(codes)]))
+        keep = ranks < top_n
+        result_codes.append(codes[keep])
+        result_neighbors.append(neighbors[keep])
+        result_counts.append(counts[keep])
+
+    codes = np.concatenate(result_codes) if result_codes else np.empty(0, dtype=np.int64)
+    neighbors = np.concatenate(result_neighbors) if result_neighbors else np.empty(0, dtype=np.int64)
+    counts = np.concatenate(result_counts) if result_counts else np.empty(0, dtype=np.int64)
+    confidence = counts / product_counts[codes]
+    lift = confidence * transactions / product_counts[neighbors]
+
+    # 只保留有相关商品的商品
+    with_neighbors = np.unique(codes)
+    offsets = np.zeros(len(with_neighbors) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(np.searchsorted(with_neighbors, codes), minlength=len(with_neighbors)), out=offsets[1:])
+    return ProductNeighbors(product_ids[with_neighbors], offsets, product_ids[neighbors],
+                            counts.astype(np.int32), confidence, lift, metric, transactions)
+
+
+def default_neighbors_path(purchase_data_path):
+    """默认输出路径：购买数据CSV同级的 product_neighbors.npz"""
+    return os.path.join(os.path.dirname(os.path.abspath(purchase_data_path)), NEIGHBORS_FILE_NAME)
+
+
+def main():
+    """命令行生成商品关联文件"""
+    import sys
+
+    if len(sys.argv) not in (2, 3, 4):
+        print("🔗 商品级关联挖掘工具")
+        print("使用方法: python3 product_neighbors.py <购买数据CSV> [输出文件] [每个商品保留的相关商品数]")
+        print("示例: python3 product_neighbors.py data/user_purchase_data.csv data/product_neighbors.npz 20")
+        return
+
+    if not NUMPY_AVAILABLE:
+        print("❌ 商品级关联挖掘需要安装 NumPy")
+        return
+
+    purchase_data_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) >= 3 else default_neighbors_path(purchase_data_path)
+    try:
+        top_n = int(sys.argv[3]) if len(sys.argv) == 4 else 20
+        store = PurchaseStore.from_csv(purchase_data_path)
+        neighbors = mine_product_neighbors(store.product_offsets, store.product_values, top_n=top_n)
+        neighbors.save(output_path)
+        print(f"✅ 已为 {len(neighbors)} 个商品写出相关商品（每个最多 {top_n} 个）到 {output_path}")
+    except Exception as e:
+        print(f"❌ 生成失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,44 +2,108 @@
 """
 智能商品推荐API
 基于用户购物习惯、需求、预算、送礼对象等信息，使用通义千问大模型推荐合适的商品
+
+数据和较重的依赖（NumPy、requests）都在首次实际使用时才加载/导入，
+导入本模块和创建 ProductRecommendationAPI 实例本身不读取任何数据文件
 """
 
 import json
 import csv
 import os
+import threading
+import time
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Any
 from datetime import datetime
-import requests
-from analyze_user_api import UserPurchaseAnalyzer
+
+
+class RequestContext:
+    """
+    单次请求的上下文
+
+    同一请求中的输入校验、提示词构建、智能建议和响应组装共享同一个上下文：
+    用户画像（购买习惯分析结果）和预算参考值各只计算一次；
+    各阶段耗时（毫秒）记录在 timings 中
+    """
+
+    def __init__(self, api: 'ProductRecommendationAPI', user_id: int):
+        self.api = api
+        self.user_id = user_id
+        self.timings = {}  # 阶段名称 -> 耗时（毫秒），按执行顺序
+        self._profile = None
+        self._profile_loaded = False
+        self._budget_reference = None
+        self._budget_loaded = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个阶段的耗时，同名阶段多次执行时累加"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timings[name] = round(self.timings.get(name, 0) + elapsed, 3)
+
+    def profile(self) -> Optional[Dict]:
+        """用户完整的购买习惯分析结果（只分析一次）"""
+        if not self._profile_loaded:
+            with self.stage("profile"):
+                self._profile = self.api.user_analyzer.analyze_user_habits(self.user_id)
+            self._profile_loaded = True
+        return self._profile
+
+    def budget_reference(self) -> Optional[float]:
+        """用户平均每单消费金额（只计算一次；已有完整画像时直接取用）"""
+        if not self._budget_loaded:
+            with self.stage("budget_reference"):
+                if self._profile and 'avg_order_amount' in self._profile:
+                    self._budget_reference = float(self._profile['avg_order_amount'])
+                else:
+                    self._budget_reference = self.api._load_budget_reference(self.user_id)
+            self._budget_loaded = True
+        return self._budget_reference
+
+    def server_timing(self) -> str:
+        """各阶段耗时的 Server-Timing 响应头取值，如 validate;dur=0.012, llm;dur=812.5"""
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.timings.items())
 
 
 class ProductRecommendationAPI:
     """基于用户购物习惯的商品推荐API类"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, mmap: bool = False, live_associations: bool = False):
         """
         初始化推荐API
         
         Args:
             api_key: 通义千问API密钥
+            mmap: 是否以只读内存映射方式共享数据快照（多 worker 部署时使用）
+            live_associations: 是否由增量关联计数实时推导商品种类关联（见 AssociationCounters），
+                               为 False 时读取批量分析生成的 category_associations.csv
         """
         self.api_key = api_key or 'YOUR-API-KEY'
         self.api_url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+        self.mmap = mmap
+        self.live_associations = live_associations
 
         # 数据目录（相对于本文件）
         base_dir = os.path.dirname(os.path.abspath(__file__))
         data_dir = os.path.join(base_dir, "data")
+        self.data_dir = data_dir
 
-        # 初始化用户购买习惯分析器（使用相对路径，兼容不同开发环境）
-        purchase_data_path = os.path.join(data_dir, "user_purchase_data.csv")
-        product_data_path = os.path.join(data_dir, "product_data.csv")
-        self.user_analyzer = UserPurchaseAnalyzer(
-            purchase_data_path=purchase_data_path,
-            product_data_path=product_data_path
-        )
+        # 数据文件路径（使用相对路径，兼容不同开发环境）
+        self.purchase_data_path = os.path.join(data_dir, "user_purchase_data.csv")
+        self.product_data_path = os.path.join(data_dir, "product_data.csv")
 
-        # 加载商品关联数据（相对路径）
-        self.category_associations = self._load_category_associations(data_dir)
+        # 用户购买习惯分析器、商品关联数据和商品类别在首次访问时加载（见同名属性）
+        self._user_analyzer = None
+        self._category_associations = None
+        self._live_associations = (None, [])  # (计数版本, 推导出的关联数据)
+        self._product_neighbors = None
+        self._product_neighbors_loaded = False
+        self._product_categories = None
+        self._load_lock = threading.Lock()
         
         # 送礼对象选项
         self.gift_recipients = {
@@ -49,6 +113,60 @@ class ProductRecommendationAPI:
             "父母": "送给父母"
         }
     
+    @property
+    def user_analyzer(self):
+        """用户购买习惯分析器，首次访问时加载购买数据（多线程同时首次访问时只加载一次）"""
+        analyzer = self._user_analyzer
+        if analyzer is None:
+            with self._load_lock:
+                if self._user_analyzer is None:
+                    self._user_analyzer = self._create_user_analyzer()
+                analyzer = self._user_analyzer
+        return analyzer
+
+    @property
+    def category_associations(self) -> List[Dict]:
+        """商品种类关联数据，首次访问时加载；实时模式下在关联计数变化后重新推导"""
+        if self.live_associations:
+            return self._derive_live_associations()
+        associations = self._category_associations
+        if associations is None:
+            with self._load_lock:
+                if self._category_associations is None:
+                    self._category_associations = self._load_category_associations(self.data_dir)
+                associations = self._category_associations
+        return associations
+
+    @property
+    def product_neighbors(self):
+        """商品级关联（ProductNeighbors），首次访问时加载；文件不存在或未安装 NumPy 时为 None"""
+        if not self._product_neighbors_loaded:
+            with self._load_lock:
+                if not self._product_neighbors_loaded:
+                    self._product_neighbors = self._load_product_neighbors(self.data_dir)
+                    self._product_neighbors_loaded = True
+        return self._product_neighbors
+
+    def load(self) -> 'ProductRecommendationAPI':
+        """立即加载全部数据（例如在后台线程中预热），返回实例本身"""
+        self.user_analyzer
+        self.category_associations
+        self.product_neighbors
+        return self
+
+    def _create_user_analyzer(self):
+        """创建用户购买习惯分析器（NumPy 等依赖在此时才导入）"""
+        from analyze_user_api import UserPurchaseAnalyzer
+        from purchase_store import NUMPY_AVAILABLE
+
+        # 安装了 NumPy 时使用快照缓存，冷启动无需重新解析CSV
+        return UserPurchaseAnalyzer(
+            purchase_data_path=self.purchase_data_path,
+            product_data_path=self.product_data_path,
+            snapshot=NUMPY_AVAILABLE,
+            mmap=self.mmap
+        )
+
     def _load_category_associations(self, data_dir: Optional[str] = None) -> List[Dict]:
         """
         加载商品种类关联数据
@@ -76,19 +194,64 @@ class ProductRecommendationAPI:
         
         return associations
     
-    def _get_budget_reference(self, user_id: int) -> Optional[float]:
+    def _derive_live_associations(self) -> List[Dict]:
+        """由增量关联计数推导关联数据（格式与 category_associations.csv 相同），计数未变时复用上次结果"""
+        try:
+            counters = self.user_analyzer.get_association_counters()
+        except Exception as e:
+            print(f"⚠️ 获取关联计数失败: {e}")
+            return []
+        version, associations = self._live_associations
+        if version != counters.version:
+            associations = counters.as_csv_rows()
+            self._live_associations = (counters.version, associations)
+        return associations
+    
+    def ingest_new_orders(self) -> int:
+        """读取购买数据文件中新追加的订单（见 UserPurchaseAnalyzer.ingest_new_rows），返回新增的订单数"""
+        return self.user_analyzer.ingest_new_rows()
+    
+    def _load_product_neighbors(self, data_dir: str):
+        """加载 product_neighbors.py 生成的商品级关联文件"""
+        from product_neighbors import NEIGHBORS_FILE_NAME, ProductNeighbors
+        from purchase_store import NUMPY_AVAILABLE
+
+        neighbors_path = os.path.join(data_dir, NEIGHBORS_FILE_NAME)
+        if not NUMPY_AVAILABLE or not os.path.exists(neighbors_path):
+            return None
+        try:
+            neighbors = ProductNeighbors.load(neighbors_path)
+            print(f"✅ 成功加载 {len(neighbors)} 个商品的相关商品数据")
+            return neighbors
+        except Exception as e:
+            print(f"⚠️ 加载商品关联数据失败: {e}")
+            return None
+    
+    def request_context(self, user_id: int) -> RequestContext:
+        """创建单次请求的上下文（见 RequestContext）"""
+        return RequestContext(self, user_id)
+    
+    def _get_budget_reference(self, user_id: int, context: Optional[RequestContext] = None) -> Optional[float]:
         """
         获取用户购物习惯（仅获取平均每单消费金额）
         
         Args:
             user_id: 用户ID
+            context: 请求上下文，提供时同一请求内只计算一次
             
         Returns:
             用户购物习惯分析结果（仅包含平均每单消费）
         """
+        if context is None:
+            context = self.request_context(user_id)
+        return context.budget_reference()
+    
+    def _load_budget_reference(self, user_id: int) -> Optional[float]:
+        """分析用户的平均每单消费金额"""
         try:
             # 使用现有的分析API获取用户习惯
-            habits = self.user_analyzer.analyze_user_habits(user_id)
+            # 只需要平均每单金额：分析器只做一次求和、一次计数
+            habits = self.user_analyzer.analyze_user_habits(user_id, fields={'avg_order_amount'})
             if habits and 'avg_order_amount' in habits:
                 return float(habits['avg_order_amount'])
             return None
@@ -139,7 +302,8 @@ class ProductRecommendationAPI:
         }
     
     def _build_recommendation_prompt(self, user_id: int, budget: Optional[float], 
-                                   recipient: str, recipient_info: str, requirement: str) -> str:
+                                   recipient: str, recipient_info: str, requirement: str,
+                                   context: Optional[RequestContext] = None) -> str:
         """
         构建基于用户购物习惯的推荐提示词
         
@@ -149,6 +313,7 @@ class ProductRecommendationAPI:
             recipient: 送礼对象
             recipient_info: 送礼对象补充信息
             requirement: 用户需求描述
+            context: 请求上下文
             
         Returns:
             完整的提示词
@@ -159,7 +324,7 @@ class ProductRecommendationAPI:
         if budget is not None:
             budget_info = f"¥{budget:.2f}"
         else:
-            avg_budget = self._get_budget_reference(user_id)
+            avg_budget = self._get_budget_reference(user_id, context)
             if avg_budget:
                 budget_info = f"无特定限制（用户平均每单消费：¥{avg_budget:.2f}，可作为参考）"
             else:
@@ -220,6 +385,8 @@ class ProductRecommendationAPI:
                 "error": "未设置通义千问API密钥，请设置环境变量QWEN_API_KEY或在初始化时传入api_key参数"
             }
         
+        import requests
+
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -375,7 +542,8 @@ class ProductRecommendationAPI:
     def get_product_recommendations(self, user_id: int, budget: Optional[float] = None, 
                                  recipient: str = "自己", 
                                  recipient_info: str = "", 
-                                 requirement: str = "") -> Dict[str, Any]:
+                                 requirement: str = "",
+                                 context: Optional[RequestContext] = None) -> Dict[str, Any]:
         """
         获取基于用户购物习惯的商品推荐
         
@@ -385,12 +553,17 @@ class ProductRecommendationAPI:
             recipient: 送礼对象（自己、朋友、对象、父母）
             recipient_info: 送礼对象补充信息
             requirement: 用户需求描述
+            context: 请求上下文（可选），各阶段耗时记录在 context.timings 中
             
         Returns:
             推荐结果字典
         """
+        if context is None:
+            context = self.request_context(user_id)
+        
         # 输入验证
-        validation = self.validate_input(user_id, budget, recipient, recipient_info, requirement)
+        with context.stage("validate"):
+            validation = self.validate_input(user_id, budget, recipient, recipient_info, requirement)
         if not validation["valid"]:
             return {
                 "success": False,
@@ -399,16 +572,19 @@ class ProductRecommendationAPI:
             }
         
        
-        # 如果没有预算，获取用户平均消费作为参考
+        # 如果没有预算，获取用户平均消费作为参考（与提示词构建共用同一次计算）
         budget_reference = None
         if budget is None:
-            budget_reference = self._get_budget_reference(user_id)
+            budget_reference = self._get_budget_reference(user_id, context)
         
         # 构建提示词
-        prompt = self._build_recommendation_prompt(user_id, budget, recipient, recipient_info, requirement)
+        with context.stage("prompt"):
+            prompt = self._build_recommendation_prompt(user_id, budget, recipient, recipient_info, requirement,
+                                                       context)
         
         # 调用AI API
-        ai_result = self._call_qwen_api(prompt)
+        with context.stage("llm"):
+            ai_result = self._call_qwen_api(prompt)
         
         if not ai_result["success"]:
             return {
@@ -418,7 +594,8 @@ class ProductRecommendationAPI:
             }
         
         # 解析AI响应
-        recommendations = self._parse_ai_response(ai_result["content"])
+        with context.stage("parse"):
+            recommendations = self._parse_ai_response(ai_result["content"])
         
         return {
             "success": True,
@@ -438,10 +615,10 @@ class ProductRecommendationAPI:
             "timestamp": datetime.now().isoformat()
         }
     
-    def get_user_summary(self, user_id: int) -> Dict[str, Any]:
+    def get_user_summary(self, user_id: int, context: Optional[RequestContext] = None) -> Dict[str, Any]:
         """获取用户购物习惯摘要"""
         try:
-            avg_amount = self._get_budget_reference(user_id)
+            avg_amount = self._get_budget_reference(user_id, context)
             if avg_amount:
                 return {
                     "user_id": user_id,
@@ -451,6 +628,17 @@ class ProductRecommendationAPI:
         except Exception as e:
             return {"user_id": user_id, "error": str(e)}
     
+    def get_available_options(self) -> Dict[str, Any]:
+        """获取可用选项（送礼对象、商品类别、价格范围及分位数、各类别商品单价区间）"""
+        facts = self.get_catalog_facts()
+        return {
+            "gift_recipients": self.get_gift_recipients(),
+            "product_categories": self.get_product_categories(),
+            "price_range": self.get_price_range(),
+            "price_percentiles": facts.get("price_percentiles", {}),
+            "category_price_bands": facts.get("category_price_bands", {})
+        }
+    
     def get_gift_recipients(self) -> Dict[str, str]:
         """获取送礼对象选项"""
         return self.gift_recipients.copy()
@@ -458,10 +646,14 @@ class ProductRecommendationAPI:
     def get_product_categories(self) -> List[str]:
         """获取用户常购商品类别"""
         try:
-            categories = set()
-            if hasattr(self.user_analyzer, 'product_map') and self.user_analyzer.product_map:
-                categories.update(self.user_analyzer.product_map.values())
-            return list(categories)
+            if self._user_analyzer is not None:
+                return list(self._user_analyzer.get_catalog_facts().categories)
+            # 购买数据尚未加载时只读取商品数据文件，不为此加载全部购买数据
+            if self._product_categories is None:
+                with open(self.product_data_path, 'r', encoding='utf-8') as f:
+                    self._product_categories = sorted(
+                        set(row['商品种类'] for row in csv.DictReader(f) if row['商品种类']))
+            return list(self._product_categories)
         except Exception as e:
             print(f"获取商品类别失败: {e}")
             return []
@@ -469,19 +661,45 @@ class ProductRecommendationAPI:
     def get_price_range(self) -> Dict[str, float]:
         """获取用户历史消费价格范围"""
         try:
-            if hasattr(self.user_analyzer, 'purchase_data') and self.user_analyzer.purchase_data:
-                amounts = [record['购买总金额(元)'] for record in self.user_analyzer.purchase_data]
-                return {
-                    "min": min(amounts),
-                    "max": max(amounts),
-                    "avg": sum(amounts) / len(amounts)
-                }
-            return {"min": 0, "max": 0, "avg": 0}
+            return self.user_analyzer.get_price_range()
         except Exception as e:
             print(f"获取价格范围失败: {e}")
             return {"min": 0, "max": 0, "avg": 0}
 
-    def get_smart_suggestions(self, user_id: int) -> Dict[str, Any]:
+    def get_catalog_facts(self) -> Dict[str, Any]:
+        """获取商品目录与订单金额统计（每个数据版本计算一次，见 UserPurchaseAnalyzer.get_catalog_facts）"""
+        try:
+            return self.user_analyzer.get_catalog_facts().as_dict()
+        except Exception as e:
+            print(f"获取商品目录统计失败: {e}")
+            return {}
+
+    def get_related_products(self, product_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        获取与商品经常一起购买的商品（"买了X的人也买了Y"）
+        
+        Args:
+            product_id: 商品ID
+            limit: 最多返回的个数
+            
+        Returns:
+            相关商品列表（按提升度或置信度排名），每项包含 product_id、category、count、confidence、lift；
+            没有商品关联数据时返回空列表
+        """
+        neighbors = self.product_neighbors
+        if neighbors is None:
+            return []
+        related = neighbors.neighbors(product_id, limit)
+        try:
+            catalog = self.user_analyzer.catalog
+            for item in related:
+                code = catalog.category_code(item['product_id'])
+                item['category'] = catalog.categories[code] if code >= 0 else None
+        except Exception as e:
+            print(f"获取相关商品种类失败: {e}")
+        return related
+
+    def get_smart_suggestions(self, user_id: int, context: Optional[RequestContext] = None) -> Dict[str, Any]:
         """
         获取智能建议：基于用户购买习惯的两个建议
         1. 用户最频繁购买的商品建议
@@ -489,13 +707,16 @@ class ProductRecommendationAPI:
         
         Args:
             user_id: 用户ID
+            context: 请求上下文（可选），与同一请求中的其他步骤共用用户画像
             
         Returns:
             包含两个建议的字典
         """
+        if context is None:
+            context = self.request_context(user_id)
         try:
             # 获取用户购买习惯
-            user_habits = self.user_analyzer.analyze_user_habits(user_id)
+            user_habits = context.profile()
             if not user_habits:
                 return {
                     "success": False,
@@ -508,15 +729,16 @@ class ProductRecommendationAPI:
                 "suggestions": [],
             }
             
-            # 建议1: 最频繁购买的商品
-            frequent_suggestion = self._get_frequent_product_suggestion(user_habits)
-            if frequent_suggestion:
-                suggestions["suggestions"].append(frequent_suggestion)
-            
-            # 建议2: 基于关联分析的商品种类推荐
-            association_suggestion = self._get_association_suggestion(user_habits)
-            if association_suggestion:
-                suggestions["suggestions"].append(association_suggestion)
+            with context.stage("suggestions"):
+                # 建议1: 最频繁购买的商品
+                frequent_suggestion = self._get_frequent_product_suggestion(user_habits)
+                if frequent_suggestion:
+                    suggestions["suggestions"].append(frequent_suggestion)
+                
+                # 建议2: 基于关联分析的商品种类推荐
+                association_suggestion = self._get_association_suggestion(user_habits)
+                if association_suggestion:
+                    suggestions["suggestions"].append(association_suggestion)
             
             return suggestions
             
@@ -645,7 +867,57 @@ class ProductRecommendationAPI:
             return None
 
 
-# 便捷函数接口
+# ============== 进程内共享实例 ==============
+
+class APIRegistry:
+    """
+    进程内共享的 ProductRecommendationAPI 实例注册表（线程安全）
+
+    按构造参数 (api_key, mmap, live_associations) 各保存一个实例，便捷函数和 Web 路由都从这里取实例，
+    数据只加载一次；reset() 丢弃全部实例（下次使用时重新创建），
+    reload() 在调用线程中完整加载新实例后再替换，替换期间的调用继续使用旧实例
+    """
+
+    def __init__(self):
+        self._instances = {}  # (api_key, mmap, live_associations) -> ProductRecommendationAPI
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str = None, mmap: bool = False,
+            live_associations: bool = False) -> ProductRecommendationAPI:
+        """取出（或创建）共享实例；实例创建时不加载数据，见 ProductRecommendationAPI"""
+        key = (api_key, mmap, live_associations)
+        api = self._instances.get(key)
+        if api is None:
+            with self._lock:
+                api = self._instances.get(key)
+                if api is None:
+                    api = self._instances[key] = ProductRecommendationAPI(*key)
+        return api
+
+    def put(self, api: ProductRecommendationAPI, api_key: str = None, mmap: bool = False,
+            live_associations: bool = False):
+        """用已构建好的实例替换共享实例（例如数据热更新后）"""
+        with self._lock:
+            self._instances[(api_key, mmap, live_associations)] = api
+
+    def reset(self):
+        """丢弃全部共享实例，下次使用时重新创建并加载"""
+        with self._lock:
+            self._instances.clear()
+
+    def reload(self):
+        """为每个已有的共享实例加载一份新数据并替换；加载失败时保留旧实例并抛出异常"""
+        with self._lock:
+            keys = list(self._instances)
+        for key in keys:
+            api = ProductRecommendationAPI(*key).load()
+            self.put(api, *key)
+
+
+registry = APIRegistry()
+
+
+# 便捷函数接口（使用共享实例）
 def recommend_products(user_id: int, budget: Optional[float] = None, 
                       recipient: str = "自己", 
                       recipient_info: str = "", 
@@ -663,7 +935,7 @@ def recommend_products(user_id: int, budget: Optional[float] = None,
     Returns:
         推荐结果
     """
-    api = ProductRecommendationAPI()  # 使用默认API密钥
+    api = registry.get()  # 使用默认API密钥
     return api.get_product_recommendations(user_id, budget, recipient, recipient_info, requirement)
 
 def get_available_options() -> Dict[str, Any]:
@@ -673,12 +945,7 @@ def get_available_options() -> Dict[str, Any]:
     Returns:
         包含所有可用选项的字典
     """
-    api = ProductRecommendationAPI()
-    return {
-        "gift_recipients": api.get_gift_recipients(),
-        "product_categories": api.get_product_categories(),
-        "price_range": api.get_price_range()
-    }
+    return registry.get().get_available_options()
 
 
 def get_smart_suggestions(user_id: int) -> Dict[str, Any]:
@@ -691,7 +958,7 @@ def get_smart_suggestions(user_id: int) -> Dict[str, Any]:
     Returns:
         智能建议结果
     """
-    api = ProductRecommendationAPI()  # 使用默认API密钥
+    api = registry.get()  # 使用默认API密钥
     return api.get_smart_suggestions(user_id)
 
 
@@ -711,7 +978,7 @@ if __name__ == "__main__":
     test_user_id = 25  # 使用一个测试用户ID
     print(f"\n测试用户 {test_user_id} 的购物习惯:")
     
-    api = ProductRecommendationAPI()
+    api = registry.get()
     user_summary = api.get_user_summary(test_user_id)
     if 'error' not in user_summary:
         print(f"  平均每单消费: ¥{user_summary['avg_order_amount']:.2f}")
@@ -720,7 +987,6 @@ if __name__ == "__main__":
     
     print("\n🎯 测试智能建议功能:")
     test_user_id = 25
-    api = ProductRecommendationAPI()
     suggestions = api.get_smart_suggestions(test_user_id)
     
     print(f"\n用户 {test_user_id} 的智能建议:")
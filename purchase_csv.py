@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+购买数据CSV快速解析
+针对 user_purchase_data.csv 的固定列布局（记录ID,用户ID,购买商品数量,商品ID,购买总金额(元),购买时间,是否退款）：
+按块读取、整块拆分出全部字段后逐行生成字典代替 DictReader，按固定格式解析购买时间代替 strptime；
+不符合固定布局的文件改为逐行按位置拆分，个别行交给 csv 模块，格式错误的行会被跳过并以 (行号, 原因) 的形式报告
+"""
+
+import csv
+import gc
+from datetime import datetime
+
+PURCHASE_FIELDS = ('记录ID', '用户ID', '购买商品数量', '商品ID', '购买总金额(元)', '购买时间', '是否退款')
+HEADER_LINE = ','.join(PURCHASE_FIELDS)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# 整块拆分时代替引号内逗号的占位符（数据中出现该字符时改为逐行拆分）
+_COMMA = '\x00'
+# 整块拆分时每次读取的字节数（读到行尾为止）：每块拆出的临时字段转换后即释放，内存在块之间复用
+BLOCK_SIZE = 1 << 16
+
+
+def parse_timestamp(text):
+    """
+    解析 'YYYY-MM-DD HH:MM:SS' 格式的购买时间
+
+    符合固定位置的写法直接交给 datetime.fromisoformat，比 strptime 快一个数量级；
+    其他写法（如未补零的月份）交给 strptime，结果与 strptime 一致
+    """
+    if (len(text) == 19 and text[4] == '-' and text[7] == '-' and text[10] == ' '
+            and text[13] == ':' and text[16] == ':'):
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    return datetime.strptime(text, TIME_FORMAT)
+
+
+def _valid_product_ids(text):
+    """商品ID字段是否为逗号分隔的整数列表"""
+    return text.replace(',', '').isdigit() or all(pid.strip().isdigit() for pid in text.strip('"').split(','))
+
+
+def _split_fixed(line):
+    """
+    按固定列布局拆分一行：只有商品ID字段可以带引号
+
+    Returns:
+        7 个字段的列表；该行需要完整的CSV解析时返回 None
+    """
+    parts = line.rsplit(',', 3)
+    if len(parts) != 4:
+        return None
+    head = parts[0].split(',', 3)
+    if len(head) != 4:
+        return None
+    products = head[3]
+    if '"' in line:
+        if not (len(products) >= 2 and products[0] == '"' and products[-1] == '"' and line.count('"') == 2):
+            return None
+        products = products[1:-1]
+    elif ',' in products:
+        return None
+    return [head[0], head[1], head[2], products, parts[1], parts[2], parts[3]]
+
+
+def _read_rows(path, malformed):
+    """
+    按位置读取CSV，返回 (表头, 字段数正确的行, 对应的行号)
+
+    表头为标准列布局时按固定位置拆分，只有个别行交给 csv 模块；否则（或有跨行的带引号字段时）整个文件使用 csv.reader。
+    缺少必需列时抛出 ValueError；字段数不对的行记入 malformed，空行直接跳过（与 DictReader 一致）
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.readline()
+        if first.rstrip('\r\n') == HEADER_LINE:
+            header = list(PURCHASE_FIELDS)
+            rows, line_numbers = [], []
+            reported = len(malformed)
+            for line_number, line in enumerate(f.read().splitlines(), 2):
+                if not line:
+                    continue
+                row = _split_fixed(line)
+                if row is None:
+                    if line.count('"') % 2:
+                        # 引号内有换行，按行拆分不再适用
+                        del malformed[reported:]
+                        break
+                    row = next(csv.reader([line]))
+                    if len(row) != len(header):
+                        malformed.append((line_number, f"字段数为 {len(row)}，应为 {len(header)}"))
+                        continue
+                rows.append(row)
+                line_numbers.append(line_number)
+            else:
+                return header, rows, line_numbers
+
+        f.seek(0)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return list(PURCHASE_FIELDS), [], []
+        missing = [name for name in PURCHASE_FIELDS if name not in header]
+        if missing:
+            raise ValueError(f"购买数据缺少列: {', '.join(missing)}")
+        width = len(header)
+        rows, line_numbers = [], []
+        for row in reader:
+            if len(row) == width:
+                rows.append(row)
+                line_numbers.append(reader.line_num)
+            elif row:
+                malformed.append((reader.line_num, f"字段数为 {len(row)}，应为 {width}"))
+    return header, rows, line_numbers
+
+
+def _split_fields(data):
+    """
+    按固定列布局整块拆分一段完整的数据行（不含表头的 bytes）
+
+    换行、引号等结构检查在 bytes 上进行（UTF-8 的多字节字符不含 ASCII 字节）：引号内的逗号先换成占位符、
+    去掉引号后整段解码，再一次性按逗号拆开，不逐行拆分
+
+    Returns:
+        所有字段的扁平列表，每行 7 个字段后跟一个换行符 '\n'，第 i 行第 j 列为 fields[i * 8 + j]，
+        引号内的逗号仍为占位符 _COMMA；
+        有任何一行不符合固定布局（空行、字段数不对、行尾不统一、引号不在字段边界或含转义引号）时返回 None
+    """
+    width = len(PURCHASE_FIELDS) + 1
+    newline = b'\n'
+    if b'\r' in data:
+        # 行尾为 \r\n 时拆分时直接按 \r\n 断行（其余单独的 \r 在断行后检查，单独的 \n 会使字段数不符）
+        newline = b'\r\n'
+    if data.endswith(newline):
+        data = data[:-len(newline)]
+    if not data:
+        return []
+    if _COMMA.encode() in data:
+        return None
+    quoted = b'"' in data
+    if quoted:
+        parts = data.split(b'"')
+        values = b'\n'.join(parts[1::2])
+        # 引号成对，引号内不含换行，左引号前、右引号后都是分隔（逗号、换行或首尾），
+        # 且两对引号之间至少隔一个字符（排除转义的双引号）
+        if (len(parts) % 2 == 0 or values.count(b'\n') != len(parts) // 2 - 1 or not all(parts[2:-1:2])
+                or b''.join([part[-1:] for part in parts[:-1:2]]).strip(b',\n')
+                or b''.join([part[:1] for part in parts[2::2]]).strip(b',\r\n')):
+            return None
+        parts[1::2] = values.replace(b',', _COMMA.encode()).split(b'\n')
+        data = b''.join(parts)
+    lines = data.count(b'\n') + 1
+    data = data.replace(newline, b',\n,')
+    if newline == b'\r\n' and b'\r' in data:
+        return None
+    # 每个换行单独拆成一个字段：每行恰好 7 个字段时，换行正好位于每 8 个字段的最后
+    fields = data.decode('utf-8').split(',')
+    fields.append('\n')
+    if len(fields) != width * lines or ''.join(fields[width - 1::width]) != '\n' * lines:
+        return None
+    return fields
+
+
+def _read_field_blocks(path):
+    """
+    按块读取标准列布局的文件，逐块生成 _split_fields 的结果（每块约 BLOCK_SIZE 字节，在行尾断开）；
+    表头不同或某一块不符合固定布局时生成 None 并结束
+    """
+    with open(path, 'rb') as f:
+        if f.readline().rstrip(b'\r\n').decode('utf-8') != HEADER_LINE:
+            yield None
+            return
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                return
+            fields = _split_fields(block + f.readline())
+            yield fields
+            if fields is None:
+                return
+
+
+def _fields_to_columns(fields):
+    """_split_fields 的结果转为 7 个列表（还原引号内的逗号）"""
+    width = len(PURCHASE_FIELDS) + 1
+    columns = [fields[column::width] for column in range(len(PURCHASE_FIELDS))]
+    columns[3] = [product_ids.replace(_COMMA, ',') for product_ids in columns[3]]
+    return columns
+
+
+def _read_columns(path, malformed):
+    """
+    按列读取CSV，返回 (表头, 每列取值的列表, 对应的行号)
+
+    标准列布局的文件按块整块拆分（见 _read_field_blocks），否则按 _read_rows 逐行读取后转置
+    """
+    columns = [[] for _ in PURCHASE_FIELDS]
+    for fields in _read_field_blocks(path):
+        if fields is None:
+            break
+        for column, values in zip(columns, _fields_to_columns(fields)):
+            column += values
+    else:
+        return list(PURCHASE_FIELDS), columns, range(2, len(columns[0]) + 2)
+    header, rows, line_numbers = _read_rows(path, malformed)
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in header]
+    return header, columns, line_numbers
+
+
+def _to_record(header, row):
+    """将一行字段转换为记录字典，格式错误时抛出 ValueError"""
+    record = dict(zip(header, row))
+    if not _valid_product_ids(record['商品ID']):
+        raise ValueError(f"商品ID格式错误: {record['商品ID']!r}")
+    # 记录ID保留字符串，但必须是整数（增量加载按记录ID去重、续读）
+    int(record['记录ID'])
+    record['用户ID'] = int(record['用户ID'])
+    record['购买商品数量'] = int(record['购买商品数量'])
+    record['购买总金额(元)'] = float(record['购买总金额(元)'])
+    record['购买时间'] = parse_timestamp(record['购买时间'])
+    return record
+
+
+def _records_from_fields(fields):
+    """
+    由 _split_fields 的结果逐行生成记录字典（与逐行 _to_record 的结果相同），
+    任一值格式错误时抛出 ValueError，由调用方改为逐行转换
+    """
+    width = len(PURCHASE_FIELDS) + 1
+    count = len(fields) // width
+    # 记录ID整列确认为纯数字（此时 int 必然成立），否则由调用方逐行用 int 检查
+    record_ids = fields[0::width]
+    joined = '\n'.join(record_ids)
+    if not all(record_ids) or not joined.isascii() or joined.encode().translate(None, b'0123456789\n'):
+        raise ValueError("记录ID格式错误")
+    # 购买时间整列确认为固定位置的写法后交给 fromisoformat（见 parse_timestamp）
+    times = ''.join(fields[5::width])
+    if (len(times) != 19 * count or times[4::19] != '-' * count or times[7::19] != '-' * count
+            or times[10::19] != ' ' * count or times[13::19] != ':' * count or times[16::19] != ':' * count):
+        raise ValueError("购买时间格式错误")
+    # 商品ID整列确认为以数字开头、只含数字和逗号（此时为占位符）的写法，即 _valid_product_ids 成立
+    products = fields[3::width]
+    joined = '\n'.join(products)
+    if (not all(products) or not joined.isascii() or joined.startswith(_COMMA) or '\n' + _COMMA in joined
+            or joined.encode().translate(None, b'0123456789\n' + _COMMA.encode())):
+        raise ValueError("商品ID格式错误")
+    # 用户ID、购买商品数量的取值重复较多，每个不同的取值只转换一次
+    ints = {text: int(text) for text in {*fields[1::width], *fields[2::width]}}
+    parse_time = datetime.fromisoformat
+    values = iter(fields)
+    return [{'记录ID': record_id, '用户ID': ints[user_id], '购买商品数量': ints[item_count],
+             '商品ID': product_ids.replace(_COMMA, ','),
+             '购买总金额(元)': float(amount), '购买时间': parse_time(purchase_time), '是否退款': refund}
+            for record_id, user_id, item_count, product_ids, amount, purchase_time, refund, _
+            in zip(*[values] * width)]
+
+
+def _read_block_records(path):
+    """
+    按块读取标准列布局的文件并生成记录（见 _read_field_blocks），某一块有格式错误的值时该块逐行转换
+
+    Returns:
+        (记录列表, 格式错误的行)；表头不同或某一块不符合固定布局时返回 None
+    """
+    width = len(PURCHASE_FIELDS) + 1
+    records, malformed, line_number = [], [], 2
+    for fields in _read_field_blocks(path):
+        if fields is None:
+            return None
+        try:
+            records += _records_from_fields(fields)
+        except ValueError:
+            for row_line_number, row in enumerate(zip(*_fields_to_columns(fields)), line_number):
+                try:
+                    records.append(_to_record(PURCHASE_FIELDS, row))
+                except ValueError as e:
+                    malformed.append((row_line_number, str(e)))
+        line_number += len(fields) // width
+    return records, malformed
+
+
+def read_purchase_records(path, malformed=None):
+    """
+    读取购买数据为逐行字典（与 DictReader 加 strptime 的结果一致）
+
+    用户ID、购买商品数量转换为 int，购买总金额转换为 float，购买时间转换为 datetime，其余字段保留字符串；
+    标准列布局的文件按块整块拆分后直接生成字典，其余文件逐行解析；格式错误的行被跳过
+
+    Args:
+        path: 购买数据CSV路径
+        malformed: 可选列表，格式错误的行以 (行号, 原因) 追加到其中
+
+    Returns:
+        list: 记录字典列表（已跳过格式错误的行）
+    """
+    malformed = [] if malformed is None else malformed
+    # 一次创建数万个字典，期间暂停循环垃圾回收（这些对象之间没有循环引用，分代回收只会反复扫描它们）
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        result = _read_block_records(path)
+        if result is not None:
+            records, block_malformed = result
+            malformed.extend(block_malformed)
+            return records
+
+        header, rows, line_numbers = _read_rows(path, malformed)
+        records = []
+        for row, line_number in zip(rows, line_numbers):
+            try:
+                records.append(_to_record(header, row))
+            except ValueError as e:
+                malformed.append((line_number, str(e)))
+        return records
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def parse_new_lines(text, fieldnames, malformed, first_line_number=1):
+    """
+    逐行解析增量读取的CSV文本（只含完整的行），用于追加数据的增量读取
+
+    通过校验的行保留字符串字段（与 csv.DictReader 读出的行相同）；字段数不对或取值格式错误的行
+    以 (行号, 原因) 追加到 malformed 后跳过，不影响同一批中的其他行
+
+    Args:
+        text: 新追加的CSV文本
+        fieldnames: 表头列名
+        malformed: 格式错误的行以 (行号, 原因) 追加到其中
+        first_line_number: text 第一行在文件中的行号
+
+    Returns:
+        list: 行字典列表
+    """
+    rows = []
+    for line_number, line in enumerate(text.splitlines(), first_line_number):
+        if not line:
+            continue
+        values = next(csv.reader([line]))
+        if len(values) != len(fieldnames):
+            malformed.append((line_number, f"字段数为 {len(values)}，应为 {len(fieldnames)}"))
+            continue
+        try:
+            _to_record(fieldnames, values)
+        except ValueError as e:
+            malformed.append((line_number, str(e)))
+            continue
+        rows.append(dict(zip(fieldnames, values)))
+    return rows
+
+
+def valid_rows(reader, malformed):
+    """
+    逐行筛选 csv.DictReader 读出的行：字段数与表头不符或值格式错误（见 _to_record）的行
+    以 (行号, 原因) 追加到 malformed 后跳过，其余行原样产出
+    """
+    width = len(reader.fieldnames or ())
+    for row in reader:
+        if None in row or None in row.values():
+            count = width + len(row.get(None, ())) - sum(value is None for value in row.values())
+            malformed.append((reader.line_num, f"字段数为 {count}，应为 {width}"))
+            continue
+        try:
+            _to_record(reader.fieldnames, list(row.values()))
+        except ValueError as e:
+            malformed.append((reader.line_num, str(e)))
+            continue
+        yield row
+
+
+def read_purchase_columns(path, malformed=None):
+    """
+    读取购买数据并按列返回字符串列表，供批量转换使用
+
+    Args:
+        path: 购买数据CSV路径
+        malformed: 可选列表，字段数不对的行以 (行号, 原因) 追加到其中
+
+    Returns:
+        (dict, list): 列名 -> 该列全部取值（字符串）；每行对应的CSV行号
+    """
+    malformed = [] if malformed is None else malformed
+    header, columns, line_numbers = _read_columns(path, malformed)
+    return {name: columns[header.index(name)] for name in PURCHASE_FIELDS}, list(line_numbers)
+
+
+def format_malformed(malformed, limit=5):
+    """将格式错误的行汇总为提示文本"""
+    lines = [f"⚠️ 购买数据中有 {len(malformed)} 行格式错误，已跳过"]
+    for line_number, reason in malformed[:limit]:
+        lines.append(f"   第 {line_number} 行: {reason}")
+    if len(malformed) > limit:
+        lines.append(f"   ……另有 {len(malformed) - limit} 行")
+    return '\n'.join(lines)
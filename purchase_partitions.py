@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+按月分区的购买数据存储
+将 user_purchase_data.csv 按购买时间所在月份拆分为多个分区文件，并维护一个清单，
+记录每个分区的时间范围、用户集合和金额统计。查询只读取与日期范围重叠、
+且包含目标用户的分区，启动和单次查询的 I/O 与查询窗口相关，而与历史数据总量无关
+
+分区命令:
+    python3 purchase_partitions.py <购买数据CSV> [分区目录]
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+from purchase_csv import format_malformed, parse_timestamp, valid_rows
+from purchase_store import prefix_key, prefix_state, to_epoch
+
+# 清单格式版本，格式变化时递增，旧分区会被自动重建
+PARTITION_VERSION = 2
+PARTITION_DIR_NAME = ".partitions"
+MANIFEST_NAME = "manifest.json"
+
+
+def default_partition_dir(purchase_data_path):
+    """默认分区目录：CSV 同级的 .partitions/<文件名>"""
+    root = os.path.join(os.path.dirname(os.path.abspath(purchase_data_path)), PARTITION_DIR_NAME)
+    return os.path.join(root, os.path.splitext(os.path.basename(purchase_data_path))[0])
+
+
+def _row_stats(row):
+    """一行购买记录的 (月份, 购买时间戳, 用户ID, 金额, 记录ID)"""
+    timestamp = to_epoch(parse_timestamp(row['购买时间']))
+    return row['购买时间'][:7], timestamp, int(row['用户ID']), float(row['购买总金额(元)']), int(row['记录ID'])
+
+
+def _new_partition(month):
+    return {
+        'month': month,
+        'file': f"{month}.csv",
+        'rows': 0,
+        'min_ts': None,
+        'max_ts': None,
+        'users': [],
+        'amount_min': None,
+        'amount_max': None,
+        'amount_sum': 0.0,
+    }
+
+
+class PurchasePartitions:
+    """
+    按月分区的购买数据
+
+    清单（manifest.json）包含：
+        - source: 分区对应的源CSV已读取的字节数、修改时间和已读部分的内容校验
+        - fieldnames: CSV 列名
+        - rows / max_record_id: 总记录数和最大记录ID
+        - user_order: 按首次出现顺序排列的全部用户ID
+        - partitions: 每个月份的文件名、记录数、最早/最晚购买时间、用户ID列表和金额统计
+    分区文件内的记录保持源文件中的相对顺序
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self._user_sets = {}  # 月份 -> 用户ID集合（按需由清单中的列表构建）
+
+    @classmethod
+    def open(cls, directory):
+        """打开已有分区，清单不存在或版本不符时返回 None"""
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != PARTITION_VERSION:
+            return None
+        return cls(directory, manifest)
+
+    @classmethod
+    def build(cls, purchase_data_path, directory=None, malformed=None):
+        """
+        读取完整CSV并写出全部分区
+
+        分区先写入临时目录，完成后替换旧目录，读取方不会看到写了一半的分区；
+        格式错误的行以 (行号, 原因) 追加到可选列表 malformed 后跳过
+        """
+        directory = directory or default_partition_dir(purchase_data_path)
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".partitions-", dir=parent)
+        try:
+            source = prefix_key(purchase_data_path, os.path.getsize(purchase_data_path))
+            with open(purchase_data_path, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                manifest = {
+                    'version': PARTITION_VERSION,
+                    'source': source,
+                    'fieldnames': reader.fieldnames,
+                    'rows': 0,
+                    'max_record_id': 0,
+                    'user_order': [],
+                    'partitions': [],
+                }
+                partitions = cls(staging, manifest)
+                partitions._write_rows(valid_rows(reader, [] if malformed is None else malformed))
+            partitions._write_manifest()
+            os.chmod(staging, 0o755)
+            if os.path.isdir(directory):
+                trash = tempfile.mkdtemp(prefix=".partitions-old-", dir=parent)
+                os.rename(directory, os.path.join(trash, 'old'))
+                os.rename(staging, directory)
+                shutil.rmtree(trash, ignore_errors=True)
+            else:
+                os.rename(staging, directory)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        partitions.directory = directory
+        return partitions
+
+    def _write_rows(self, rows):
+        """将记录追加到对应月份的分区文件并更新清单，返回写入的记录数"""
+        manifest = self.manifest
+        by_month = {partition['month']: partition for partition in manifest['partitions']}
+        known_users = set(manifest['user_order'])
+        new_users = {}  # 月份 -> 新出现的用户ID集合
+        files = {}
+        count = 0
+        try:
+            for row in rows:
+                month, timestamp, user_id, amount, record_id = _row_stats(row)
+                partition = by_month.get(month)
+                if partition is None:
+                    partition = by_month[month] = _new_partition(month)
+                if month not in files:
+                    f = open(os.path.join(self.directory, partition['file']), 'a', newline='', encoding='utf-8')
+                    writer = csv.DictWriter(f, fieldnames=manifest['fieldnames'])
+                    if partition['rows'] == 0:
+                        writer.writeheader()
+                    files[month] = (f, writer)
+                files[month][1].writerow(row)
+
+                partition['rows'] += 1
+                partition['min_ts'] = timestamp if partition['min_ts'] is None else min(partition['min_ts'], timestamp)
+                partition['max_ts'] = timestamp if partition['max_ts'] is None else max(partition['max_ts'], timestamp)
+                partition['amount_min'] = amount if partition['amount_min'] is None else min(partition['amount_min'], amount)
+                partition['amount_max'] = amount if partition['amount_max'] is None else max(partition['amount_max'], amount)
+                partition['amount_sum'] += amount
+                new_users.setdefault(month, set()).add(user_id)
+                if user_id not in known_users:
+                    known_users.add(user_id)
+                    manifest['user_order'].append(user_id)
+                manifest['rows'] += 1
+                manifest['max_record_id'] = max(manifest['max_record_id'], record_id)
+                count += 1
+        finally:
+            for f, _ in files.values():
+                f.close()
+
+        for month, users in new_users.items():
+            partition = by_month[month]
+            partition['users'] = sorted(set(partition['users']) | users)
+            self._user_sets.pop(month, None)
+        manifest['partitions'] = sorted(by_month.values(), key=lambda partition: partition['month'])
+        return count
+
+    def _write_manifest(self):
+        """原子替换清单文件"""
+        fd, tmp_path = tempfile.mkstemp(prefix=".manifest-", suffix='.json', dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST_NAME))
+
+    def append(self, rows):
+        """
+        追加新记录（csv.DictReader 读出的行）到对应的分区并更新清单
+
+        Returns:
+            set: 受影响的月份
+        """
+        rows = list(rows)
+        self._write_rows(rows)
+        self._write_manifest()
+        return {row['购买时间'][:7] for row in rows}
+
+    def matches_source(self, purchase_data_path):
+        """
+        判断分区是否仍对应源CSV
+
+        已分区部分的内容校验见 prefix_state
+
+        Returns:
+            'current'：完全一致；'appended'：源文件只在末尾追加了数据，可从清单记录的位置续读；
+            None：源文件已被改写，需要重建
+        """
+        return prefix_state(purchase_data_path, self.manifest['source'])
+
+    def mark_source(self, purchase_data_path, size):
+        """记录源CSV已读取的字节数、修改时间和内容校验，供下次打开时判断是否需要续读"""
+        self.manifest['source'] = prefix_key(purchase_data_path, size)
+        self._write_manifest()
+
+    def users(self, partition):
+        """分区内的用户ID集合"""
+        user_set = self._user_sets.get(partition['month'])
+        if user_set is None:
+            user_set = self._user_sets[partition['month']] = set(partition['users'])
+        return user_set
+
+    def overlapping(self, start_ts=None, end_ts=None, user_id=None):
+        """
+        返回购买时间与 [start_ts, end_ts] 重叠（且包含 user_id，若指定）的分区，按月份升序
+
+        Args:
+            start_ts / end_ts: epoch 秒，为 None 时不限制
+            user_id: 用户ID，为 None 时不按用户筛选
+        """
+        selected = []
+        for partition in self.manifest['partitions']:
+            if partition['rows'] == 0:
+                continue
+            if start_ts is not None and partition['max_ts'] < start_ts:
+                continue
+            if end_ts is not None and partition['min_ts'] > end_ts:
+                continue
+            if user_id is not None and user_id not in self.users(partition):
+                continue
+            selected.append(partition)
+        return selected
+
+    def path(self, partition):
+        """分区文件路径"""
+        return os.path.join(self.directory, partition['file'])
+
+    def product_lists(self):
+        """读取全部分区中每条记录的 (记录ID, 商品ID列表)，按记录ID排序"""
+        product_lists = []
+        for partition in self.manifest['partitions']:
+            if partition['rows'] == 0:
+                continue
+            with open(self.path(partition), 'r', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    product_lists.append((int(row['记录ID']), [int(pid) for pid in row['商品ID'].strip('"').split(',')]))
+        product_lists.sort(key=lambda item: item[0])
+        return product_lists
+
+    def amounts(self):
+        """读取全部分区的订单金额列，按记录ID排序"""
+        amounts = []
+        for partition in self.manifest['partitions']:
+            if partition['rows'] == 0:
+                continue
+            with open(self.path(partition), 'r', encoding='utf-8') as f:
+                amounts.extend((int(row['记录ID']), float(row['购买总金额(元)'])) for row in csv.DictReader(f))
+        amounts.sort()
+        return [amount for _, amount in amounts]
+
+
+def main():
+    """命令行分区"""
+    import sys
+
+    if len(sys.argv) not in (2, 3):
+        print("🗂️ 购买数据按月分区工具")
+        print("使用方法: python3 purchase_partitions.py <购买数据CSV> [分区目录]")
+        print("示例: python3 purchase_partitions.py data/user_purchase_data.csv")
+        return
+
+    try:
+        malformed = []
+        partitions = PurchasePartitions.build(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None, malformed)
+        if malformed:
+            print(format_malformed(malformed))
+        print(f"✅ 已写出 {len(partitions.manifest['partitions'])} 个月份分区"
+              f"（{partitions.manifest['rows']} 条记录）到 {partitions.directory}")
+    except Exception as e:
+        print(f"❌ 分区失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+用户购买数据按天预聚合
+基于列式存储，为每个用户按天汇总订单数、消费金额以及各类别的购买件数和开销，
+并保存为前缀和，任意日期区间的统计只需若干次二分查找和减法。
+金额以整数分保存，区间合计与逐笔累加完全一致
+"""
+
+from collections import Counter
+
+from purchase_store import np
+
+
+def _to_cents(amounts):
+    """金额数组（元，两位小数）转换为 int64 整数分"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _half_cent(total_cents, count):
+    """
+    平均值是否恰好落在半分上
+
+    其他情况下 round(合计 / 件数, 2) 与浮点逐笔累加后求平均的结果相同；恰好落在半分上时，
+    浮点累加的舍入方向取决于累加顺序，需要按 analyze_user_habits 的顺序重新累加
+    """
+    return (2 * total_cents) % count == 0 and (2 * total_cents // count) % 2 == 1
+
+
+def _block_prefix(keys, values, span):
+    """
+    计算分块前缀和
+
+    keys 为已排序的复合键（块编号 * span + 天），每个块内单独累加
+    """
+    cumulative = np.cumsum(values)
+    if len(keys) == 0:
+        return cumulative
+    blocks = keys // span
+    block_start = np.ones(len(keys), dtype=bool)
+    block_start[1:] = blocks[1:] != blocks[:-1]
+    starts = np.flatnonzero(block_start)
+    base = np.repeat(cumulative[starts] - values[starts], np.diff(np.append(starts, len(keys))))
+    return cumulative - base
+
+
+class PurchaseRollups:
+    """
+    用户按天汇总的购买统计
+
+    只统计未退款订单，结构为两组“复合键 + 块内前缀和”：
+        - 订单级：块 = 用户，记录每天的订单数和消费金额（分）
+        - 类别级：块 = (用户, 类别)，记录每天该类别的购买件数和开销（分），
+          另记录当天该类别第一件商品在 product_values 中的位置（不累加），
+          用于件数相同时按首次出现顺序排列，与 analyze_user_habits 一致
+
+    复合键 = 块编号 * span + 天编号（epoch 天），按复合键排序后
+    同一块内的数据连续且按天有序
+    """
+
+    def __init__(self, rows, span, catalog, users, order_keys, order_counts, order_amounts,
+                 category_keys, category_counts, category_spend, category_first):
+        self.rows = rows  # 汇总覆盖列式存储中的前 rows 条记录
+        self.span = span
+        self.catalog = catalog  # 商品类别编码 / 单价查找表（ProductCatalog）
+        self.categories = catalog.categories
+        self.users = users
+        self.order_keys = order_keys
+        self.order_counts = order_counts
+        self.order_amounts = order_amounts
+        self.category_keys = category_keys
+        self.category_counts = category_counts
+        self.category_spend = category_spend
+        self.category_first = category_first
+
+    @classmethod
+    def build(cls, store, catalog):
+        """从列式存储和商品查找表（ProductCatalog）构建按天汇总"""
+        categories = catalog.categories
+
+        valid = np.flatnonzero(~store.refunded)
+        days = store.timestamps[valid] // 86400
+        span = int(days.max()) + 2 if len(days) else 2
+        users, user_codes = np.unique(store.user_ids[valid], return_inverse=True)
+
+        # 订单级：按 (用户, 天) 汇总
+        keys = user_codes.astype(np.int64) * span + days
+        order_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(order_keys)).astype(np.int64)
+        # 整数分以 float64 累加，在 2**53 以内是精确的
+        amounts = np.bincount(inverse, weights=_to_cents(store.amounts[valid]),
+                              minlength=len(order_keys)).astype(np.int64)
+
+        # 类别级：展开每笔订单的商品，按 (用户, 类别, 天) 汇总
+        item_positions = store.product_positions(valid)
+        item_codes, item_prices = catalog.lookup_array(store.product_values[item_positions])
+        lengths = store.product_offsets[valid + 1] - store.product_offsets[valid]
+        item_orders = np.repeat(np.arange(len(valid)), lengths)
+        known = item_codes >= 0
+        item_blocks = user_codes[item_orders[known]].astype(np.int64) * len(categories) + item_codes[known]
+        item_keys = item_blocks * span + days[item_orders[known]]
+        category_keys, inverse = np.unique(item_keys, return_inverse=True)
+        category_counts = np.bincount(inverse, minlength=len(category_keys)).astype(np.int64)
+        category_spend = np.bincount(inverse, weights=_to_cents(item_prices[known]),
+                                     minlength=len(category_keys)).astype(np.int64)
+        # 末尾多留一个哨兵，区间右端可以直接作为 np.minimum.reduceat 的下标
+        category_first = np.full(len(category_keys) + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(category_first, inverse, item_positions[known])
+
+        return cls(
+            rows=len(store),
+            span=span,
+            catalog=catalog,
+            users=users,
+            order_keys=order_keys,
+            order_counts=_block_prefix(order_keys, counts, span),
+            order_amounts=_block_prefix(order_keys, amounts, span),
+            category_keys=category_keys,
+            category_counts=_block_prefix(category_keys, category_counts, span),
+            category_spend=_block_prefix(category_keys, category_spend, span),
+            category_first=category_first,
+        )
+
+    def _range(self, keys, cumulatives, blocks, start_day, end_day):
+        """
+        对一组块查询 [start_day, end_day) 内的合计
+
+        Returns:
+            (各累计量的区间合计列表, 区间内第一个有数据的下标, 区间末下标)
+        """
+        base = blocks * self.span
+        first = np.searchsorted(keys, base)
+        lo = np.searchsorted(keys, base + start_day)
+        hi = np.searchsorted(keys, base + end_day)
+        totals = []
+        for cumulative in cumulatives:
+            if len(cumulative) == 0:
+                totals.append(np.zeros(len(blocks), dtype=cumulative.dtype))
+                continue
+            upper = np.where(hi > first, cumulative[hi - 1], 0)
+            lower = np.where(lo > first, cumulative[lo - 1], 0)
+            totals.append(upper - lower)
+        return totals, lo, hi
+
+    def summarize(self, store, user_id, start_day, end_day, extra_indices=None):
+        """
+        统计用户在 [start_day, end_day) 内的订单数、消费金额和各类别开销
+
+        Args:
+            store: 列式存储（用于补充 extra_indices 对应的原始订单）
+            user_id: 用户ID
+            start_day / end_day: epoch 天编号，左闭右开
+            extra_indices: 需要额外计入的订单下标（例如恰好落在结束日零点的订单、
+                           汇总之后追加的订单）
+
+        Returns:
+            dict: total_orders, total_amount, avg_order_amount, category_avg_spending
+        """
+        num_categories = len(self.categories)
+        total_orders = 0
+        total_cents = 0
+        category_counts = np.zeros(num_categories, dtype=np.int64)
+        category_spend = np.zeros(num_categories, dtype=np.int64)
+        first_seen = np.full(num_categories, np.iinfo(np.int64).max, dtype=np.int64)
+        lo = hi = None
+        range_start, range_end = start_day, end_day
+
+        # 天编号限制在 [0, span) 内，避免复合键越界到相邻块
+        start_day = min(max(start_day, 0), self.span - 1)
+        end_day = min(max(end_day, 0), self.span - 1)
+        pos = np.searchsorted(self.users, user_id)
+        if end_day > start_day and pos < len(self.users) and self.users[pos] == user_id:
+            (orders, amounts), _, _ = self._range(
+                self.order_keys, (self.order_counts, self.order_amounts),
+                np.array([pos], dtype=np.int64), start_day, end_day)
+            total_orders += int(orders[0])
+            total_cents += int(amounts[0])
+
+            blocks = pos * num_categories + np.arange(num_categories, dtype=np.int64)
+            (counts, spend), lo, hi = self._range(
+                self.category_keys, (self.category_counts, self.category_spend), blocks, start_day, end_day)
+            category_counts += counts
+            category_spend += spend
+
+        if extra_indices is not None and len(extra_indices):
+            total_orders += len(extra_indices)
+            total_cents += int(_to_cents(store.amounts[extra_indices]).sum())
+            positions = store.product_positions(extra_indices)
+            codes, prices = self.catalog.lookup_array(store.product_values[positions])
+            known = codes >= 0
+            category_counts += np.bincount(codes[known], minlength=num_categories)
+            category_spend += np.bincount(codes[known], weights=_to_cents(prices[known]),
+                                          minlength=num_categories).astype(np.int64)
+            np.minimum.at(first_seen, codes[known], positions[known])
+
+        # 按购买件数降序，件数相同时按区间内首次出现的位置排序，取前5；
+        # 只有与其他类别件数相同、且可能进入前5的类别才需要在区间内查找首次出现的位置
+        present = np.flatnonzero(category_counts).tolist()
+        if lo is not None and len(present) > 1:
+            counts = category_counts[present].tolist()
+            fifth = sorted(counts, reverse=True)[min(5, len(counts)) - 1]
+            multiplicity = Counter(counts)
+            tied = [code for code, count in zip(present, counts)
+                    if count >= fifth and multiplicity[count] > 1 and hi[code] > lo[code]]
+            if tied:
+                bounds = np.stack((lo[tied], hi[tied]), axis=1).ravel()
+                first_seen[tied] = np.minimum(first_seen[tied],
+                                              np.minimum.reduceat(self.category_first, bounds)[::2])
+
+        # 平均值恰好落在半分上时，按 analyze_user_habits 的记录顺序对原始金额重新逐笔累加
+        selected = item_codes = item_prices = None
+        if total_orders and _half_cent(total_cents, total_orders):
+            selected = store.select(user_id, range_start * 86400, range_end * 86400)
+            avg_order_amount = round(sum(store.amounts[selected].tolist()) / total_orders, 2)
+        else:
+            avg_order_amount = round(total_cents / 100 / total_orders, 2) if total_orders else 0
+
+        category_avg_spending = []
+        for code in np.lexsort((first_seen, -category_counts))[:5]:
+            count = int(category_counts[code])
+            if count == 0:
+                break
+            total_spending = int(category_spend[code])
+            if _half_cent(total_spending, count):
+                if item_codes is None:
+                    if selected is None:
+                        selected = store.select(user_id, range_start * 86400, range_end * 86400)
+                    item_codes, item_prices = self.catalog.lookup_array(store.gather_products(selected))
+                avg_spending = round(sum(item_prices[item_codes == code].tolist()) / count, 2)
+            else:
+                avg_spending = round(total_spending / 100 / count, 2)
+            category_avg_spending.append({
+                'category': self.categories[code],
+                'avg_spending': avg_spending,
+                'total_spending': total_spending / 100,
+                'purchase_count': count
+            })
+
+        return {
+            'total_orders': total_orders,
+            'total_amount': total_cents / 100,
+            'avg_order_amount': avg_order_amount,
+            'category_avg_spending': category_avg_spending,
+        }
@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+"""
+列式购买数据存储
+将 user_purchase_data.csv 按列保存为 NumPy 类型数组，替代逐行的字典对象，
+降低内存占用并支持向量化筛选
+"""
+
+import bisect
+import calendar
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from purchase_csv import HEADER_LINE, parse_timestamp, read_purchase_columns
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+# 快照格式版本，列布局变化时递增，旧快照会被自动重建
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR_NAME = ".snapshot"
+
+# prefix_key 校验的首尾字节数
+PREFIX_EDGE_BYTES = 1 << 16
+
+
+def to_epoch(dt):
+    """将（无时区的）datetime 转换为 epoch 秒，按 UTC 解释以避免时区偏移"""
+    return calendar.timegm(dt.timetuple())
+
+
+class PurchaseStore:
+    """
+    列式购买记录存储
+
+    每一列都是一个 NumPy 数组，第 i 个元素对应 CSV 中的第 i 条记录：
+        - record_ids: int64，记录ID
+        - user_ids: int32，用户ID
+        - timestamps: int64，购买时间（epoch 秒）
+        - amounts: float64，购买总金额(元)
+        - refunded: bool，是否退款
+        - item_counts: int8，购买商品数量
+        - product_offsets / product_values: 商品ID 的 CSR 布局，
+          第 i 条记录的商品为 product_values[product_offsets[i]:product_offsets[i + 1]]
+    """
+
+    def __init__(self, record_ids, user_ids, timestamps, amounts, refunded,
+                 item_counts, product_offsets, product_values):
+        self.record_ids = record_ids
+        self.user_ids = user_ids
+        self.timestamps = timestamps
+        self.amounts = amounts
+        self.refunded = refunded
+        self.item_counts = item_counts
+        self.product_offsets = product_offsets
+        self.product_values = product_values
+        # 用户索引：记录按 (用户ID, 购买时间) 排序后的下标，以及每个用户所在的区间
+        self.index_order = None
+        self.index_users = None
+        self.index_bounds = None
+        self.index_timestamps = None
+        # 索引覆盖前 index_rows 条记录；之后追加的记录登记在增量索引中，
+        # 用户ID -> (按时间排序的购买时间列表, 对应的记录下标列表)
+        self.index_rows = 0
+        self.delta_index = {}
+        # 追加记录时使用的预留容量缓冲区，列属性是缓冲区的前缀视图
+        self._buffers = {}
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @staticmethod
+    def parse_row(row):
+        """将 csv.DictReader 读出的一行转换为 from_rows/append 使用的元组"""
+        return (
+            int(row['记录ID']),
+            int(row['用户ID']),
+            row['购买时间'],
+            float(row['购买总金额(元)']),
+            row['是否退款'] != '否',
+            int(row['购买商品数量']),
+            [int(pid) for pid in row['商品ID'].strip('"').split(',')],
+        )
+
+    @classmethod
+    def from_csv(cls, path, malformed=None):
+        """
+        从 user_purchase_data.csv 构建列式存储
+
+        按位置读取后整列批量转换；存在格式错误的值时改为逐行解析，跳过错误行
+
+        Args:
+            path: 购买数据CSV路径
+            malformed: 可选列表，格式错误的行以 (行号, 原因) 追加到其中
+        """
+        malformed = [] if malformed is None else malformed
+        with open(path, 'rb') as f:
+            header = f.readline().rstrip(b'\r\n')
+            if header.decode('utf-8') == HEADER_LINE:
+                try:
+                    return cls._from_fixed_layout(f.read())
+                except (ValueError, OverflowError):
+                    pass
+
+        columns, line_numbers = read_purchase_columns(path, malformed)
+        try:
+            return cls._from_columns(columns)
+        except (ValueError, OverflowError):
+            pass
+
+        rows = []
+        for values, line_number in zip(zip(*columns.values()), line_numbers):
+            row = dict(zip(columns, values))
+            try:
+                record = cls.parse_row(row)
+                timestamp = to_epoch(parse_timestamp(row['购买时间']))
+            except ValueError as e:
+                malformed.append((line_number, str(e)))
+                continue
+            rows.append(record[:2] + (timestamp,) + record[3:])
+        malformed.sort()
+        return cls.from_rows(rows)
+
+    @classmethod
+    def _from_fixed_layout(cls, data):
+        """
+        按固定列布局整块解析购买数据（不含表头的 bytes），全部列向量化转换
+
+        要求每行一条记录、只有商品ID字段带引号（多个商品时必须带引号），
+        整数字段为纯数字、金额为纯数字或一位小数点、购买时间为 'YYYY-MM-DD HH:MM:SS'；
+        任一行不符合时抛出 ValueError，由调用方改为逐行解析
+        """
+        if data and not data.endswith(b'\n'):
+            data += b'\n'
+        buf = np.frombuffer(data, dtype=np.uint8)
+
+        # 行边界（行尾的 \r 不计入字段，跳过空行）
+        newlines = np.flatnonzero(buf == ord('\n'))
+        starts = np.concatenate((np.zeros(1, dtype=np.int64), newlines[:-1] + 1))
+        ends = newlines - (buf[np.maximum(newlines - 1, 0)] == ord('\r'))
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+
+        # 每行的逗号：前 3 个和后 3 个分隔固定字段，中间的是商品ID之间的分隔符
+        commas = np.flatnonzero(buf == ord(','))
+        lo = np.searchsorted(commas, starts)
+        hi = np.searchsorted(commas, ends)
+        if np.any(hi - lo < 6):
+            raise ValueError("字段数不足")
+        c1, c2, c3 = commas[lo], commas[lo + 1], commas[lo + 2]
+        c4, c5, c6 = commas[hi - 3], commas[hi - 2], commas[hi - 1]
+
+        # 引号只能成对包住商品ID字段
+        quotes = np.flatnonzero(buf == ord('"'))
+        quote_lo = np.searchsorted(quotes, starts)
+        quote_count = np.searchsorted(quotes, ends) - quote_lo
+        quoted = quote_count == 2
+        if np.any((quote_count != 0) & ~quoted) or np.any((hi - lo > 6) & ~quoted):
+            raise ValueError("引号位置不符合固定布局")
+        if quoted.any():
+            first = quotes[quote_lo[quoted]]
+            second = quotes[quote_lo[quoted] + 1]
+            if np.any(first != c3[quoted] + 1) or np.any(second != c4[quoted] - 1):
+                raise ValueError("引号位置不符合固定布局")
+
+        # 商品ID：字段起点和内部逗号之后为各商品的起点，内部逗号和字段终点为终点
+        inner = np.zeros(len(commas) + 1, dtype=np.int64)
+        np.add.at(inner, lo + 3, 1)
+        np.add.at(inner, hi - 3, -1)
+        inner_commas = commas[np.cumsum(inner[:-1]) > 0]
+        product_starts = np.sort(np.concatenate((c3 + 1 + quoted, inner_commas + 1)))
+        product_ends = np.sort(np.concatenate((c4 - quoted, inner_commas)))
+        offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+        np.cumsum(hi - lo - 5, out=offsets[1:])
+
+        record_ids = _parse_digits(buf, starts, c1)
+        user_ids = _parse_digits(buf, c1 + 1, c2)
+        item_counts = _parse_digits(buf, c2 + 1, c3)
+        product_values = _parse_digits(buf, product_starts, product_ends)
+        for values in (user_ids, product_values):
+            if len(values) and values.max() > np.iinfo(np.int32).max:
+                raise OverflowError("ID超出范围")
+        count_dtype = np.int8 if not len(item_counts) or item_counts.max() <= np.iinfo(np.int8).max else np.int32
+
+        # 购买时间：固定 19 字节，整列交给 numpy 解析
+        if np.any(c6 - c5 - 1 != 19):
+            raise ValueError("购买时间格式错误")
+        time_bytes = buf[(c5 + 1)[:, None] + np.arange(19)]
+        if np.any(time_bytes[:, 10] != ord(' ')):
+            raise ValueError("购买时间格式错误")
+        timestamps = time_bytes.view('S19').ravel().astype('datetime64[s]').astype(np.int64)
+
+        # 是否退款：与 '否' 的 UTF-8 编码逐字节比较
+        no = np.frombuffer('否'.encode('utf-8'), dtype=np.uint8)
+        refund_lengths = ends - c6 - 1
+        not_refunded = refund_lengths == len(no)
+        if not_refunded.any():
+            refund_bytes = buf[(c6 + 1)[not_refunded][:, None] + np.arange(len(no))]
+            not_refunded[not_refunded] = np.all(refund_bytes == no, axis=1)
+
+        return cls(
+            record_ids=record_ids,
+            user_ids=user_ids.astype(np.int32),
+            timestamps=timestamps,
+            amounts=_parse_decimal(buf, c4 + 1, c5),
+            refunded=~not_refunded,
+            item_counts=item_counts.astype(count_dtype),
+            product_offsets=offsets,
+            product_values=product_values.astype(np.int32),
+        )
+
+    @classmethod
+    def _from_columns(cls, columns):
+        """整列批量转换 read_purchase_columns 的结果，任一值格式错误时抛出 ValueError"""
+        times = columns['购买时间']
+        # numpy 也接受只有日期等写法，先确认都是固定长度的完整时间
+        if any(len(text) != 19 for text in times):
+            raise ValueError("购买时间格式错误")
+        products = columns['商品ID']
+        lengths = np.fromiter((text.count(',') + 1 for text in products), dtype=np.int64, count=len(products))
+        offsets = np.zeros(len(products) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = (np.array(','.join(products).replace('"', '').split(','), dtype=np.int32)
+                  if products else np.empty(0, dtype=np.int32))
+        item_counts = np.array(columns['购买商品数量'], dtype=np.int64)
+        count_dtype = np.int8 if not len(item_counts) or item_counts.max() <= np.iinfo(np.int8).max else np.int32
+        return cls(
+            record_ids=np.array(columns['记录ID'], dtype=np.int64),
+            user_ids=np.array(columns['用户ID'], dtype=np.int32),
+            timestamps=np.array(times, dtype='datetime64[s]').astype(np.int64),
+            amounts=np.array(columns['购买总金额(元)'], dtype=np.float64),
+            refunded=np.array(columns['是否退款'], dtype=str) != '否',
+            item_counts=item_counts.astype(count_dtype),
+            product_offsets=offsets,
+            product_values=values,
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """从 parse_row 生成的元组构建列式存储"""
+        record_ids, user_ids, times, amounts, refunded, item_counts = [], [], [], [], [], []
+        offsets, values = [0], []
+        for record_id, user_id, purchase_time, amount, is_refunded, item_count, product_ids in rows:
+            record_ids.append(record_id)
+            user_ids.append(user_id)
+            times.append(purchase_time)
+            amounts.append(amount)
+            refunded.append(is_refunded)
+            item_counts.append(item_count)
+            values.extend(product_ids)
+            offsets.append(len(values))
+
+        count_dtype = np.int8 if not item_counts or max(item_counts) <= np.iinfo(np.int8).max else np.int32
+        return cls(
+            record_ids=np.array(record_ids, dtype=np.int64),
+            user_ids=np.array(user_ids, dtype=np.int32),
+            timestamps=np.array(times, dtype='datetime64[s]').astype(np.int64),
+            amounts=np.array(amounts, dtype=np.float64),
+            refunded=np.array(refunded, dtype=bool),
+            item_counts=np.array(item_counts, dtype=count_dtype),
+            product_offsets=np.array(offsets, dtype=np.int64),
+            product_values=np.array(values, dtype=np.int32),
+        )
+
+    def take(self, indices):
+        """取出给定下标的记录（按给定顺序），返回新的列式存储（不含用户索引）"""
+        lengths = self.product_offsets[indices + 1] - self.product_offsets[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return PurchaseStore(
+            record_ids=self.record_ids[indices],
+            user_ids=self.user_ids[indices],
+            timestamps=self.timestamps[indices],
+            amounts=self.amounts[indices],
+            refunded=self.refunded[indices],
+            item_counts=self.item_counts[indices],
+            product_offsets=offsets,
+            product_values=self.gather_products(indices),
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """按顺序拼接多个列式存储，返回新的列式存储（不含用户索引）"""
+        stores = list(stores)
+        if not stores:
+            return cls.from_rows([])
+        if len(stores) == 1:
+            return stores[0]
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for store in stores:
+            offsets.append(store.product_offsets[1:len(store) + 1] + base)
+            base += int(store.product_offsets[len(store)])
+        return cls(
+            *(np.concatenate([getattr(store, name) for store in stores]) for name in cls.COLUMNS[:6]),
+            product_offsets=np.concatenate(offsets),
+            product_values=np.concatenate([store.product_values[:store.product_offsets[len(store)]]
+                                           for store in stores]),
+        )
+
+    def build_user_index(self):
+        """构建按用户分组、组内按购买时间排序的索引"""
+        # lexsort 是稳定排序，同一时间的记录保持原始顺序
+        self.index_order = np.lexsort((self.timestamps, self.user_ids))
+        sorted_users = self.user_ids[self.index_order]
+        self.index_users, starts = np.unique(sorted_users, return_index=True)
+        self.index_bounds = np.append(starts, len(sorted_users)).astype(np.int64)
+        self.index_timestamps = self.timestamps[self.index_order]
+        self.index_rows = len(self)
+        self.delta_index = {}
+
+    def append(self, rows):
+        """
+        追加新记录（parse_row 生成的元组）
+
+        各列写入预留容量的缓冲区，容量不足时按倍数扩容，摊还开销与新增记录数成正比；
+        新记录登记到增量索引，由 build_user_index() 合并进主索引。
+        内存映射的只读列在首次追加时复制为私有缓冲区。
+        """
+        delta = PurchaseStore.from_rows(rows)
+        if len(delta) == 0:
+            return
+        rows_before = len(self)
+        if delta.item_counts.dtype.itemsize > self.item_counts.dtype.itemsize:
+            self._buffers.pop('item_counts', None)
+            self.item_counts = self.item_counts.astype(delta.item_counts.dtype)
+
+        for name in ('record_ids', 'user_ids', 'timestamps', 'amounts', 'refunded', 'item_counts'):
+            self._extend(name, getattr(delta, name))
+        self._extend('product_offsets', delta.product_offsets[1:] + self.product_offsets[-1])
+        self._extend('product_values', delta.product_values)
+
+        for offset, (user_id, timestamp) in enumerate(zip(delta.user_ids.tolist(), delta.timestamps.tolist())):
+            times, positions = self.delta_index.setdefault(user_id, ([], []))
+            # 同一时间的记录排在已有记录之后，保持原始顺序
+            i = bisect.bisect_right(times, timestamp)
+            times.insert(i, timestamp)
+            positions.insert(i, rows_before + offset)
+
+    def _extend(self, name, values):
+        """在列末尾追加数据"""
+        column = getattr(self, name)
+        used = len(column)
+        needed = used + len(values)
+        buffer = self._buffers.get(name)
+        if buffer is None or len(buffer) < needed:
+            buffer = np.empty(max(needed * 2, 1024), dtype=column.dtype)
+            buffer[:used] = column
+            self._buffers[name] = buffer
+        buffer[used:needed] = values
+        setattr(self, name, buffer[:needed])
+
+    def delta_size(self):
+        """尚未合并进主索引的记录数"""
+        return len(self) - self.index_rows if self.index_order is not None else 0
+
+    def select_delta(self, user_id, start_ts, end_ts):
+        """在增量索引中筛选指定用户在时间段内的未退款记录（按原始记录顺序）"""
+        if user_id not in self.delta_index:
+            return np.empty(0, dtype=np.int64)
+        times, positions = self.delta_index[user_id]
+        lo = bisect.bisect_left(times, start_ts)
+        hi = bisect.bisect_right(times, end_ts)
+        indices = np.array(sorted(positions[lo:hi]), dtype=np.int64)
+        return indices[~self.refunded[indices]]
+
+    def select(self, user_id, start_ts, end_ts):
+        """
+        筛选指定用户在时间段内的未退款记录
+
+        已构建用户索引时只需两次二分查找加一次切片，开销与该用户的记录数相关，
+        与数据总量无关；否则退化为全表向量化扫描。
+
+        Returns:
+            记录下标数组（按原始记录顺序）
+        """
+        if self.index_order is None:
+            mask = self.user_ids == user_id
+            mask &= self.timestamps >= start_ts
+            mask &= self.timestamps <= end_ts
+            mask &= ~self.refunded
+            return np.flatnonzero(mask)
+
+        indices = np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self.index_users, user_id)
+        if pos < len(self.index_users) and self.index_users[pos] == user_id:
+            begin, end = self.index_bounds[pos], self.index_bounds[pos + 1]
+            user_times = self.index_timestamps[begin:end]
+            lo = begin + np.searchsorted(user_times, start_ts, side='left')
+            hi = begin + np.searchsorted(user_times, end_ts, side='right')
+            indices = np.sort(self.index_order[lo:hi])
+            indices = indices[~self.refunded[indices]]
+        if self.delta_index:
+            # 增量记录的下标都大于主索引中的下标，直接拼接仍保持原始顺序
+            indices = np.concatenate((indices, self.select_delta(user_id, start_ts, end_ts)))
+        return indices
+
+    def product_positions(self, indices):
+        """按记录顺序返回给定记录的全部商品在 product_values 中的位置"""
+        starts = self.product_offsets[indices]
+        lengths = self.product_offsets[indices + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # 每个元素的位置 = 所属记录的起点 + 在该记录内的偏移
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.arange(total) + shifts
+
+    def gather_products(self, indices):
+        """按记录顺序取出给定记录的全部商品ID，返回扁平数组"""
+        return self.product_values[self.product_positions(indices)]
+
+    def dates(self, indices):
+        """返回给定记录的购买日期字符串（YYYY-MM-DD）"""
+        return (self.timestamps[indices] // 86400).astype('datetime64[D]').astype(str)
+
+    def nbytes(self):
+        """列式存储（含用户索引）占用的字节数"""
+        columns = [
+            self.record_ids, self.user_ids, self.timestamps, self.amounts, self.refunded,
+            self.item_counts, self.product_offsets, self.product_values,
+            self.index_order, self.index_users, self.index_bounds, self.index_timestamps,
+        ]
+        return sum(column.nbytes for column in columns if column is not None)
+
+    # 需要持久化的列（含用户索引）
+    COLUMNS = (
+        'record_ids', 'user_ids', 'timestamps', 'amounts', 'refunded', 'item_counts',
+        'product_offsets', 'product_values',
+        'index_order', 'index_users', 'index_bounds', 'index_timestamps',
+    )
+
+    def save(self, directory):
+        """将全部列保存为目录下的 .npy 文件"""
+        if self.index_order is None or self.delta_size():
+            self.build_user_index()
+        for name in self.COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """从 save() 写出的目录加载列式存储，并校验各列长度是否一致"""
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in cls.COLUMNS
+        }
+        store = cls(**{name: columns[name] for name in cls.COLUMNS[:8]})
+        store.index_order = columns['index_order']
+        store.index_users = columns['index_users']
+        store.index_bounds = columns['index_bounds']
+        store.index_timestamps = columns['index_timestamps']
+        store.index_rows = len(store.user_ids)
+
+        rows = len(store.user_ids)
+        row_columns = ('record_ids', 'timestamps', 'amounts', 'refunded', 'item_counts',
+                       'index_order', 'index_timestamps')
+        if (any(len(columns[name]) != rows for name in row_columns)
+                or len(store.product_offsets) != rows + 1
+                or len(store.product_values) != (int(store.product_offsets[-1]) if rows else 0)
+                or len(store.index_bounds) != len(store.index_users) + 1):
+            raise ValueError(f"快照列长度不一致: {directory}")
+        return store
+
+
+# ============== 固定布局的向量化解析 ==============
+
+def _parse_digits(buf, starts, ends):
+    """
+    将 buf[starts[i]:ends[i]] 解析为非负十进制整数
+
+    按位逐列累加（Horner 法），循环次数等于最长字段的位数；
+    字段为空、含非数字字符或超过 18 位时抛出 ValueError
+    """
+    lengths = ends - starts
+    values = np.zeros(len(lengths), dtype=np.int64)
+    if len(lengths) == 0:
+        return values
+    if lengths.min() < 1 or lengths.max() > 18:
+        raise ValueError("整数字段长度错误")
+    last = len(buf) - 1
+    for position in range(int(lengths.max())):
+        digits = buf[np.minimum(starts + position, last)].astype(np.int64) - ord('0')
+        active = position < lengths
+        if np.any(active & ((digits < 0) | (digits > 9))):
+            raise ValueError("整数字段含非数字字符")
+        values = np.where(active, values * 10 + digits, values)
+    return values
+
+
+def _parse_decimal(buf, starts, ends):
+    """
+    将 'ddd' 或 'ddd.dd' 形式的字段解析为 float64
+
+    先把去掉小数点的数字作为整数解析，再除以 10 的小数位数次方；
+    两个操作数都能精确表示（不超过 15 位有效数字），除法结果与 float() 解析完全一致
+    """
+    lengths = ends - starts
+    if len(lengths) == 0:
+        return np.zeros(0, dtype=np.float64)
+    if lengths.min() < 1 or lengths.max() > 16:
+        raise ValueError("金额字段长度错误")
+    raw = buf[np.minimum(starts[:, None] + np.arange(int(lengths.max())), len(buf) - 1)]
+    mask = np.arange(raw.shape[1]) < lengths[:, None]
+    dots = mask & (raw == ord('.'))
+    dot_count = dots.sum(axis=1)
+    if np.any(dot_count > 1):
+        raise ValueError("金额字段格式错误")
+    has_dot = dot_count == 1
+    dot_pos = np.where(has_dot, np.argmax(dots, axis=1), lengths)
+    # 小数点两侧都必须有数字
+    if np.any(has_dot & ((dot_pos == 0) | (dot_pos == lengths - 1))):
+        raise ValueError("金额字段格式错误")
+    integer = _parse_digits(buf, starts, starts + dot_pos)
+    decimals = np.where(has_dot, lengths - dot_pos - 1, 0)
+    fraction = np.zeros(len(lengths), dtype=np.int64)
+    if has_dot.any():
+        fraction[has_dot] = _parse_digits(buf, (starts + dot_pos + 1)[has_dot], ends[has_dot])
+    mantissa = integer * 10 ** decimals + fraction
+    return mantissa.astype(np.float64) / 10.0 ** decimals
+
+
+# ============== 二进制快照 ==============
+
+def _file_sha256(path):
+    """计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_key(path):
+    """数据源文件的快照键：大小、修改时间和内容哈希"""
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _file_sha256(path),
+    }
+
+
+def prefix_key(path, size):
+    """
+    文件前 size 字节的标识：大小、修改时间和首尾各 PREFIX_EDGE_BYTES 字节的 SHA-256
+
+    只读取固定长度，开销与文件大小无关。用于只追加的数据文件：记录已读取到的位置，
+    下次从该位置续读前用 prefix_state 确认文件没有被替换或改写
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(size, PREFIX_EDGE_BYTES)))
+        if size > PREFIX_EDGE_BYTES:
+            f.seek(max(PREFIX_EDGE_BYTES, size - PREFIX_EDGE_BYTES))
+            digest.update(f.read(size - f.tell()))
+    return {
+        'size': size,
+        'mtime_ns': os.stat(path).st_mtime_ns,
+        'sha256': digest.hexdigest(),
+    }
+
+
+def prefix_state(path, key):
+    """
+    判断文件与 prefix_key 生成的标识的关系
+
+    大小和修改时间都相同时直接认为一致；否则重新校验前 key['size'] 字节，
+    文件被替换时表头附近或已读部分的末尾（续读位置之前的最后几行）几乎必然不同
+
+    Returns:
+        'current'：内容未变；'appended'：只在末尾追加了数据；None：文件变小、被替换或改写
+    """
+    stat = os.stat(path)
+    if stat.st_size < key['size']:
+        return None
+    if stat.st_size == key['size'] and stat.st_mtime_ns == key['mtime_ns']:
+        return 'current'
+    if prefix_key(path, key['size'])['sha256'] != key['sha256']:
+        return None
+    return 'current' if stat.st_size == key['size'] else 'appended'
+
+
+def _snapshot_paths(purchase_data_path):
+    """返回 (快照根目录, 快照描述文件路径)"""
+    root = os.path.join(os.path.dirname(os.path.abspath(purchase_data_path)), SNAPSHOT_DIR_NAME)
+    name = os.path.splitext(os.path.basename(purchase_data_path))[0]
+    return root, os.path.join(root, f"{name}.json")
+
+
+def _source_matches(path, key):
+    """
+    判断数据源是否与快照键一致
+
+    大小和修改时间都相同则直接认为一致；只有修改时间变化时才重新计算哈希，
+    以兼容被 touch 或复制但内容未变的文件（此时会更新 key 中的修改时间）
+    """
+    stat = os.stat(path)
+    if stat.st_size != key['size']:
+        return False
+    if stat.st_mtime_ns == key['mtime_ns']:
+        return True
+    if _file_sha256(path) != key['sha256']:
+        return False
+    key['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def _write_meta(meta_path, meta):
+    """原子替换快照描述文件"""
+    root = os.path.dirname(meta_path)
+    fd, tmp_meta = tempfile.mkstemp(prefix=".meta-", suffix='.json', dir=root)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.chmod(tmp_meta, 0o644)
+    os.replace(tmp_meta, meta_path)
+
+
+def write_snapshot(store, product_map, product_prices, purchase_data_path, product_data_path):
+    """
+    将解析后的购买数据和商品数据写为快照（保存在 CSV 同级的 .snapshot 目录）
+
+    列文件先写入临时目录再整体改名，最后原子替换描述文件，
+    读取方不会看到写了一半的快照
+    """
+    root, meta_path = _snapshot_paths(purchase_data_path)
+    os.makedirs(root, exist_ok=True)
+
+    sources = {
+        'purchase': _source_key(purchase_data_path),
+        'product': _source_key(product_data_path),
+    }
+    content_id = hashlib.sha256(
+        (sources['purchase']['sha256'] + sources['product']['sha256']).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(meta_path))[0]
+    directory = f"{name}-v{SNAPSHOT_VERSION}-{content_id}"
+    target = os.path.join(root, directory)
+
+    categories = sorted(set(product_map.values()))
+    category_codes = {category: code for code, category in enumerate(categories)}
+    product_ids = list(product_map)
+
+    if not os.path.isdir(target):
+        staging = tempfile.mkdtemp(prefix=f".{name}-", dir=root)
+        try:
+            store.save(staging)
+            np.save(os.path.join(staging, 'product_ids.npy'), np.array(product_ids, dtype=np.int32))
+            np.save(os.path.join(staging, 'product_prices.npy'),
+                    np.array([product_prices.get(pid, 0.0) for pid in product_ids], dtype=np.float64))
+            np.save(os.path.join(staging, 'product_categories.npy'),
+                    np.array([category_codes[product_map[pid]] for pid in product_ids], dtype=np.int32))
+            os.chmod(staging, 0o755)
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'directory': directory,
+        'rows': len(store),
+        'sources': sources,
+        'categories': categories,
+    }
+    _write_meta(meta_path, meta)
+
+    # 清理同名的旧快照目录（已打开的进程仍可继续读取已删除的文件）
+    for entry in os.listdir(root):
+        if entry.startswith(f"{name}-v") and entry != directory:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return target
+
+
+def load_snapshot(purchase_data_path, product_data_path, mmap_mode=None):
+    """
+    加载与数据源一致的快照
+
+    mmap_mode='r' 时各列以只读内存映射方式打开，只读取文件头，打开开销与数据量无关；
+    多个进程映射同一快照时共享页缓存中的同一份物理内存。
+
+    Returns:
+        (store, product_map, product_prices)；快照不存在、过期或损坏时返回 None
+    """
+    _, meta_path = _snapshot_paths(purchase_data_path)
+    if not os.path.exists(meta_path):
+        return None
+
+    directory = None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != SNAPSHOT_VERSION:
+            return None
+        sources = meta['sources']
+        mtimes = (sources['purchase']['mtime_ns'], sources['product']['mtime_ns'])
+        if not (_source_matches(purchase_data_path, sources['purchase'])
+                and _source_matches(product_data_path, sources['product'])):
+            return None
+        if mtimes != (sources['purchase']['mtime_ns'], sources['product']['mtime_ns']):
+            # 内容未变但修改时间变了，记录新的修改时间，避免下次重复计算哈希
+            _write_meta(meta_path, meta)
+
+        directory = os.path.join(os.path.dirname(meta_path), meta['directory'])
+        store = PurchaseStore.load(directory, mmap_mode=mmap_mode)
+        if len(store) != meta['rows']:
+            raise ValueError("快照记录数与描述文件不一致")
+
+        categories = meta['categories']
+        product_ids = np.load(os.path.join(directory, 'product_ids.npy')).tolist()
+        prices = np.load(os.path.join(directory, 'product_prices.npy')).tolist()
+        codes = np.load(os.path.join(directory, 'product_categories.npy')).tolist()
+        product_map = {pid: categories[code] for pid, code in zip(product_ids, codes)}
+        product_prices = dict(zip(product_ids, prices))
+        return store, product_map, product_prices
+    except Exception as e:
+        print(f"⚠️ 快照不可用，将重新解析CSV: {e}")
+        # 删除损坏的快照目录，以便重新写入
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+        return None
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+分析结果缓存
+线程安全的 LRU 缓存，支持可选的过期时间（TTL），并记录命中/未命中/淘汰次数
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """有容量上限的 LRU 缓存"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Args:
+            maxsize: 最多缓存的条目数，为 0 时不缓存
+            ttl: 条目有效期（秒），为 None 时永不过期
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (写入时间, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """读取缓存，命中时将条目移到最近使用的位置"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, predicate):
+        """删除键满足 predicate 的全部条目，返回删除的条目数"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+SQLite 购买数据存储
+将购买数据和商品数据导入 SQLite，按 (用户ID, 购买时间) 建立索引，
+分析时把用户、时间段和退款条件交给 SQL 过滤，进程内只保留当前查询的少量记录，
+可处理超出内存的数据量
+
+导入命令:
+    python3 sqlite_store.py <购买数据CSV> <商品数据CSV> <数据库文件>
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+from itertools import groupby
+
+from purchase_csv import format_malformed, parse_timestamp, valid_rows
+from purchase_store import PurchaseStore, to_epoch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    record_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    purchase_time INTEGER NOT NULL,  -- epoch 秒
+    amount REAL NOT NULL,
+    refunded INTEGER NOT NULL,
+    item_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_items (
+    record_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    PRIMARY KEY (record_id, position)
+) WITHOUT ROWID;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_orders_user_time ON orders (user_id, purchase_time);
+"""
+
+
+def _order_rows(rows):
+    """将 PurchaseStore.parse_row 的元组转换为 orders / order_items 表的行"""
+    orders, items = [], []
+    for record_id, user_id, purchase_time, amount, refunded, item_count, product_ids in rows:
+        timestamp = to_epoch(parse_timestamp(purchase_time))
+        orders.append((record_id, user_id, timestamp, amount, int(refunded), item_count))
+        items.extend((record_id, position, product_id) for position, product_id in enumerate(product_ids))
+    return orders, items
+
+
+def import_csv(purchase_data_path, product_data_path, db_path, batch_size=50000, malformed=None):
+    """
+    从CSV导入数据库
+
+    先写入临时文件，导入和建索引完成后再替换目标文件，读取方不会看到导入了一半的数据库；
+    格式错误的行以 (行号, 原因) 追加到可选列表 malformed 后跳过
+
+    Returns:
+        int: 导入的订单数
+    """
+    tmp_path = f"{db_path}.importing"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        with open(product_data_path, 'r', encoding='utf-8') as f:
+            conn.executemany(
+                "INSERT INTO products VALUES (?, ?, ?)",
+                ((int(row['商品ID']), row['商品种类'], float(row['单价(元)'])) for row in csv.DictReader(f)))
+
+        total = 0
+        with open(purchase_data_path, 'r', encoding='utf-8') as f:
+            reader = valid_rows(csv.DictReader(f), [] if malformed is None else malformed)
+            while True:
+                batch = [PurchaseStore.parse_row(row) for _, row in zip(range(batch_size), reader)]
+                if not batch:
+                    break
+                orders, items = _order_rows(batch)
+                conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", orders)
+                conn.executemany("INSERT INTO order_items VALUES (?, ?, ?)", items)
+                total += len(orders)
+        conn.executescript(INDEXES)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return total
+
+
+class SQLitePurchaseStore:
+    """
+    基于 SQLite 的购买数据存储
+
+    每个线程（以及 fork 出的子进程）使用独立的连接；查询结果以小型 PurchaseStore 返回，
+    可直接交给列式分析逻辑处理
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """当前线程的数据库连接"""
+        # SQLite 连接不能跨 fork 使用，子进程中重新打开
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.db_path)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def has_data(self):
+        """数据库中是否有订单"""
+        return self.conn.execute("SELECT EXISTS (SELECT 1 FROM orders)").fetchone()[0] == 1
+
+    def load_products(self):
+        """读取商品表，返回 (product_map, product_prices)"""
+        product_map, product_prices = {}, {}
+        for product_id, category, price in self.conn.execute(
+                "SELECT product_id, category, price FROM products ORDER BY rowid"):
+            product_map[product_id] = category
+            product_prices[product_id] = price
+        return product_map, product_prices
+
+    def fetch_orders(self, user_id, start_ts, end_ts):
+        """
+        查询用户在时间段内的未退款订单
+
+        Returns:
+            PurchaseStore: 只包含查询结果的列式存储（按记录ID排序）
+        """
+        cursor = self.conn.execute(
+            """
+            SELECT o.record_id, o.user_id, o.purchase_time, o.amount, o.refunded, o.item_count, i.product_id
+            FROM orders o JOIN order_items i ON i.record_id = o.record_id
+            WHERE o.user_id = ? AND o.purchase_time BETWEEN ? AND ? AND o.refunded = 0
+            ORDER BY o.record_id, i.position
+            """,
+            (user_id, start_ts, end_ts))
+        rows = []
+        for _, group in groupby(cursor, key=lambda row: row[0]):
+            group = list(group)
+            record_id, user, timestamp, amount, refunded, item_count, _ = group[0]
+            rows.append((record_id, user, timestamp, amount, bool(refunded), item_count,
+                         [row[6] for row in group]))
+        return PurchaseStore.from_rows(rows)
+
+    def fetch_amounts(self, user_id, start_ts, end_ts):
+        """查询用户在时间段内未退款订单的金额（按记录ID排序）"""
+        rows = self.conn.execute(
+            """
+            SELECT amount FROM orders
+            WHERE user_id = ? AND purchase_time BETWEEN ? AND ? AND refunded = 0
+            ORDER BY record_id
+            """,
+            (user_id, start_ts, end_ts))
+        return [row[0] for row in rows]
+
+    def amounts(self):
+        """全部订单金额，按记录ID排序"""
+        return [row[0] for row in self.conn.execute("SELECT amount FROM orders ORDER BY record_id")]
+
+    def product_lists(self):
+        """每条订单的 (记录ID, 商品ID列表)，按记录ID排序"""
+        rows = self.conn.execute("SELECT record_id, product_id FROM order_items ORDER BY record_id, position")
+        return [(record_id, [row[1] for row in group]) for record_id, group in groupby(rows, key=lambda row: row[0])]
+
+    def user_list(self, limit):
+        """按首次出现（记录ID）顺序取前 limit 个不同用户，升序返回"""
+        rows = self.conn.execute(
+            "SELECT user_id FROM orders GROUP BY user_id ORDER BY MIN(record_id) LIMIT ?", (limit,))
+        return sorted(row[0] for row in rows)
+
+    def all_user_ids(self):
+        """全部用户ID（升序）"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT user_id FROM orders ORDER BY user_id")]
+
+    def max_record_id(self):
+        """最大记录ID"""
+        return self.conn.execute("SELECT COALESCE(MAX(record_id), 0) FROM orders").fetchone()[0]
+
+    def insert_rows(self, rows):
+        """追加 PurchaseStore.parse_row 生成的新记录"""
+        orders, items = _order_rows(rows)
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?, ?, ?)", orders)
+            self.conn.executemany("INSERT OR IGNORE INTO order_items VALUES (?, ?, ?)", items)
+
+
+def main():
+    """命令行导入"""
+    import sys
+
+    if len(sys.argv) != 4:
+        print("🗄️ 购买数据 SQLite 导入工具")
+        print("使用方法: python3 sqlite_store.py <购买数据CSV> <商品数据CSV> <数据库文件>")
+        print("示例: python3 sqlite_store.py data/user_purchase_data.csv data/product_data.csv data/purchases.db")
+        return
+
+    purchase_data_path, product_data_path, db_path = sys.argv[1:]
+    try:
+        malformed = []
+        total = import_csv(purchase_data_path, product_data_path, db_path, malformed=malformed)
+        if malformed:
+            print(format_malformed(malformed))
+        print(f"✅ 已导入 {total} 条购买记录到 {db_path}")
+    except Exception as e:
+        print(f"❌ 导入失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+共享实例注册表（APIRegistry）测试：同一组构造参数只创建一个实例（多线程同时取用也是如此），
+reset() 之后重新创建，reload() 完整加载新实例后替换、加载失败时保留旧实例
+
+运行: python -m pytest -q test_api_registry.py
+"""
+
+import threading
+
+import pytest
+
+import product_recommend_api
+from product_recommend_api import APIRegistry, ProductRecommendationAPI
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """把数据加载替换为记录调用，返回被加载的实例列表"""
+    loaded = []
+
+    def load(api):
+        loaded.append(api)
+        return api
+
+    monkeypatch.setattr(ProductRecommendationAPI, 'load', load)
+    return loaded
+
+
+def test_get_shares_instance_per_key():
+    registry = APIRegistry()
+    api = registry.get()
+    assert registry.get() is api
+    assert registry.get(None, False) is api
+    assert registry.get('other-key') is registry.get('other-key') is not api
+    assert registry.get(mmap=True) is not api
+    assert registry.get('other-key').api_key == 'other-key'
+    assert registry.get(mmap=True).mmap
+    # 创建实例不加载数据
+    assert api._user_analyzer is None
+
+
+def test_concurrent_get_creates_one_instance(monkeypatch):
+    created = []
+    create = ProductRecommendationAPI.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created.append(self)
+        create(self, *args, **kwargs)
+
+    monkeypatch.setattr(ProductRecommendationAPI, '__init__', counting_init)
+    registry = APIRegistry()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(registry.get(mmap=True))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(api is created[0] for api in results)
+
+
+def test_reset_replaces_instances():
+    registry = APIRegistry()
+    api, mmap_api = registry.get(), registry.get(mmap=True)
+    registry.reset()
+    assert registry.get() is not api
+    assert registry.get(mmap=True) is not mmap_api
+
+
+def test_reload_replaces_each_instance(loads):
+    registry = APIRegistry()
+    api, keyed_api = registry.get(), registry.get('other-key', live_associations=True)
+    registry.reload()
+    new_api, new_keyed_api = registry.get(), registry.get('other-key', live_associations=True)
+    assert new_api is not api and new_keyed_api is not keyed_api
+    # 新实例先完整加载再放入注册表，构造参数不变
+    assert sorted(map(id, loads)) == sorted(map(id, (new_api, new_keyed_api)))
+    assert (new_keyed_api.api_key, new_keyed_api.mmap, new_keyed_api.live_associations) == ('other-key', False, True)
+    assert registry.get(mmap=True) not in loads
+
+
+def test_failed_reload_keeps_instance(monkeypatch):
+    def fail(api):
+        raise OSError("模拟加载失败")
+
+    registry = APIRegistry()
+    api = registry.get()
+    monkeypatch.setattr(ProductRecommendationAPI, 'load', fail)
+    with pytest.raises(OSError):
+        registry.reload()
+    assert registry.get() is api
+
+
+def test_put_replaces_instance():
+    registry = APIRegistry()
+    api = ProductRecommendationAPI(mmap=True)
+    registry.put(api, mmap=True)
+    assert registry.get(mmap=True) is api
+    assert registry.get() is not api
+
+
+def test_convenience_functions_use_shared_registry(monkeypatch):
+    registry = APIRegistry()
+    monkeypatch.setattr(product_recommend_api, 'registry', registry)
+    monkeypatch.setattr(ProductRecommendationAPI, 'get_available_options', lambda api: api)
+    assert product_recommend_api.get_available_options() is registry.get()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+商品种类关联增量计数测试：增量计数、从检查点续计与完整计数一致，数据文件被替换后不沿用旧检查点
+
+运行: python -m pytest -q test_association_counters.py
+"""
+
+import os
+
+import pytest
+
+from analyze_user_api import UserPurchaseAnalyzer
+from association_counters import AssociationCounters
+from conftest import DATA_DIR
+from purchase_store import NUMPY_AVAILABLE
+
+
+def _write(path, lines, mode='wb'):
+    with open(path, mode) as f:
+        f.write(b'\n'.join(lines) + b'\n')
+
+
+def _full_count(analyzer):
+    """不使用检查点，对分析器中的全部记录完整计数"""
+    counters = AssociationCounters()
+    counters.add_transactions((record_id, analyzer._product_categories(product_ids))
+                              for record_id, product_ids in analyzer._product_lists())
+    return counters
+
+
+def _assert_same_counts(counters, expected):
+    assert counters.total_transactions == expected.total_transactions
+    assert counters.category_counts == expected.category_counts
+    assert counters.pair_counts == expected.pair_counts
+
+
+def test_duplicate_and_out_of_order_record_ids():
+    counters = AssociationCounters()
+    assert counters.add_transaction(5, ['牛奶', '面包'])
+    assert counters.add_transaction(3, ['牛奶', '咖啡'])
+    assert not counters.add_transaction(5, ['牛奶', '面包'])
+    assert counters.total_transactions == 2
+    assert counters.category_counts == {'牛奶': 2, '面包': 1, '咖啡': 1}
+    assert counters.pair_counts == {('牛奶', '面包'): 1, ('咖啡', '牛奶'): 1}
+
+
+@pytest.mark.parametrize('mode', [{}, {'columnar': True}])
+def test_incremental_and_resumed_counts_match_full_count(mode, sample, tmp_path):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, lines = sample
+    _write(purchase_path, lines[:3001])
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **mode)
+    analyzer.get_association_counters()
+    _write(purchase_path, lines[3001:4001], mode='ab')
+    assert analyzer.ingest_new_rows() == 1000
+    expected = _full_count(analyzer)
+    _assert_same_counts(analyzer.association_counters, expected)
+
+    # 检查点只覆盖前 3000 行，重启后补计追加的 1000 行
+    resumed = UserPurchaseAnalyzer(purchase_path, product_path, **mode).get_association_counters()
+    _assert_same_counts(resumed, expected)
+
+
+def test_checkpoint_not_reused_after_replacement(sample):
+    purchase_path, product_path, lines = sample
+    _write(purchase_path, lines[:4001])
+    UserPurchaseAnalyzer(purchase_path, product_path).get_association_counters()
+    # 替换为更大的文件，其中的记录ID都不大于旧文件的最大记录ID
+    _write(purchase_path, lines[:1] + lines[1:4501:2] + lines[2:4501:2])
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path)
+    counters = analyzer.get_association_counters()
+    expected = _full_count(analyzer)
+    assert expected.total_transactions == 4500
+    _assert_same_counts(counters, expected)
+
+
+def test_counts_match_batch_analysis(sample):
+    pytest.importorskip('pandas')
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(
+        'category_association_analysis', os.path.join(DATA_DIR, 'category_association_analysis.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    purchase_path, product_path, lines = sample
+    _write(purchase_path, lines[:5001])
+    counters = UserPurchaseAnalyzer(purchase_path, product_path).get_association_counters()
+    batch = module.CategoryAssociationAnalyzer(purchase_path, product_path).find_frequent_category_pairs(0.001, 0.03)
+
+    # 批量脚本的 transactions_count 为 int(支持度 × 交易数)，会被截断，只比较推导出的指标
+    def by_pair(pairs):
+        return {tuple(sorted((pair['category_a'], pair['category_b']))): (
+            pair['support'], pair['lift'],
+            tuple(sorted((pair['confidence_a_to_b'], pair['confidence_b_to_a'])))) for pair in pairs}
+
+    assert by_pair(counters.associations(0.001, 0.03)) == by_pair(batch)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+订单金额统计（CatalogFacts）测试：分批合并新订单后，金额区间、分位数和订单数与一次性计算的结果一致；
+各存储模式下 get_price_range() 与原接口按文件顺序求和的结果完全相同
+
+运行: python -m pytest -q test_catalog_facts.py
+"""
+
+import csv
+import random
+
+import pytest
+
+import catalog_facts
+from analyze_user_api import UserPurchaseAnalyzer
+from catalog_facts import CatalogFacts
+from product_catalog import ProductCatalog
+from purchase_store import NUMPY_AVAILABLE, np
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+
+CATALOG = ProductCatalog({1001: '电子产品', 1002: '服装'}, {1001: 99.5, 1002: 45.0})
+
+
+def _amounts(count, rng):
+    """带重复值的随机订单金额"""
+    return [round(rng.choice((rng.uniform(1, 10000), 100.0, 2599.99)), 2) for _ in range(count)]
+
+
+def _expected(amounts):
+    values = np.asarray(amounts, dtype=np.float64)
+    return {
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f"p{q}": round(float(np.percentile(values, q)), 2) for q in catalog_facts.PERCENTILES},
+        'order_count': len(amounts),
+    }
+
+
+def _actual(facts):
+    price_range = facts.price_range()
+    return {
+        'min': price_range['min'],
+        'max': price_range['max'],
+        'percentiles': facts.percentiles(),
+        'order_count': facts.as_dict()['order_count'],
+    }
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_add_orders_matches_full_computation(monkeypatch, use_numpy):
+    monkeypatch.setattr(catalog_facts, 'NUMPY_AVAILABLE', use_numpy)
+    rng = random.Random(0)
+    amounts = _amounts(5000, rng)
+    facts = CatalogFacts(CATALOG, amounts)
+    merged = 0
+    # 小批次停留在缓冲区，大批次触发合并
+    for size in (1, 7, 300, 1, 2000, 50, 0, 900, 3):
+        batch = _amounts(size, rng)
+        facts.add_orders(batch)
+        amounts.extend(batch)
+        merged += not facts.pending
+        assert _actual(facts) == _expected(amounts)
+        assert facts.price_range()['avg'] == pytest.approx(sum(amounts) / len(amounts))
+    assert 0 < merged < 9
+
+
+def test_add_orders_to_empty_catalog():
+    facts = CatalogFacts(CATALOG, [])
+    assert facts.price_range() == {"min": 0, "max": 0, "avg": 0}
+    facts.add_orders([5.0, 1.0, 3.0])
+    assert _actual(facts) == _expected([5.0, 1.0, 3.0])
+
+
+MODES = [
+    pytest.param({}, id='rows'),
+    pytest.param({'columnar': True}, id='columnar'),
+    pytest.param({'mmap': True}, id='mmap'),
+    pytest.param({'sqlite_path': 'purchases.db'}, id='sqlite'),
+    pytest.param({'partitioned': True}, id='partitioned'),
+]
+
+
+def _baseline_price_range(purchase_path):
+    """原接口的计算：按文件顺序读出全部订单金额后求最小值、最大值和平均值"""
+    with open(purchase_path, 'r', encoding='utf-8') as f:
+        amounts = [float(row['购买总金额(元)']) for row in csv.DictReader(f)]
+    return {"min": min(amounts), "max": max(amounts), "avg": sum(amounts) / len(amounts)}
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_price_range_matches_baseline(mode, sample, tmp_path):
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:-2000]) + b'\n')
+    if 'sqlite_path' in mode:
+        mode = {'sqlite_path': str(tmp_path / mode['sqlite_path'])}
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **mode)
+    assert analyzer.get_price_range() == _baseline_price_range(purchase_path)
+    # 增量读取的新订单按文件顺序累加
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(lines[-2000:]) + b'\n')
+    analyzer.ingest_new_rows()
+    assert analyzer.get_price_range() == _baseline_price_range(purchase_path)
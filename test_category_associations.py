@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+商品种类关联分析测试：各共现计算方式（含未安装 scipy 时的回退）找出的频繁种类对与原脚本逐对求交集的结果一致，
+Eclat 挖掘的频繁种类组合与枚举每笔交易全部子集的计数一致
+
+运行: python -m pytest -q test_category_associations.py
+"""
+
+import csv
+import os
+import sys
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from data import category_association_analysis as analysis
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+PURCHASE_PATH = os.path.join(DATA_DIR, 'user_purchase_data.csv')
+PRODUCT_PATH = os.path.join(DATA_DIR, 'product_data.csv')
+
+THRESHOLDS = [
+    pytest.param(0.001, 0.03, id='default'),
+    pytest.param(0.0, 0.0, id='all-pairs'),
+]
+# 样例数据中至少出现在 2 笔交易中的组合最多含 4 个种类
+LOW_SUPPORT = 0.00004
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return analysis.CategoryAssociationAnalyzer(PURCHASE_PATH, PRODUCT_PATH)
+
+
+@pytest.fixture(scope='module')
+def transactions():
+    """用 csv 模块逐行读出每笔交易的商品种类集合（只保留有有效种类的交易）"""
+    with open(PRODUCT_PATH, 'r', encoding='utf-8') as f:
+        category_of = {int(row['商品ID']): row['商品种类'] for row in csv.DictReader(f)}
+    result = []
+    with open(PURCHASE_PATH, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            categories = {category_of[int(product_id)] for product_id in row['商品ID'].split(',')
+                          if int(product_id) in category_of}
+            if categories:
+                result.append(categories)
+    return result
+
+
+def _reference_pairs(transactions, min_support, min_confidence):
+    """原脚本的逐对计算：支持度由两个种类交易集合的交集求出，返回 {(种类A, 种类B): 指标}（A < B）"""
+    total = len(transactions)
+    category_transactions = defaultdict(set)
+    for index, categories in enumerate(transactions):
+        for category in categories:
+            category_transactions[category].add(index)
+    pairs = {}
+    for category_a, category_b in combinations(sorted(category_transactions), 2):
+        support_a = len(category_transactions[category_a]) / total
+        support_b = len(category_transactions[category_b]) / total
+        support_ab = len(category_transactions[category_a] & category_transactions[category_b]) / total
+        confidence_a_to_b = support_ab / support_a
+        confidence_b_to_a = support_ab / support_b
+        if support_ab >= min_support and (confidence_a_to_b >= min_confidence or confidence_b_to_a >= min_confidence):
+            pairs[(category_a, category_b)] = (support_ab, confidence_a_to_b, confidence_b_to_a,
+                                               support_ab / (support_a * support_b), int(support_ab * total))
+    return pairs
+
+
+def _by_pair(pairs):
+    """find_frequent_category_pairs 的结果按 (种类A, 种类B)（A < B）索引"""
+    result = {}
+    for pair in pairs:
+        category_a, category_b = pair['category_a'], pair['category_b']
+        confidence_a_to_b, confidence_b_to_a = pair['confidence_a_to_b'], pair['confidence_b_to_a']
+        if category_a > category_b:
+            category_a, category_b = category_b, category_a
+            confidence_a_to_b, confidence_b_to_a = confidence_b_to_a, confidence_a_to_b
+        result[(category_a, category_b)] = (pair['support'], confidence_a_to_b, confidence_b_to_a,
+                                            pair['lift'], pair['transactions_count'])
+    return result
+
+
+@pytest.mark.parametrize('min_support, min_confidence', THRESHOLDS)
+def test_bitset_engine_matches_reference(analyzer, transactions, monkeypatch, min_support, min_confidence):
+    # 缩小每批的字数，覆盖分批求交
+    monkeypatch.setattr(analysis, 'BITSET_CHUNK_WORDS', 4096)
+    pairs = analyzer.find_frequent_category_pairs(min_support, min_confidence, engine='bitset')
+    assert _by_pair(pairs) == _reference_pairs(transactions, min_support, min_confidence)
+    assert len(_by_pair(pairs)) == len(pairs)
+    supports = [pair['support'] for pair in pairs]
+    assert supports == sorted(supports, reverse=True)
+
+
+@pytest.mark.parametrize('use_scipy', [True, False], ids=['sparse', 'dense'])
+@pytest.mark.parametrize('min_support, min_confidence', THRESHOLDS)
+def test_matrix_engine_matches_reference(analyzer, transactions, monkeypatch, use_scipy, min_support, min_confidence):
+    if use_scipy and not analysis.SCIPY_AVAILABLE:
+        pytest.skip("需要 scipy")
+    monkeypatch.setattr(analysis, 'SCIPY_AVAILABLE', use_scipy)
+    # 缩小每批的组合数，覆盖未安装 scipy 时的分批计数
+    monkeypatch.setattr(analysis, 'BITSET_CHUNK_WORDS', 4096)
+    pairs = analyzer.find_frequent_category_pairs(min_support, min_confidence, engine='matrix')
+    assert _by_pair(pairs) == _reference_pairs(transactions, min_support, min_confidence)
+    assert pairs == analyzer.find_frequent_category_pairs(min_support, min_confidence, engine='bitset')
+
+
+@pytest.mark.parametrize('chunk_words', [analysis.BITSET_CHUNK_WORDS, 64], ids=['one-batch', 'many-batches'])
+def test_matrix_engine_without_scipy_matches_bitset(monkeypatch, chunk_words):
+    # scipy 无法导入时重新导入依赖并创建分析器：默认的共现矩阵方式应自行回退为逐笔交易展开类别对
+    monkeypatch.setitem(sys.modules, 'scipy', None)
+    monkeypatch.setitem(sys.modules, 'scipy.sparse', None)
+    monkeypatch.setattr(analysis, 'pd', None)
+    monkeypatch.setattr(analysis, 'sparse', None)
+    monkeypatch.setattr(analysis, 'SCIPY_AVAILABLE', False)
+    monkeypatch.setattr(analysis, 'BITSET_CHUNK_WORDS', chunk_words)
+    analyzer = analysis.CategoryAssociationAnalyzer(PURCHASE_PATH, PRODUCT_PATH)
+    assert analysis.pd is not None and not analysis.SCIPY_AVAILABLE
+    for min_support, min_confidence in ((0.001, 0.03), (0.0, 0.0), (LOW_SUPPORT, 0.5)):
+        pairs = analyzer.find_frequent_category_pairs(min_support, min_confidence)
+        assert pairs == analyzer.find_frequent_category_pairs(min_support, min_confidence, engine='bitset')
+        assert pairs == analyzer.find_frequent_category_pairs(min_support, min_confidence, engine='matrix')
+
+
+def _reference_itemsets(transactions, min_support, max_length=None):
+    """枚举每笔交易的全部种类子集计数，返回 {按名称排序的种类元组: 交易数}"""
+    counts = Counter()
+    for categories in transactions:
+        categories = sorted(categories)
+        for size in range(1, min(len(categories), max_length or len(categories)) + 1):
+            counts.update(combinations(categories, size))
+    return {itemset: count for itemset, count in counts.items() if count / len(transactions) >= min_support}
+
+
+@pytest.mark.parametrize('min_support, max_length', [
+    pytest.param(0.001, None, id='default'),
+    pytest.param(LOW_SUPPORT, None, id='low-support'),
+    pytest.param(LOW_SUPPORT, 2, id='pairs-only'),
+    pytest.param(LOW_SUPPORT, 3, id='up-to-triples'),
+])
+def test_eclat_matches_subset_enumeration(analyzer, transactions, min_support, max_length):
+    itemsets = analyzer.find_frequent_itemsets(min_support, max_length)
+    expected = _reference_itemsets(transactions, min_support, max_length)
+    assert {itemset['categories']: itemset['transactions_count'] for itemset in itemsets} == expected
+    assert len(itemsets) == len(expected)
+    assert all(itemset['support'] == itemset['transactions_count'] / len(transactions) for itemset in itemsets)
+    assert [itemset['categories'] for itemset in itemsets] == sorted(
+        expected, key=lambda categories: (-expected[categories], len(categories), categories))
+    if max_length is None and min_support == LOW_SUPPORT:
+        assert max(len(categories) for categories in expected) == 4
+
+
+def test_rules_from_itemsets(analyzer, transactions):
+    itemsets = analyzer.find_frequent_itemsets(LOW_SUPPORT)
+    supports = {frozenset(categories): count / len(transactions)
+                for categories, count in _reference_itemsets(transactions, LOW_SUPPORT).items()}
+    rules = analyzer.generate_association_rules(itemsets, min_confidence=0.05)
+    assert rules
+    for rule in rules:
+        antecedent, consequent = frozenset(rule['antecedent']), frozenset(rule['consequent'])
+        support = supports[antecedent | consequent]
+        assert rule['support'] == support
+        assert rule['confidence'] == pytest.approx(support / supports[antecedent])
+        assert rule['confidence'] >= 0.05
+        assert rule['lift'] == pytest.approx(support / (supports[antecedent] * supports[consequent]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+数据集热替换（DatasetReloader）测试：数据文件变化后后台构建新实例，构建期间和替换之后
+旧实例继续正常服务；构建失败或校验未通过时保留当前实例
+
+运行: python -m pytest -q test_dataset_reloader.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from analyze_user_api import UserPurchaseAnalyzer
+from dataset_reloader import DatasetReloader
+
+INITIAL_ROWS = 2000
+APPENDED_ROWS = 300
+PERIOD = ('2025-01-01', '2026-12-31')
+
+
+@pytest.fixture
+def initial(sample):
+    """写出购买数据的前 INITIAL_ROWS 行，返回 (购买数据路径, 商品数据路径, 后续行)"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:INITIAL_ROWS + 1]) + b'\n')
+    return purchase_path, product_path, lines[INITIAL_ROWS + 1:INITIAL_ROWS + 1 + APPENDED_ROWS]
+
+
+def _wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def _snapshot(analyzer):
+    """分析器当前可见的数据：用户列表及每个用户的完整分析结果"""
+    return {user_id: analyzer.analyze_user_habits(user_id, *PERIOD) for user_id in analyzer.get_all_user_ids()}
+
+
+def test_file_change_swaps_in_new_instance(initial):
+    purchase_path, product_path, appended = initial
+    building = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def factory():
+        if builds:
+            # 第二次构建：等待测试确认构建期间旧实例仍在服务
+            building.set()
+            assert release.wait(30)
+        builds.append(1)
+        return UserPurchaseAnalyzer(purchase_path, product_path)
+
+    swapped = []
+    reloader = DatasetReloader(factory, [purchase_path, product_path], interval=0.01, on_swap=swapped.append)
+    old = reloader.current
+    before = _snapshot(old)
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(appended) + b'\n')
+    reloader.start()
+    try:
+        assert building.wait(30)
+        # 构建进行中：请求仍取到旧实例，且结果不变
+        assert reloader.current is old
+        assert _snapshot(reloader.current) == before
+        release.set()
+        _wait_for(lambda: reloader.generation == 2)
+    finally:
+        release.set()
+        reloader.stop()
+
+    new = reloader.current
+    assert new is not old and swapped == [new]
+    assert reloader.last_error is None
+    # 替换前取得引用的请求继续使用旧实例，结果不受新数据影响
+    assert _snapshot(old) == before
+    assert sum(result['total_orders'] for result in _snapshot(new).values()) > sum(
+        result['total_orders'] for result in before.values())
+    assert _snapshot(new) == _snapshot(UserPurchaseAnalyzer(purchase_path, product_path))
+
+
+def test_failed_rebuild_keeps_current_instance(initial):
+    purchase_path, product_path, appended = initial
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) > 1:
+            raise OSError("模拟构建失败")
+        return UserPurchaseAnalyzer(purchase_path, product_path)
+
+    swapped = []
+    reloader = DatasetReloader(factory, [purchase_path], interval=0.01, on_swap=swapped.append)
+    old = reloader.current
+    before = _snapshot(old)
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(appended) + b'\n')
+    reloader.start()
+    try:
+        _wait_for(lambda: reloader.last_error is not None)
+        # 文件没有再次变化，不会反复重建
+        time.sleep(0.1)
+    finally:
+        reloader.stop()
+
+    assert len(attempts) == 2
+    assert reloader.current is old and reloader.generation == 1 and swapped == []
+    assert "模拟构建失败" in reloader.last_error
+    assert _snapshot(reloader.current) == before
+
+
+def test_rejected_instance_keeps_current(initial):
+    purchase_path, product_path, _ = initial
+    reloader = DatasetReloader(lambda: UserPurchaseAnalyzer(purchase_path, product_path), [purchase_path],
+                               validate=lambda analyzer: analyzer is reloader.current)
+    old = reloader.current
+    assert not reloader.reload()
+    assert reloader.current is old and reloader.generation == 1
+    assert reloader.last_error == "新数据校验未通过"
+    reloader.validate = lambda analyzer: analyzer.has_data()
+    assert reloader.reload()
+    assert reloader.current is not old and reloader.generation == 2 and reloader.last_error is None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+增量读取（UserPurchaseAnalyzer.ingest_new_rows）测试：各存储模式追加新行后的结果与完整加载一致，
+格式错误的行被记录并跳过，不影响同一批中的其他行
+
+运行: python -m pytest -q test_ingest.py
+"""
+
+import pytest
+
+from analyze_user_api import UserPurchaseAnalyzer
+from purchase_store import NUMPY_AVAILABLE
+
+INITIAL_ROWS = 3000
+APPENDED_ROWS = 500
+
+MODES = [
+    pytest.param({}, id='rows'),
+    pytest.param({'columnar': True}, id='columnar'),
+    pytest.param({'snapshot': True}, id='snapshot'),
+    pytest.param({'mmap': True}, id='mmap'),
+    pytest.param({'sqlite_path': 'purchases.db'}, id='sqlite'),
+    pytest.param({'partitioned': True}, id='partitioned'),
+]
+
+
+@pytest.fixture
+def initial(sample):
+    """写出购买数据的前 INITIAL_ROWS 行，返回 (购买数据路径, 商品数据路径, 后续行)"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:INITIAL_ROWS + 1]) + b'\n')
+    return purchase_path, product_path, lines[INITIAL_ROWS + 1:INITIAL_ROWS + 1 + APPENDED_ROWS]
+
+
+def _options(mode, tmp_path):
+    """把相对的 sqlite_path 放到临时目录下"""
+    if 'sqlite_path' in mode:
+        return {'sqlite_path': str(tmp_path / mode['sqlite_path'])}
+    return dict(mode)
+
+
+def _assert_same_results(analyzer, purchase_path, product_path):
+    """逐用户比较增量读取后的分析结果与重新完整加载的结果"""
+    reference = UserPurchaseAnalyzer(purchase_path, product_path)
+    for user_id in reference.get_all_user_ids():
+        assert (analyzer.analyze_user_habits(user_id, '2025-01-01', '2026-12-31')
+                == reference.analyze_user_habits(user_id, '2025-01-01', '2026-12-31'))
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_ingest_matches_full_load(mode, initial, tmp_path):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, appended = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **_options(mode, tmp_path))
+    # 分两次追加，第一次末尾留半行
+    half = b'\n'.join(appended) + b'\n'
+    with open(purchase_path, 'ab') as f:
+        f.write(half[:len(half) // 2])
+    first = analyzer.ingest_new_rows()
+    with open(purchase_path, 'ab') as f:
+        f.write(half[len(half) // 2:])
+    assert first + analyzer.ingest_new_rows() == APPENDED_ROWS
+    assert analyzer.ingest_new_rows() == 0
+    _assert_same_results(analyzer, purchase_path, product_path)
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_ingest_skips_malformed_rows(mode, initial, tmp_path):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, appended = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **_options(mode, tmp_path))
+    rows = list(appended[:5])
+    fields = rows[2].split(b',')
+    fields[-3] = b'abc'
+    rows[2] = b','.join(fields)
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(rows) + b'\n')
+
+    assert analyzer.ingest_new_rows() == 4
+    assert [line_number for line_number, _ in analyzer.malformed_rows] == [INITIAL_ROWS + 4]
+    # 读取位置已越过这一批，重试不会重复计入
+    assert analyzer.ingest_new_rows() == 0
+    _assert_same_results(analyzer, purchase_path, product_path)
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_ingest_after_malformed_record_id_at_load(mode, initial, tmp_path):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, appended = initial
+    with open(purchase_path, 'rb') as f:
+        lines = f.read().splitlines()
+    fields = lines[10].split(b',')
+    fields[0] = b'x99'
+    lines[10] = b','.join(fields)
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines) + b'\n')
+
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **_options(mode, tmp_path))
+    assert analyzer.has_data()
+    assert [line_number for line_number, _ in analyzer.malformed_rows] == [11]
+    assert analyzer.last_record_id == max(int(line.split(b',')[0]) for line in lines[1:] if line != lines[10])
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(appended) + b'\n')
+    assert analyzer.ingest_new_rows() == APPENDED_ROWS
+    _assert_same_results(analyzer, purchase_path, product_path)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+进程池分片分析（analyze_users(workers=...)）测试：结果与逐个用户串行分析完全一致且顺序相同；
+多个线程同时发起并行分析时互不干扰；非 fork 启动方式下子进程自行打开数据
+
+运行: python -m pytest -q test_parallel_analysis.py
+"""
+
+import multiprocessing
+import threading
+
+import pytest
+
+import analyze_user_api
+from analyze_user_api import UserPurchaseAnalyzer
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="需要 fork")
+
+SAMPLE_ROWS = 3000
+PERIOD = ('2025-01-01', '2026-12-31')
+
+MODES = [
+    pytest.param({}, id='rows'),
+    pytest.param({'columnar': True}, id='columnar'),
+]
+
+
+@pytest.fixture
+def paths(sample):
+    """写出购买数据的前 SAMPLE_ROWS 行，返回 (购买数据路径, 商品数据路径)"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:SAMPLE_ROWS + 1]) + b'\n')
+    return purchase_path, product_path
+
+
+def _serial(analyzer, user_ids):
+    return [analyzer.analyze_user_habits(user_id, *PERIOD) for user_id in user_ids]
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_workers_match_serial(mode, paths, monkeypatch):
+    if mode and not analyze_user_api.NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    analyzer = UserPurchaseAnalyzer(*paths, cache_size=0, **mode)
+
+    # fork 时分析器随进程池的 initializer 参数被子进程继承，不应被序列化
+    def no_pickle(self, protocol):
+        raise AssertionError("分析器不应被序列化")
+
+    monkeypatch.setattr(UserPurchaseAnalyzer, '__reduce_ex__', no_pickle)
+    user_ids = analyzer.get_all_user_ids()
+    results = list(analyzer.analyze_users(user_ids, *PERIOD, workers=4))
+    assert results == _serial(analyzer, user_ids)
+    assert analyze_user_api._shard_analyzer is None
+
+
+def test_concurrent_parallel_calls(sample, tmp_path):
+    """两个线程同时对不同数据的分析器发起并行分析，各自得到自己数据的结果"""
+    purchase_path, product_path, lines = sample
+    analyzers = []
+    for name, rows in (('first.csv', 1500), ('second.csv', 3000)):
+        path = str(tmp_path / name)
+        with open(path, 'wb') as f:
+            f.write(b'\n'.join(lines[:1] + lines[rows - 1000:rows]) + b'\n')
+        analyzers.append(UserPurchaseAnalyzer(path, product_path, cache_size=0))
+    user_ids = sorted(set(analyzers[0].get_all_user_ids()) | set(analyzers[1].get_all_user_ids()))
+    results = [None, None]
+
+    def run(index):
+        results[index] = list(analyzers[index].analyze_users(user_ids, *PERIOD, workers=2))
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results[0] == _serial(analyzers[0], user_ids)
+    assert results[1] == _serial(analyzers[1], user_ids)
+    assert results[0] != results[1]
+
+
+def test_without_fork_workers_open_data(paths, monkeypatch):
+    analyzer = UserPurchaseAnalyzer(*paths, cache_size=0)
+    user_ids = analyzer.get_all_user_ids()
+    # 按不支持 fork 的平台处理：子进程由 _init_shard_worker 打开同一份数据
+    monkeypatch.setattr(multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+    assert list(analyzer.analyze_users(user_ids, *PERIOD, workers=2)) == _serial(analyzer, user_ids)
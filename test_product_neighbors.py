@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+商品级关联测试：mine_product_neighbors 分批统计的前 N 个相关商品与逐笔交易两两计数后排序的结果一致
+
+运行: python -m pytest -q test_product_neighbors.py
+"""
+
+import csv
+import os
+from collections import Counter, defaultdict
+
+import pytest
+
+import product_neighbors
+from product_neighbors import ProductNeighbors, mine_product_neighbors
+from purchase_store import NUMPY_AVAILABLE, np
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+
+PURCHASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'user_purchase_data.csv')
+
+
+@pytest.fixture(scope='module')
+def product_lists():
+    """用 csv 模块逐行读出每笔交易的商品ID列表"""
+    with open(PURCHASE_PATH, 'r', encoding='utf-8') as f:
+        return [[int(product_id) for product_id in row['商品ID'].split(',')] for row in csv.DictReader(f)]
+
+
+def _csr(product_lists):
+    offsets = np.zeros(len(product_lists) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in product_lists], out=offsets[1:])
+    values = np.array([product_id for ids in product_lists for product_id in ids], dtype=np.int64)
+    return offsets, values
+
+
+def _reference(product_lists, top_n, metric, min_count):
+    """逐笔交易两两计数，返回 {商品ID: [(相关商品ID, 共现次数, 置信度, 提升度), ...]}"""
+    baskets = [set(ids) for ids in product_lists if ids]
+    transactions = len(baskets)
+    product_counts = Counter(product_id for basket in baskets for product_id in basket)
+    pair_counts = Counter((a, b) for basket in baskets for a in basket for b in basket if a != b)
+    ranked = defaultdict(list)
+    for (a, b), count in pair_counts.items():
+        if count < min_count:
+            continue
+        confidence = count / product_counts[a]
+        lift = confidence * transactions / product_counts[b]
+        score = lift if metric == 'lift' else confidence
+        ranked[a].append((-score, -count, b, confidence, lift))
+    return {a: [(b, -negative_count, confidence, lift)
+                for _, negative_count, b, confidence, lift in sorted(items)[:top_n]]
+            for a, items in ranked.items()}
+
+
+def _as_dict(neighbors):
+    return {product_id: [(item['product_id'], item['count'], item['confidence'], item['lift'])
+                         for item in neighbors.neighbors(product_id)]
+            for product_id in neighbors.product_ids.tolist()}
+
+
+@pytest.mark.parametrize('metric', product_neighbors.METRICS)
+@pytest.mark.parametrize('batch_size', [product_neighbors.PAIR_BATCH_SIZE, 5000], ids=['one-batch', 'many-batches'])
+def test_sample_matches_pair_counting(product_lists, monkeypatch, metric, batch_size):
+    monkeypatch.setattr(product_neighbors, 'PAIR_BATCH_SIZE', batch_size)
+    neighbors = mine_product_neighbors(*_csr(product_lists), top_n=5, metric=metric, min_count=2)
+    assert neighbors.transactions == len(product_lists)
+    assert _as_dict(neighbors) == _reference(product_lists, 5, metric, 2)
+
+
+def test_duplicates_and_empty_transactions():
+    product_lists = [[3, 1, 3], [], [1, 3, 2], [2, 2], [1, 2, 3, 4], [], [4, 1]]
+    neighbors = mine_product_neighbors(*_csr(product_lists), top_n=2, metric='confidence', min_count=1)
+    assert neighbors.transactions == 5
+    assert _as_dict(neighbors) == _reference(product_lists, 2, 'confidence', 1)
+    assert neighbors.neighbors(99) == []
+    assert len(neighbors.neighbors(1, limit=1)) == 1
+
+
+def test_save_and_load(product_lists, tmp_path):
+    neighbors = mine_product_neighbors(*_csr(product_lists[:2000]), top_n=3)
+    path = str(tmp_path / product_neighbors.NEIGHBORS_FILE_NAME)
+    neighbors.save(path)
+    loaded = ProductNeighbors.load(path)
+    assert (loaded.metric, loaded.transactions) == (neighbors.metric, neighbors.transactions)
+    assert _as_dict(loaded) == _as_dict(neighbors)
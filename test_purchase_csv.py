@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+购买数据CSV解析测试：read_purchase_records / read_purchase_columns 的结果与 csv.DictReader 加 strptime 一致，
+覆盖 \\r\\n 与 \\n 行尾、带引号的商品ID、跨块拆分和格式错误的行
+
+运行: python -m pytest -q test_purchase_csv.py
+"""
+
+import csv
+import os
+from datetime import datetime
+
+import pytest
+
+import purchase_csv
+from purchase_csv import HEADER_LINE, read_purchase_columns, read_purchase_records
+from purchase_store import NUMPY_AVAILABLE, PurchaseStore
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'user_purchase_data.csv')
+SAMPLE_ROWS = 400
+
+# 插入样本中的特殊行：(行内容, 是否格式错误)
+SPECIAL_LINES = [
+    ('90001,7,1,"1001",12.5,2025-01-02 03:04:05,否', False),
+    ('90002,7,1,1001,12.5,2025-1-2 3:04:05,是', False),  # 未补零的时间交给 strptime
+    ('90003,abc,1,1001,12.5,2025-01-02 03:04:05,否', True),
+    ('90004,7,1,",",12.5,2025-01-02 03:04:05,否', True),
+    ('90005,7,1,"1001,""1002""",12.5,2025-01-02 03:04:05,否', True),
+    ('90006,7,1,1001,12.5,2025-01-02 03:04:05', True),
+    ('90007,7,1,1001,1e2,2025-01-02 03:04:05,否', False),
+    ('x99,7,1,1001,12.5,2025-01-02 03:04:05,否', True),
+    (',7,1,1001,12.5,2025-01-02 03:04:05,否', True),
+    (' 90010,7,1,1001,12.5,2025-01-02 03:04:05,否', False),  # int 允许首尾空白
+]
+
+
+def _reference(path):
+    """DictReader 加 strptime 逐行转换，返回 (记录列表, 格式错误的行号)"""
+    records, malformed = [], []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                if None in row or None in row.values() or not purchase_csv._valid_product_ids(row['商品ID']):
+                    raise ValueError(row)
+                int(row['记录ID'])
+                row['用户ID'] = int(row['用户ID'])
+                row['购买商品数量'] = int(row['购买商品数量'])
+                row['购买总金额(元)'] = float(row['购买总金额(元)'])
+                row['购买时间'] = datetime.strptime(row['购买时间'], '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                malformed.append(reader.line_num)
+                continue
+            records.append(row)
+    return records, malformed
+
+
+def _sample_with_special_lines(tmp_path, newline='\n'):
+    lines = _sample_lines()
+    for offset, (line, _) in enumerate(SPECIAL_LINES):
+        lines.insert(50 * offset + 25, line)
+    return _write(tmp_path / 'purchases.csv', lines, newline)
+
+
+def _sample_lines():
+    with open(DATA_PATH, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()[1:SAMPLE_ROWS + 1]
+
+
+def _write(path, lines, newline):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(newline.join([HEADER_LINE, *lines]) + newline)
+    return str(path)
+
+
+def test_sample_file_matches_dictreader():
+    expected, malformed = _reference(DATA_PATH)
+    assert not malformed
+    assert read_purchase_records(DATA_PATH) == expected
+
+    columns, line_numbers = read_purchase_columns(DATA_PATH)
+    with open(DATA_PATH, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert columns == {name: [row[name] for row in rows] for name in purchase_csv.PURCHASE_FIELDS}
+    assert line_numbers == list(range(2, len(rows) + 2))
+
+
+@pytest.mark.parametrize('newline', ['\r\n', '\n'], ids=['crlf', 'lf'])
+@pytest.mark.parametrize('block_size', [purchase_csv.BLOCK_SIZE, 1000], ids=['one-block', 'many-blocks'])
+def test_special_lines_match_dictreader(tmp_path, monkeypatch, newline, block_size):
+    monkeypatch.setattr(purchase_csv, 'BLOCK_SIZE', block_size)
+    path = _sample_with_special_lines(tmp_path, newline)
+
+    expected, expected_malformed = _reference(path)
+    assert len(expected_malformed) == sum(bad for _, bad in SPECIAL_LINES)
+    malformed = []
+    assert read_purchase_records(path, malformed) == expected
+    assert sorted(line_number for line_number, _ in malformed) == expected_malformed
+
+
+@pytest.mark.parametrize('lines', [
+    pytest.param(['1,2,3,4,5.0,2025-01-02 03:04:05,否', '', '2,2,3,4,5.0,2025-01-02 03:04:05,否'], id='blank-line'),
+    pytest.param(['1,2,3,"4\n5",5.0,2025-01-02 03:04:05,否'], id='newline-in-quotes'),
+    pytest.param(['1,2,3,4\r,5.0,2025-01-02 03:04:05,否'], id='stray-cr'),
+    pytest.param(['1,2,3,4,5.0,2025-01-02 03:04:05,\x00'], id='placeholder'),
+    pytest.param([], id='empty'),
+])
+def test_irregular_files_fall_back_to_rows(tmp_path, lines):
+    path = _write(tmp_path / 'purchases.csv', lines, '\n')
+    expected, expected_malformed = _reference(path)
+    malformed = []
+    assert read_purchase_records(path, malformed) == expected
+    assert sorted(line_number for line_number, _ in malformed) == expected_malformed
+
+
+def test_reordered_header(tmp_path):
+    fields = list(reversed(purchase_csv.PURCHASE_FIELDS))
+    path = tmp_path / 'purchases.csv'
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerow(['否', '2025-01-02 03:04:05', '5.0', '4,5', '3', '2', '1'])
+    expected, _ = _reference(path)
+    assert read_purchase_records(str(path)) == expected
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+def test_row_and_columnar_skip_same_lines(tmp_path):
+    path = _sample_with_special_lines(tmp_path)
+    row_malformed, columnar_malformed = [], []
+    records = read_purchase_records(path, row_malformed)
+    store = PurchaseStore.from_csv(path, columnar_malformed)
+    assert len(store) == len(records)
+    assert (sorted(line_number for line_number, _ in row_malformed)
+            == [line_number for line_number, _ in columnar_malformed])
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+按月分区存储测试：分区查询结果与逐行分析一致；源CSV追加数据时续读，被替换时重建
+
+运行: python -m pytest -q test_purchase_partitions.py
+"""
+
+import pytest
+
+from analyze_user_api import UserPurchaseAnalyzer
+from purchase_store import NUMPY_AVAILABLE
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+
+def _write(path, lines):
+    with open(path, 'wb') as f:
+        f.write(b'\n'.join(lines) + b'\n')
+
+
+def _assert_matches_rows(purchase_path, product_path):
+    """重新打开分区存储，逐用户与逐行分析比较"""
+    partitioned = UserPurchaseAnalyzer(purchase_path, product_path, partitioned=True)
+    reference = UserPurchaseAnalyzer(purchase_path, product_path)
+    assert partitioned.partitions.manifest['rows'] == len(reference.purchase_data)
+    assert partitioned.get_all_user_ids() == reference.get_all_user_ids()
+    for user_id in reference.get_all_user_ids():
+        for start_date, end_date in (('2025-01-01', '2026-12-31'), ('2025-12-01', '2025-12-15')):
+            assert (partitioned.analyze_user_habits(user_id, start_date, end_date)
+                    == reference.analyze_user_habits(user_id, start_date, end_date))
+
+
+def test_reopen_after_append(sample):
+    purchase_path, product_path, lines = sample
+    _write(purchase_path, lines[:3001])
+    UserPurchaseAnalyzer(purchase_path, product_path, partitioned=True)
+    _write(purchase_path, lines[:4001])
+    _assert_matches_rows(purchase_path, product_path)
+
+
+def test_rebuild_after_replacement(sample):
+    purchase_path, product_path, lines = sample
+    _write(purchase_path, lines[:3001])
+    UserPurchaseAnalyzer(purchase_path, product_path, partitioned=True)
+    # 替换为内容不同且更大的文件：不能当作追加续读
+    _write(purchase_path, lines[:1] + lines[10001:14001])
+    _assert_matches_rows(purchase_path, product_path)
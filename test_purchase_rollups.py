@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+按天预聚合（summarize_range）测试：对同一用户和日期区间，结果与 analyze_user_habits 的对应字段完全一致
+
+运行: python -m pytest -q test_purchase_rollups.py
+"""
+
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analyze_user_api import UserPurchaseAnalyzer
+from conftest import DATA_DIR
+from purchase_store import NUMPY_AVAILABLE
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+
+SUMMARY_FIELDS = ('total_orders', 'total_amount', 'avg_order_amount', 'category_avg_spending')
+
+
+@pytest.fixture(scope='module')
+def analyzers():
+    """(逐行分析器, 列式分析器)"""
+    purchase_path = os.path.join(DATA_DIR, 'user_purchase_data.csv')
+    product_path = os.path.join(DATA_DIR, 'product_data.csv')
+    return (UserPurchaseAnalyzer(purchase_path, product_path),
+            UserPurchaseAnalyzer(purchase_path, product_path, columnar=True))
+
+
+def _ranges(count, seed=0):
+    """覆盖样例数据时间范围内外的随机日期区间"""
+    rng = random.Random(seed)
+    first = date(2025, 6, 25)
+    for _ in range(count):
+        start = first + timedelta(days=rng.randint(0, 220))
+        yield start.isoformat(), (start + timedelta(days=rng.randint(0, 120))).isoformat()
+
+
+def test_summarize_range_matches_analyze_user_habits(analyzers):
+    rows, columnar = analyzers
+    for user_id in rows.get_all_user_ids():
+        for start_date, end_date in _ranges(10, seed=user_id):
+            expected = rows.analyze_user_habits(user_id, start_date, end_date)
+            summary = columnar.summarize_range(user_id, start_date, end_date)
+            if 'message' in expected:
+                assert summary['total_orders'] == 0
+                continue
+            assert {key: summary[key] for key in SUMMARY_FIELDS} == {key: expected[key] for key in SUMMARY_FIELDS}, \
+                (user_id, start_date, end_date)
+
+
+def test_summarize_range_after_ingest(tmp_path):
+    """汇总之后追加的订单由原始记录补上，结果仍与完整加载一致"""
+    with open(os.path.join(DATA_DIR, 'user_purchase_data.csv'), 'rb') as f:
+        lines = f.read().splitlines()
+    purchase_path = str(tmp_path / 'user_purchase_data.csv')
+    product_path = os.path.join(DATA_DIR, 'product_data.csv')
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:5001]) + b'\n')
+    columnar = UserPurchaseAnalyzer(purchase_path, product_path, columnar=True)
+    columnar.summarize_range(1)
+    with open(purchase_path, 'ab') as f:
+        f.write(b'\n'.join(lines[5001:6001]) + b'\n')
+    assert columnar.ingest_new_rows() == 1000
+
+    rows = UserPurchaseAnalyzer(purchase_path, product_path)
+    for user_id in rows.get_all_user_ids():
+        for start_date, end_date in _ranges(5, seed=user_id):
+            expected = rows.analyze_user_habits(user_id, start_date, end_date)
+            summary = columnar.summarize_range(user_id, start_date, end_date)
+            if 'message' in expected:
+                assert summary['total_orders'] == 0
+                continue
+            assert {key: summary[key] for key in SUMMARY_FIELDS} == {key: expected[key] for key in SUMMARY_FIELDS}, \
+                (user_id, start_date, end_date)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+请求上下文（RequestContext）测试：一次推荐请求中用户画像 / 预算参考值只分析一次，
+各阶段耗时按执行顺序记录在 context.timings 中
+
+运行: python -m pytest -q test_request_context.py
+"""
+
+import json
+
+import pytest
+
+from product_recommend_api import ProductRecommendationAPI
+
+SAMPLE_ROWS = 2000
+AI_CONTENT = json.dumps({
+    "analysis": "分析",
+    "recommendations": [{"category": "图书", "products": ["小说"], "price_range": "50-100", "reason": "理由"}],
+    "buying_tips": ["建议"],
+    "budget_advice": "预算建议",
+    "summary": "总结",
+}, ensure_ascii=False)
+
+
+@pytest.fixture
+def api(sample, tmp_path, monkeypatch):
+    """使用临时目录中样例数据的推荐接口，大模型调用替换为固定回复"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:SAMPLE_ROWS + 1]) + b'\n')
+    api = ProductRecommendationAPI(api_key='test-key')
+    api.data_dir = str(tmp_path)
+    api.purchase_data_path, api.product_data_path = purchase_path, product_path
+    monkeypatch.setattr(api, '_call_qwen_api', lambda prompt: {"success": True, "content": AI_CONTENT, "usage": {}})
+    return api
+
+
+@pytest.fixture
+def analyze_calls(api, monkeypatch):
+    """统计分析器的实际分析次数（_analyze，不经过结果缓存），返回每次调用的 fields"""
+    analyzer = api.user_analyzer
+    calls = []
+    analyze = analyzer._analyze
+
+    def counting(user_id, start_date, end_date, fields=None):
+        calls.append(fields)
+        return analyze(user_id, start_date, end_date, fields)
+
+    monkeypatch.setattr(analyzer, '_analyze', counting)
+    return calls
+
+
+def test_recommendation_analyzes_once(api, analyze_calls):
+    user_id = api.user_analyzer.get_all_user_ids()[0]
+    context = api.request_context(user_id)
+    result = api.get_product_recommendations(user_id, requirement="想买几本书", context=context)
+
+    assert result["success"]
+    assert len(analyze_calls) == 1
+    expected = api.user_analyzer.analyze_user_habits(user_id, fields={'avg_order_amount'})['avg_order_amount']
+    assert result["input"]["budget_reference"] == expected
+    assert list(context.timings) == ["validate", "budget_reference", "prompt", "llm", "parse"]
+    assert all(duration >= 0 for duration in context.timings.values())
+    assert context.server_timing() == ", ".join(f"{name};dur={duration}"
+                                                for name, duration in context.timings.items())
+
+
+def test_given_budget_skips_analysis(api, analyze_calls):
+    user_id = api.user_analyzer.get_all_user_ids()[0]
+    context = api.request_context(user_id)
+    assert api.get_product_recommendations(user_id, budget=200.0, requirement="想买几本书", context=context)["success"]
+    assert analyze_calls == []
+    assert list(context.timings) == ["validate", "prompt", "llm", "parse"]
+
+
+def test_suggestions_and_recommendation_share_profile(api, analyze_calls):
+    user_id = api.user_analyzer.get_all_user_ids()[0]
+    context = api.request_context(user_id)
+    suggestions = api.get_smart_suggestions(user_id, context=context)
+    result = api.get_product_recommendations(user_id, requirement="想买几本书", context=context)
+
+    assert suggestions["success"] and result["success"]
+    # 预算参考值直接取自已分析的完整画像
+    assert analyze_calls == [None]
+    assert result["input"]["budget_reference"] == context.profile()["avg_order_amount"]
+    assert list(context.timings)[:2] == ["profile", "suggestions"]
+    assert "budget_reference" in context.timings
+
+
+def test_invalid_input_stops_after_validation(api, analyze_calls):
+    context = api.request_context(1)
+    result = api.get_product_recommendations(1, requirement="", context=context)
+    assert not result["success"]
+    assert analyze_calls == []
+    assert list(context.timings) == ["validate"]
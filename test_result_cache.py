@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+分析结果缓存测试：重复调用命中缓存；超出容量淘汰最久未使用的条目；过期条目重新计算；
+load_data() 后数据版本递增、旧结果失效；ingest_new_rows() 只使有新订单的用户的结果失效
+
+运行: python -m pytest -q test_result_cache.py
+"""
+
+import pytest
+
+import result_cache
+from analyze_user_api import UserPurchaseAnalyzer
+from purchase_store import NUMPY_AVAILABLE
+from result_cache import LRUCache
+
+SAMPLE_ROWS = 2000
+PERIOD = ('2025-01-01', '2026-12-31')
+
+MODES = [
+    pytest.param({}, id='rows'),
+    pytest.param({'columnar': True}, id='columnar'),
+]
+
+
+class FakeClock:
+    """代替 time.monotonic，由测试推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def initial(sample):
+    """写出购买数据的前 SAMPLE_ROWS 行，返回 (购买数据路径, 商品数据路径, 后续行)"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:SAMPLE_ROWS + 1]) + b'\n')
+    return purchase_path, product_path, lines[SAMPLE_ROWS + 1:]
+
+
+def _count_analyze(analyzer, monkeypatch):
+    """统计 _analyze（未命中缓存时的实际计算）的调用，返回按用户ID记录的调用列表"""
+    calls = []
+    analyze = analyzer._analyze
+
+    def counting(user_id, *args, **kwargs):
+        calls.append(user_id)
+        return analyze(user_id, *args, **kwargs)
+
+    monkeypatch.setattr(analyzer, '_analyze', counting)
+    return calls
+
+
+def test_lru_order_and_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a 变为最近使用
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert (stats['size'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_ttl_expiry(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    cache = LRUCache(ttl=10)
+    cache.put('a', 1)
+    clock.now += 10
+    assert cache.get('a') == 1
+    clock.now += 0.5
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_repeated_call_hits_cache(mode, initial, monkeypatch):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, _ = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **mode)
+    calls = _count_analyze(analyzer, monkeypatch)
+    user_id = analyzer.get_all_user_ids()[0]
+
+    first = analyzer.analyze_user_habits(user_id, *PERIOD)
+    first['extra'] = True  # 修改返回的字典不影响缓存
+    second = analyzer.analyze_user_habits(user_id, *PERIOD)
+    assert calls == [user_id]
+    assert 'extra' not in second
+    uncached = UserPurchaseAnalyzer(purchase_path, product_path, cache_size=0, **mode)
+    assert second == uncached.analyze_user_habits(user_id, *PERIOD)
+    # 不同字段组合分别缓存
+    analyzer.analyze_user_habits(user_id, *PERIOD, fields={'total_orders'})
+    assert len(calls) == 2
+    stats = analyzer.cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+
+
+def test_eviction_at_cache_size(initial, monkeypatch):
+    purchase_path, product_path, _ = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, cache_size=2)
+    calls = _count_analyze(analyzer, monkeypatch)
+    first, second, third = analyzer.get_all_user_ids()[:3]
+
+    for user_id in (first, second, first, third):
+        analyzer.analyze_user_habits(user_id, *PERIOD)
+    assert calls == [first, second, third]
+    assert analyzer.cache_stats()['evictions'] == 1
+    # second 最久未使用，已被淘汰；first 仍在缓存中
+    analyzer.analyze_user_habits(first, *PERIOD)
+    analyzer.analyze_user_habits(second, *PERIOD)
+    assert calls == [first, second, third, second]
+
+
+def test_ttl_expiry_recomputes(initial, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    purchase_path, product_path, _ = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, cache_ttl=60)
+    calls = _count_analyze(analyzer, monkeypatch)
+    user_id = analyzer.get_all_user_ids()[0]
+
+    analyzer.analyze_user_habits(user_id, *PERIOD)
+    clock.now += 30
+    analyzer.analyze_user_habits(user_id, *PERIOD)
+    assert len(calls) == 1
+    clock.now += 61
+    analyzer.analyze_user_habits(user_id, *PERIOD)
+    assert len(calls) == 2
+    assert analyzer.cache_stats()['expirations'] == 1
+
+
+def test_load_data_invalidates_results(initial, monkeypatch):
+    purchase_path, product_path, _ = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path)
+    calls = _count_analyze(analyzer, monkeypatch)
+    user_id = analyzer.get_all_user_ids()[0]
+
+    analyzer.analyze_user_habits(user_id, *PERIOD)
+    version = analyzer.data_version
+    analyzer.load_data()
+    assert analyzer.data_version == version + 1
+    analyzer.analyze_user_habits(user_id, *PERIOD)
+    assert len(calls) == 2
+    assert analyzer.cache_stats()['hits'] == 0
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_ingest_invalidates_only_affected_users(mode, initial, monkeypatch):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, later = initial
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **mode)
+    calls = _count_analyze(analyzer, monkeypatch)
+    user_ids = analyzer.get_all_user_ids()
+    # 追加一笔已有用户的未退款订单，该用户之外的结果应继续命中缓存
+    appended = next(line for line in later
+                    if int(line.split(b',')[1]) in user_ids and line.endswith('否'.encode()))
+    changed = int(appended.split(b',')[1])
+    unchanged = next(user_id for user_id in user_ids if user_id != changed)
+
+    before = {user_id: analyzer.analyze_user_habits(user_id, *PERIOD) for user_id in (changed, unchanged)}
+    version = analyzer.data_version
+    with open(purchase_path, 'ab') as f:
+        f.write(appended + b'\n')
+    assert analyzer.ingest_new_rows() == 1
+    # 增量读取不递增数据版本，只删除受影响用户的条目
+    assert analyzer.data_version == version
+    del calls[:]
+
+    assert analyzer.analyze_user_habits(unchanged, *PERIOD) == before[unchanged]
+    after = analyzer.analyze_user_habits(changed, *PERIOD)
+    assert calls == [changed]
+    assert after['total_orders'] == before[changed]['total_orders'] + 1
+    assert after == UserPurchaseAnalyzer(purchase_path, product_path, cache_size=0, **mode).analyze_user_habits(
+        changed, *PERIOD)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+字段投影（analyze_user_habits 的 fields 参数）测试：各存储模式下，只计算部分字段的结果
+与完整结果中的相同字段完全一致（包括只需订单数和金额的快速路径与无有效订单的情况）
+
+运行: python -m pytest -q test_result_fields.py
+"""
+
+from itertools import combinations
+
+import pytest
+
+from analyze_user_api import CATEGORY_FIELDS, RESULT_FIELDS, TOTAL_FIELDS, UserPurchaseAnalyzer
+from purchase_store import NUMPY_AVAILABLE
+
+SAMPLE_ROWS = 3000
+PERIODS = [('2025-01-01', '2026-12-31'), ('2025-11-01', '2026-1-31'), ('2025-08-04', '2025-08-04')]
+
+MODES = [
+    pytest.param({}, id='rows'),
+    pytest.param({'columnar': True}, id='columnar'),
+    pytest.param({'sqlite_path': 'purchases.db'}, id='sqlite'),
+    pytest.param({'partitioned': True}, id='partitioned'),
+]
+
+# 订单数/金额字段的全部非空组合（快速路径），以及需要展开订单明细的字段组合
+FIELD_SETS = ([frozenset(fields) for size in range(1, len(TOTAL_FIELDS) + 1)
+               for fields in combinations(sorted(TOTAL_FIELDS), size)]
+              + [frozenset({'frequent_products'}), CATEGORY_FIELDS, frozenset({'purchase_timeline'}),
+                 frozenset({'avg_order_amount', 'frequent_categories'}), RESULT_FIELDS])
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_projection_matches_full_result(mode, sample, tmp_path):
+    if mode and not NUMPY_AVAILABLE:
+        pytest.skip("需要 NumPy")
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:SAMPLE_ROWS + 1]) + b'\n')
+    if 'sqlite_path' in mode:
+        mode = {'sqlite_path': str(tmp_path / mode['sqlite_path'])}
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path, cache_size=0, **mode)
+
+    for start_date, end_date in PERIODS:
+        for user_id in analyzer.get_all_user_ids():
+            full = analyzer.analyze_user_habits(user_id, start_date, end_date)
+            for fields in FIELD_SETS:
+                expected = {key: value for key, value in full.items()
+                            if key in fields or key in ('user_id', 'period', 'message')}
+                assert analyzer.analyze_user_habits(user_id, start_date, end_date, fields=fields) == expected
+
+
+def test_unknown_field_rejected(sample):
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:101]) + b'\n')
+    analyzer = UserPurchaseAnalyzer(purchase_path, product_path)
+    with pytest.raises(ValueError):
+        analyzer.analyze_user_habits(analyzer.get_all_user_ids()[0], fields={'total_orders', 'unknown'})
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+启动开销测试：导入推荐接口模块不加载数据、不导入 NumPy / pandas / requests，导入耗时在预算内；
+Web 应用创建后在后台线程中预加载数据
+
+运行: python -m pytest -q test_startup.py
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 导入耗时预算（微秒，-X importtime 的累计值）
+IMPORT_BUDGET_US = 100_000
+HEAVY_MODULES = ('numpy', 'pandas', 'requests', 'scipy')
+
+
+def _import_times(module):
+    """在新进程中导入模块，返回 {模块名: 累计导入耗时（微秒）}"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)', line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+@pytest.mark.parametrize('module', ['product_recommend_api', 'data.category_association_analysis'])
+def test_import_skips_heavy_modules(module):
+    times = _import_times(module)
+    assert module in times
+    assert not [name for name in HEAVY_MODULES if name in times]
+
+
+def test_import_time_budget():
+    # 取多次中最快的一次，减少机器负载的影响
+    best = min(_import_times('product_recommend_api')['product_recommend_api'] for _ in range(3))
+    assert best < IMPORT_BUDGET_US, f"导入耗时 {best / 1000:.1f}ms 超出预算"
+
+
+def test_create_app_preloads_in_background(monkeypatch):
+    web_demo = pytest.importorskip('web_demo')
+    if not web_demo.FLASK_AVAILABLE:
+        pytest.skip("需要 Flask")
+    monkeypatch.setenv('DATA_RELOAD_INTERVAL', '0')
+    monkeypatch.delenv('DATA_MMAP', raising=False)
+    monkeypatch.delenv('DATA_LIVE_ASSOCIATIONS', raising=False)
+    web_demo.registry.reset()
+    try:
+        app = web_demo.create_app()
+        warmup = app.config['DATASET_WARMUP']
+        warmup.join(timeout=120)
+        assert not warmup.is_alive()
+        api = web_demo.registry.get(mmap=False, live_associations=False)
+        # 数据已由后台线程加载，请求路径直接使用
+        assert api._user_analyzer is not None and api._user_analyzer.has_data()
+        assert api._category_associations is not None
+    finally:
+        web_demo.registry.reset()
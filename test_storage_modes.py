@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+存储模式测试：快照、内存映射快照（首次写出、再次从快照加载）和 SQLite 存储（首次导入、再次直接打开）
+下的分析结果与逐行加载完全一致
+
+运行: python -m pytest -q test_storage_modes.py
+"""
+
+import pytest
+
+import analyze_user_api
+from analyze_user_api import UserPurchaseAnalyzer
+from purchase_store import NUMPY_AVAILABLE, PurchaseStore, np
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="需要 NumPy")
+
+SAMPLE_ROWS = 5000
+PERIODS = [('2025-01-01', '2026-12-31'), ('2025-11-01', '2026-1-31'), ('2025-08-04', '2025-08-04')]
+
+
+@pytest.fixture
+def paths(sample):
+    """写出购买数据的前 SAMPLE_ROWS 行，返回 (购买数据路径, 商品数据路径)"""
+    purchase_path, product_path, lines = sample
+    with open(purchase_path, 'wb') as f:
+        f.write(b'\n'.join(lines[:SAMPLE_ROWS + 1]) + b'\n')
+    return purchase_path, product_path
+
+
+def _assert_same_results(analyzer, reference):
+    """逐用户、逐时间段比较分析结果，以及用户列表和订单金额区间"""
+    user_ids = reference.get_all_user_ids()
+    assert analyzer.get_all_user_ids() == user_ids
+    for start_date, end_date in PERIODS:
+        for user_id in user_ids:
+            assert (analyzer.analyze_user_habits(user_id, start_date, end_date)
+                    == reference.analyze_user_habits(user_id, start_date, end_date))
+        assert (list(analyzer.analyze_users(user_ids, start_date, end_date))
+                == list(reference.analyze_users(user_ids, start_date, end_date)))
+    assert analyzer.get_price_range() == reference.get_price_range()
+    assert analyzer.get_user_list(limit=50) == reference.get_user_list(limit=50)
+
+
+def _reload_without_csv(monkeypatch, purchase_path, product_path, **options):
+    """禁止解析购买数据CSV后重新创建分析器，确认数据来自已写出的存储"""
+    def reparse(*args, **kwargs):
+        raise AssertionError("不应重新解析购买数据CSV")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(PurchaseStore, 'from_csv', reparse)
+        patch.setattr(analyze_user_api, 'import_csv', reparse)
+        analyzer = UserPurchaseAnalyzer(purchase_path, product_path, **options)
+    assert analyzer.has_data()
+    return analyzer
+
+
+def test_snapshot_matches_rows(paths, monkeypatch):
+    purchase_path, product_path = paths
+    reference = UserPurchaseAnalyzer(purchase_path, product_path)
+    _assert_same_results(UserPurchaseAnalyzer(purchase_path, product_path, snapshot=True), reference)
+    _assert_same_results(_reload_without_csv(monkeypatch, purchase_path, product_path, snapshot=True), reference)
+
+
+def test_mmap_matches_rows(paths, monkeypatch):
+    purchase_path, product_path = paths
+    reference = UserPurchaseAnalyzer(purchase_path, product_path)
+    _assert_same_results(UserPurchaseAnalyzer(purchase_path, product_path, mmap=True), reference)
+    analyzer = _reload_without_csv(monkeypatch, purchase_path, product_path, mmap=True)
+    assert isinstance(analyzer.store.user_ids, np.memmap)
+    _assert_same_results(analyzer, reference)
+    # 内存映射模式推迟构建按天预聚合，首次区间统计时构建
+    keys = ('user_id', 'period', 'total_orders', 'total_amount', 'avg_order_amount', 'category_avg_spending')
+    for user_id in reference.get_all_user_ids():
+        expected = reference.analyze_user_habits(user_id, *PERIODS[1])
+        assert analyzer.summarize_range(user_id, *PERIODS[1]) == {key: expected[key] for key in keys}
+
+
+def test_sqlite_matches_rows(paths, tmp_path, monkeypatch):
+    purchase_path, product_path = paths
+    sqlite_path = str(tmp_path / 'purchases.db')
+    reference = UserPurchaseAnalyzer(purchase_path, product_path)
+    _assert_same_results(UserPurchaseAnalyzer(purchase_path, product_path, sqlite_path=sqlite_path), reference)
+    _assert_same_results(_reload_without_csv(monkeypatch, purchase_path, product_path, sqlite_path=sqlite_path),
+                         reference)
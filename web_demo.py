@@ -11,10 +11,12 @@ try:
 except ImportError:
     FLASK_AVAILABLE = False
 
-from product_recommend_api import ProductRecommendationAPI, get_available_options
+from product_recommend_api import ProductRecommendationAPI, registry
+from dataset_reloader import DatasetReloader
 import json
 import os
 import base64
+import threading
 
 # HTML模板 — 现代化 UI 重构
 HTML_TEMPLATE = """
@@ -849,12 +851,46 @@ def create_app():
         return None
 
     app = Flask(__name__)
-    api = ProductRecommendationAPI()
+    # 多 worker 部署时设置 DATA_MMAP=1，各进程通过内存映射共享同一份数据
+    use_mmap = os.environ.get('DATA_MMAP') == '1'
+    # 设置 DATA_LIVE_ASSOCIATIONS=1 时，商品种类关联由增量计数实时推导，而不是读取批量分析结果
+    api_options = {'mmap': use_mmap, 'live_associations': os.environ.get('DATA_LIVE_ASSOCIATIONS') == '1'}
+    # 使用进程内共享实例（与便捷函数同一份数据）；应用创建后立即在后台线程中加载数据，
+    # 不占用请求路径，加载完成前到达的请求等待同一次加载而不会重复加载
+    api = registry.get(**api_options)
+
+    def warm_up():
+        try:
+            api.load()
+        except Exception as e:
+            print(f"⚠️ 后台预加载数据失败，将在首次请求时重试: {e}")
+
+    warmup = threading.Thread(target=warm_up, name="dataset-warmup", daemon=True)
+    warmup.start()
+    app.config['DATASET_WARMUP'] = warmup
+
+    # 数据文件变化时在后台重建 API 实例，并原子替换共享实例注册表中的实例；
+    # 每个请求开头从注册表读取一次实例，进行中的请求始终使用同一份数据。
+    # DATA_RELOAD_INTERVAL 设置检查间隔（秒），为 0 时关闭
+    reload_interval = float(os.environ.get('DATA_RELOAD_INTERVAL', '5'))
+    reloader = DatasetReloader(
+        factory=lambda: ProductRecommendationAPI(**api_options).load(),
+        paths=[os.path.join(api.data_dir, name) for name in
+               ("user_purchase_data.csv", "product_data.csv", "category_associations.csv")],
+        interval=reload_interval,
+        instance=api,
+        validate=lambda new_api: new_api.user_analyzer.has_data(),
+        on_swap=lambda new_api: registry.put(new_api, **api_options)
+    )
+    if reload_interval > 0:
+        reloader.start()
+    app.config['DATASET_RELOADER'] = reloader
 
     @app.route('/')
     def index():
         """主页"""
-        options = get_available_options()
+        api = registry.get(**api_options)
+        options = api.get_available_options()
         user_summary = api.get_user_summary(25)
 
         # 确保生成默认头像
@@ -892,16 +928,21 @@ def create_app():
             recipient_info = data.get('recipient_info', '')
             requirement = data['requirement']
 
-            # 使用默认API实例（已包含API密钥）
+            # 使用当前数据版本的API实例（已包含API密钥）
+            api = registry.get(**api_options)
+            context = api.request_context(user_id)
             result = api.get_product_recommendations(
                 user_id=user_id,
                 budget=budget,
                 recipient=recipient,
                 recipient_info=recipient_info,
-                requirement=requirement
+                requirement=requirement,
+                context=context
             )
 
-            return jsonify(result)
+            response = jsonify(result)
+            response.headers['Server-Timing'] = context.server_timing()
+            return response
 
         except Exception as e:
             return jsonify({
@@ -916,8 +957,11 @@ def create_app():
             user_id = int(request.args.get('user_id', 0))
             if user_id <= 0:
                 return jsonify({"success": False, "error": "无效的 user_id"})
-            suggestions = api.get_smart_suggestions(user_id)
-            return jsonify(suggestions)
+            api = registry.get(**api_options)
+            context = api.request_context(user_id)
+            response = jsonify(api.get_smart_suggestions(user_id, context=context))
+            response.headers['Server-Timing'] = context.server_timing()
+            return response
         except Exception as e:
             return jsonify({"success": False, "error": str(e)})
 